@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Client ADB minimal parlant directement le protocole "smart socket" du serveur adb (port 5037)
+Évite un fork/exec de `adb` (et un shell intermédiaire) pour chaque commande
+"""
+import os
+import shlex
+import socket
+import struct
+import subprocess
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ADB_HOST = os.environ.get('ADB_SERVER_HOST', '127.0.0.1')
+ADB_PORT = int(os.environ.get('ADB_SERVER_PORT', '5037'))
+
+SYNC_DATA_MAX = 64 * 1024
+DEFAULT_FILE_MODE = 0o100644
+
+
+class AdbError(Exception):
+    """Erreur renvoyée par le serveur adb (réponse FAIL) ou protocole inattendu"""
+
+
+class AdbConnection:
+    """Une connexion TCP au serveur adb (un service par connexion, comme le client adb)"""
+
+    def __init__(self, host: str = ADB_HOST, port: int = ADB_PORT, timeout: Optional[float] = 10):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+
+    def send(self, data: bytes):
+        self.sock.sendall(data)
+
+    def read_exact(self, size: int) -> bytes:
+        """Lit exactement `size` octets"""
+        chunks = []
+        while size > 0:
+            chunk = self.sock.recv(size)
+            if not chunk:
+                raise AdbError("Connexion fermée par le serveur adb")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def read_all(self) -> bytes:
+        """Lit jusqu'à la fermeture du flux"""
+        chunks = []
+        while True:
+            chunk = self.sock.recv(SYNC_DATA_MAX)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def read_hex_payload(self) -> bytes:
+        """Lit une réponse préfixée par sa longueur en 4 caractères hexadécimaux"""
+        size = int(self.read_exact(4), 16)
+        return self.read_exact(size)
+
+    def request(self, service: str):
+        """Envoie une requête `<hex4><service>` et vérifie la réponse OKAY/FAIL"""
+        payload = service.encode('utf-8')
+        self.send(b'%04x' % len(payload) + payload)
+        status = self.read_exact(4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise AdbError(self.read_hex_payload().decode('utf-8', errors='replace'))
+        raise AdbError(f"Réponse adb inattendue: {status!r}")
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AdbStream:
+    """Flux d'un service long (logcat, shell) lu ligne par ligne"""
+
+    def __init__(self, connection: AdbConnection, encoding: str = 'utf-8'):
+        self.connection = connection
+        self.connection.sock.settimeout(None)
+        self.raw = connection.sock.makefile('rb')
+        self.encoding = encoding
+
+    def readline(self) -> str:
+        return self.raw.readline().decode(self.encoding, errors='replace')
+
+    def read(self, size: int = -1) -> bytes:
+        return self.raw.read(size)
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.raw:
+            yield line.decode(self.encoding, errors='replace')
+
+    def close(self):
+        """Ferme le flux ; un lecteur bloqué dans readline() reçoit EOF"""
+        try:
+            self.connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.raw.close()
+        self.connection.close()
+
+
+def _quote_command(command) -> str:
+    """Accepte une chaîne (passée telle quelle) ou une liste d'arguments (quotés)"""
+    if isinstance(command, str):
+        return command
+    return ' '.join(shlex.quote(str(arg)) for arg in command)
+
+
+class AdbDevice:
+    """Device adb ; chaque appel ouvre une connexion locale vers le serveur adb"""
+
+    def __init__(self, client: 'AdbClient', serial: Optional[str] = None):
+        self.client = client
+        self.serial = serial
+
+    def open_service(self, service: str, timeout: Optional[float] = 10) -> AdbConnection:
+        """Ouvre une connexion déjà routée vers le device pour `service`"""
+        connection = self.client.connect(timeout=timeout)
+        try:
+            if self.serial:
+                connection.request(f"host:transport:{self.serial}")
+            else:
+                connection.request("host:transport-any")
+            connection.request(service)
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def shell(self, command, timeout: Optional[float] = 60) -> str:
+        """Exécute une commande shell et retourne sa sortie (stdout + stderr)"""
+        with self.open_service(f"shell:{_quote_command(command)}", timeout=timeout) as connection:
+            return connection.read_all().decode('utf-8', errors='replace')
+
+    def getprop(self, name: str) -> str:
+        return self.shell(['getprop', name]).strip()
+
+    def logcat(self, *args: str, encoding: str = 'utf-8') -> AdbStream:
+        """Démarre un flux logcat (service exec: sans PTY, donc sans \\r\\n ajoutés)"""
+        connection = self.open_service(f"exec:{_quote_command(['logcat', *args])}")
+        return AdbStream(connection, encoding)
+
+    def push(self, local_path: str, remote_path: str, mode: int = DEFAULT_FILE_MODE):
+        """Copie un fichier sur le device via le protocole sync"""
+        with self.open_service("sync:") as connection:
+            header = f"{remote_path},{mode}".encode('utf-8')
+            connection.send(b'SEND' + struct.pack('<I', len(header)) + header)
+            with open(local_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(SYNC_DATA_MAX), b''):
+                    connection.send(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+            connection.send(b'DONE' + struct.pack('<I', int(time.time())))
+            status = connection.read_exact(4)
+            size = struct.unpack('<I', connection.read_exact(4))[0]
+            if status != b'OKAY':
+                message = connection.read_exact(size).decode('utf-8', errors='replace')
+                raise AdbError(f"push échoué: {message}")
+
+    def install(self, apk_path: str, replace: bool = True) -> bool:
+        """
+        Installe un APK en streamant ses octets vers `cmd package install -S`
+        (pas de copie intermédiaire) ; repli sur push + `pm install` pour les vieux devices
+        """
+        size = os.path.getsize(apk_path)
+        flags = ['-r'] if replace else []
+        try:
+            connection = self.open_service(
+                f"exec:{_quote_command(['cmd', 'package', 'install', *flags, '-S', size])}",
+                timeout=300
+            )
+            with connection, open(apk_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(SYNC_DATA_MAX), b''):
+                    connection.send(chunk)
+                output = connection.read_all().decode('utf-8', errors='replace')
+            if 'Success' in output:
+                return True
+            if 'Failure' in output:
+                return False  # refus du gestionnaire de paquets : le repli échouerait de même
+            # "Can't find service", "cmd: not found" (avant Android 7), réponse vide ou inconnue : repli
+        except AdbError:
+            pass
+
+        remote_path = f"/data/local/tmp/{os.path.basename(apk_path)}"
+        self.push(apk_path, remote_path)
+        output = self.shell(['pm', 'install', *flags, remote_path], timeout=300)
+        self.shell(['rm', '-f', remote_path])
+        return 'Success' in output
+
+
+class AdbClient:
+    """Client du serveur adb ; les objets AdbDevice sont mis en cache par serial"""
+
+    def __init__(self, host: str = ADB_HOST, port: int = ADB_PORT):
+        self.host = host
+        self.port = port
+        self._devices: Dict[Optional[str], AdbDevice] = {}
+        self._lock = threading.Lock()
+        self._server_started = False
+
+    def connect(self, timeout: Optional[float] = 10) -> AdbConnection:
+        """Ouvre une connexion au serveur adb, en le démarrant une fois si besoin"""
+        try:
+            return AdbConnection(self.host, self.port, timeout)
+        except ConnectionRefusedError:
+            if self._server_started:
+                raise
+            self._server_started = True
+            subprocess.run(['adb', 'start-server'], capture_output=True)
+            return AdbConnection(self.host, self.port, timeout)
+
+    def version(self) -> int:
+        with self.connect() as connection:
+            connection.request("host:version")
+            return int(connection.read_hex_payload(), 16)
+
+    def list_devices(self) -> List[Tuple[str, str]]:
+        """Retourne [(serial, état)] pour tous les devices connus du serveur"""
+        with self.connect() as connection:
+            connection.request("host:devices")
+            payload = connection.read_hex_payload().decode('utf-8', errors='replace')
+        devices = []
+        for line in payload.splitlines():
+            if '\t' in line:
+                serial, state = line.split('\t', 1)
+                devices.append((serial, state.strip()))
+        return devices
+
+    def devices(self) -> List[str]:
+        """Retourne les serials des devices prêts (état `device`)"""
+        return [serial for serial, state in self.list_devices() if state == 'device']
+
+    def device(self, serial: Optional[str] = None) -> AdbDevice:
+        with self._lock:
+            if serial not in self._devices:
+                self._devices[serial] = AdbDevice(self, serial)
+            return self._devices[serial]
+
+
+_default_client: Optional[AdbClient] = None
+
+
+def get_client() -> AdbClient:
+    """Client partagé par tous les scripts d'un même processus"""
+    global _default_client
+    if _default_client is None:
+        _default_client = AdbClient()
+    return _default_client
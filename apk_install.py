@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Installation APK incrémentale : n'installe que si l'APK du device diffère
+de l'APK local (comparaison par hash via `pm path` + cache local)
+"""
+import hashlib
+import json
+import os
+import re
+
+from adb_client import AdbError, get_client
+
+PACKAGE_NAME = "com.bascule.leclerctracking"
+APK_PATH = "android-app/app/build/outputs/apk/debug/app-debug.apk"
+INSTALL_CACHE_FILE = "android-app/.installed_apk_hashes.json"
+VERSION_CODE_PATTERN = re.compile(r'versionCode=(\d+)')
+LAST_UPDATE_PATTERN = re.compile(r'lastUpdateTime=([\d: -]+\d)')
+
+
+def get_apk_hash(apk_path):
+    """Calcule le hash SHA-256 de l'APK local (lecture par blocs)"""
+    if not os.path.exists(apk_path):
+        return None
+    digest = hashlib.sha256()
+    with open(apk_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_installed_apk_path(package=PACKAGE_NAME, device_id=None):
+    """Retourne le chemin de base.apk installé sur le device (via `pm path`)"""
+    try:
+        output = get_client().device(device_id).shell(['pm', 'path', package])
+    except (AdbError, OSError):
+        return None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith('package:') and line.endswith('base.apk'):
+            return line[len('package:'):]
+    return None
+
+
+def get_install_stamp(package=PACKAGE_NAME, device_id=None):
+    """Identifie une installation : "versionCode/lastUpdateTime" (via `dumpsys package`), None si inconnu"""
+    try:
+        output = get_client().device(device_id).shell(['dumpsys', 'package', package])
+    except (AdbError, OSError):
+        return None
+    version = VERSION_CODE_PATTERN.search(output)
+    updated = LAST_UPDATE_PATTERN.search(output)
+    if not version or not updated:
+        return None
+    return f"{version.group(1)}/{updated.group(1)}"
+
+
+def get_remote_apk_hash(remote_path, device_id=None):
+    """Calcule le SHA-256 de l'APK installé directement sur le device"""
+    try:
+        output = get_client().device(device_id).shell(['sha256sum', remote_path])
+    except (AdbError, OSError):
+        return None
+    if not output.strip():
+        return None
+    return output.split()[0].lower()
+
+
+def load_install_cache(cache_file=INSTALL_CACHE_FILE):
+    """Charge le cache {device: {remote_path, install_stamp, apk_hash}}"""
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_install_cache(cache, cache_file=INSTALL_CACHE_FILE):
+    """Sauvegarde le cache d'installation"""
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+
+
+def is_apk_up_to_date(apk_hash, device_id=None, package=PACKAGE_NAME, cache=None):
+    """
+    Vérifie si l'APK installé sur le device correspond à l'APK local.
+    Le hash mis en cache ne suffit que si le chemin `pm path` et l'installation
+    (versionCode + lastUpdateTime) sont ceux du cache : sur les anciens Android le chemin
+    alterne entre -1 et -2, une installation faite ailleurs peut donc retomber sur le même.
+    Sinon on hash l'APK côté device. Retourne (à jour, chemin, installation).
+    """
+    remote_path = get_installed_apk_path(package, device_id)
+    if not remote_path:
+        return False, None, None
+
+    install_stamp = get_install_stamp(package, device_id)
+    cache_key = device_id or 'default'
+    entry = (cache or {}).get(cache_key)
+    if (entry and install_stamp and entry.get('remote_path') == remote_path
+            and entry.get('install_stamp') == install_stamp):
+        return entry.get('apk_hash') == apk_hash, remote_path, install_stamp
+
+    return get_remote_apk_hash(remote_path, device_id) == apk_hash, remote_path, install_stamp
+
+
+def install_apk(apk_path, device_id=None):
+    """Installe l'APK en streamant ses octets vers le package manager du device"""
+    try:
+        return get_client().device(device_id).install(os.path.abspath(apk_path))
+    except (AdbError, OSError) as e:
+        print(f"   Erreur: {e}")
+        return False
+
+
+def install_apk_if_needed(apk_path=APK_PATH, device_id=None, package=PACKAGE_NAME, force=False):
+    """Installe l'APK seulement si le device n'a pas déjà exactement le même"""
+    label = device_id or 'device par défaut'
+    apk_hash = get_apk_hash(apk_path)
+    if not apk_hash:
+        print(f"   ❌ APK introuvable: {apk_path}")
+        return False
+
+    cache = load_install_cache()
+    cache_key = device_id or 'default'
+
+    if not force:
+        up_to_date, remote_path, install_stamp = is_apk_up_to_date(apk_hash, device_id, package, cache)
+        if up_to_date:
+            print(f"   ✅ APK identique déjà installé sur {label} (hash: {apk_hash[:8]}...) - skip")
+            cache[cache_key] = {'remote_path': remote_path, 'install_stamp': install_stamp, 'apk_hash': apk_hash}
+            save_install_cache(cache)
+            return True
+
+    print(f"   📱 Installation sur {label} (hash: {apk_hash[:8]}...)")
+    if not install_apk(apk_path, device_id):
+        print(f"   ❌ Installation échouée sur {label}")
+        return False
+
+    cache[cache_key] = {
+        'remote_path': get_installed_apk_path(package, device_id),
+        'install_stamp': get_install_stamp(package, device_id),
+        'apk_hash': apk_hash
+    }
+    save_install_cache(cache)
+    return True
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Matcher multi-motifs compilé à partir de app-configs.json
+
+Pour une app, tous les mots-clés (buttonPatterns, navigationCategories, scrollContainers)
+sont compilés en un seul automate Aho-Corasick et tous les pricePatterns en une seule
+alternation regex : une ligne de page ou un texte d'événement est classé en une passe.
+Les matchers sont mis en cache par révision du fichier de config (mtime + taille).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+APP_CONFIG_FILE = "app-configs.json"
+PRICE_CATEGORY = 'price'
+NAVIGATION_CATEGORY = 'navigation'
+SCROLL_CATEGORY = 'scrollContainer'
+
+
+class PatternMatch(NamedTuple):
+    category: str
+    keyword: str
+    start: int
+    end: int
+
+
+class AhoCorasick:
+    """Automate Aho-Corasick sur des chaînes en minuscules"""
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]]):
+        # Nœud = index ; transitions, lien d'échec et sorties (catégorie, mot-clé) par nœud
+        self.transitions: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[List[Tuple[str, str]]] = [[]]
+        for category, keyword in keywords:
+            self._add(category, keyword.lower())
+        self._build_failure_links()
+
+    def _add(self, category: str, keyword: str):
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self.transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self.transitions)
+                self.transitions[node][char] = next_node
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        if (category, keyword) not in self.outputs[node]:
+            self.outputs[node].append((category, keyword))
+
+    def _build_failure_links(self):
+        queue = deque(self.transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.transitions[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(char, 0)
+                # Les sorties du suffixe le plus long sont héritées : pas de remontée à la recherche
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def iter_matches(self, text: str):
+        """(fin exclusive, catégorie, mot-clé) pour chaque occurrence dans `text` (déjà en minuscules)"""
+        transitions = self.transitions
+        fail = self.fail
+        outputs = self.outputs
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in transitions[node]:
+                node = fail[node]
+            node = transitions[node].get(char, 0)
+            if outputs[node]:
+                for category, keyword in outputs[node]:
+                    yield position + 1, category, keyword
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class AppPatternMatcher:
+    """Classification des lignes/textes selon les motifs d'une app"""
+
+    def __init__(self, app_key: str, app_config: dict):
+        self.app_key = app_key
+        keywords = []
+        for group, words in app_config.get('buttonPatterns', {}).items():
+            keywords.extend((group, word) for word in words)
+        keywords.extend((NAVIGATION_CATEGORY, word) for word in app_config.get('navigationCategories', []))
+        keywords.extend((SCROLL_CATEGORY, word) for word in app_config.get('scrollContainers', []))
+        self.automaton = AhoCorasick(keywords)
+        price_patterns = app_config.get('pricePatterns', [])
+        self.price_regex = re.compile('|'.join(f'(?:{pattern})' for pattern in price_patterns),
+                                      re.IGNORECASE) if price_patterns else None
+
+    def scan(self, text: str) -> List[PatternMatch]:
+        """
+        Toutes les occurrences de mots-clés et de prix.
+        Un mot-clé alphanumérique doit être un mot entier ('plus' ne matche pas 'plusieurs')
+        """
+        lowered = text.lower()
+        matches = []
+        for end, category, keyword in self.automaton.iter_matches(lowered):
+            start = end - len(keyword)
+            if _is_word_char(keyword[0]) and start > 0 and _is_word_char(lowered[start - 1]):
+                continue
+            if _is_word_char(keyword[-1]) and end < len(lowered) and _is_word_char(lowered[end]):
+                continue
+            matches.append(PatternMatch(category, keyword, start, end))
+        if self.price_regex:
+            matches.extend(PatternMatch(PRICE_CATEGORY, match.group(0), match.start(), match.end())
+                           for match in self.price_regex.finditer(text))
+        return matches
+
+    def classify(self, text: str) -> Set[str]:
+        """Catégories présentes dans `text` (addToCart, cart, navigation, price, ...)"""
+        return {match.category for match in self.scan(text)}
+
+    def prices(self, text: str) -> List[str]:
+        return [match.group(0) for match in self.price_regex.finditer(text)] if self.price_regex else []
+
+
+_matcher_cache: Dict[Tuple[str, str], Tuple[tuple, AppPatternMatcher]] = {}
+
+
+def config_revision(config_file: str = APP_CONFIG_FILE) -> tuple:
+    stat = os.stat(config_file)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_matcher(app_key: str = 'carrefour', config_file: str = APP_CONFIG_FILE) -> AppPatternMatcher:
+    """Matcher compilé de l'app, recompilé seulement si app-configs.json a changé"""
+    cache_key = (os.path.abspath(config_file), app_key)
+    revision = config_revision(config_file)
+    cached = _matcher_cache.get(cache_key)
+    if cached and cached[0] == revision:
+        return cached[1]
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        apps = json.load(f)['apps']
+    if app_key not in apps:
+        raise KeyError(f"App inconnue dans {config_file}: {app_key}")
+    matcher = AppPatternMatcher(app_key, apps[app_key])
+    _matcher_cache[cache_key] = (revision, matcher)
+    return matcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classe des lignes de texte selon les motifs de app-configs.json')
+    parser.add_argument('files', nargs='*', help='Fichiers à analyser (défaut: entrée standard)')
+    parser.add_argument('--app', default='carrefour', help='Clé de l\'app dans app-configs.json')
+    parser.add_argument('--config', default=APP_CONFIG_FILE)
+    parser.add_argument('--all', action='store_true', help='Afficher aussi les lignes sans correspondance')
+    args = parser.parse_args()
+
+    matcher = get_matcher(args.app, args.config)
+    counts: Dict[str, int] = {}
+    sources = [open(path, 'r', encoding='utf-8-sig', errors='replace') for path in args.files] or [sys.stdin]
+    for source in sources:
+        with source:
+            for line in source:
+                line = line.rstrip('\n')
+                categories = matcher.classify(line)
+                for category in categories:
+                    counts[category] = counts.get(category, 0) + 1
+                if categories or args.all:
+                    print(f"[{','.join(sorted(categories))}] {line}")
+
+    print(f"📊 {', '.join(f'{category}: {count}' for category, count in sorted(counts.items())) or 'aucune correspondance'}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
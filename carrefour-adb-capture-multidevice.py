@@ -4,33 +4,40 @@ Script de capture ADB multi-device pour Carrefour
 Capture les logs de tous les devices connectés et les envoie au serveur Node.js
 """
 
-import subprocess
+import argparse
 import json
 import time
 import sys
 import re
 from datetime import datetime
 import requests
-import threading
 from typing import List, Dict, Optional
 
+from adb_client import AdbError, get_client
+from log_merge import LogMerger
+from log_router import TRACKING_PACKAGE, get_router
+from metrics import add_collector, counter, histogram, metrics_port, start_metrics_server
+from profiler import add_profile_arguments, start_from_args
+
+LINES_MATCHED = counter('capture_lines_matched_total', 'Lignes OptimizedCarrefour reconnues par la capture', ['device'])
+PAGES_ASSEMBLED = counter('capture_pages_assembled_total', 'Pages Carrefour assemblées', ['device'])
+UPLOAD_SECONDS = histogram('capture_upload_seconds', 'Durée des envois au serveur Node.js', ['endpoint'])
+UPLOAD_ERRORS = counter('capture_upload_errors_total', 'Envois au serveur Node.js en échec', ['endpoint'])
+
 class CarrefourADBCapture:
     def __init__(self, server_url: str = "http://localhost:3001"):
         self.server_url = server_url
         self.running = False
-        self.device_processes = {}
-        self.device_threads = {}
+        self.device_subscriptions = {}
+        self.device_infos: Dict[str, Dict[str, str]] = {}
+        # Lignes de tous les devices fusionnées dans l'ordre de l'horloge de l'hôte
+        self.merger = LogMerger(self.handle_merged_line)
+        add_collector(self.merger_metrics)
         
     def get_connected_devices(self) -> List[str]:
         """Récupère la liste des devices connectés"""
         try:
-            result = subprocess.run(['adb', 'devices'], capture_output=True, text=True, encoding='utf-8', errors='replace')
-            devices = []
-            for line in result.stdout.split('\n'):
-                if '\tdevice' in line:
-                    device_id = line.split('\t')[0]
-                    devices.append(device_id)
-            return devices
+            return get_client().devices()
         except Exception as e:
             print(f"❌ Erreur lors de la récupération des devices: {e}")
             return []
@@ -38,19 +45,13 @@ class CarrefourADBCapture:
     def get_device_info(self, device_id: str) -> Dict[str, str]:
         """Récupère les informations d'un device"""
         try:
+            device = get_client().device(device_id)
+            
             # Récupérer le modèle du device
-            model_result = subprocess.run(
-                ['adb', '-s', device_id, 'shell', 'getprop', 'ro.product.model'],
-                capture_output=True, text=True, encoding='utf-8', errors='replace'
-            )
-            model = model_result.stdout.strip()
+            model = device.getprop('ro.product.model')
             
             # Récupérer la version Android
-            version_result = subprocess.run(
-                ['adb', '-s', device_id, 'shell', 'getprop', 'ro.build.version.release'],
-                capture_output=True, text=True, encoding='utf-8', errors='replace'
-            )
-            version = version_result.stdout.strip()
+            version = device.getprop('ro.build.version.release')
             
             # Déterminer le type de device
             device_type = "Émulateur" if device_id.startswith('emulator') else "Téléphone"
@@ -73,42 +74,39 @@ class CarrefourADBCapture:
             }
     
     def capture_device_logs(self, device_id: str, device_info: Dict[str, str]):
-        """Capture les logs d'un device spécifique"""
+        """Abonne le merger au flux logcat partagé d'un device spécifique (horloge du device mesurée)"""
         print(f"🔍 Capture des logs pour {device_info['name']} ({device_id})")
         
-        try:
-            # Lancer logcat pour ce device
-            process = subprocess.Popen(
-                ['adb', '-s', device_id, 'logcat', '-s', 'OptimizedCarrefour:*'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                errors='replace'
-            )
-            
-            self.device_processes[device_id] = process
-            
-            # Lire les logs en continu
-            for line in iter(process.stdout.readline, ''):
-                if not self.running:
-                    break
-                    
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Traiter les logs Carrefour
-                if 'OptimizedCarrefour' in line:
-                    self.process_carrefour_log(line, device_id, device_info)
-                    
-        except Exception as e:
-            print(f"❌ Erreur lors de la capture des logs pour {device_id}: {e}")
-        finally:
-            if device_id in self.device_processes:
-                del self.device_processes[device_id]
+        router = get_router(device_id)
+        if router.checkpoint_file is None:
+            router.enable_checkpoint()
+        self.device_infos[device_id] = device_info
+        self.device_subscriptions[device_id] = self.merger.add_device(device_id, ['OptimizedCarrefour'], router,
+                                                                      package=TRACKING_PACKAGE)
+        offset = self.merger.offsets[device_id]
+        print(f"   ⏱️ Horloge: {offset.offset_ms:+.0f} ms par rapport à l'hôte")
+    
+    def merger_metrics(self):
+        stats = self.merger.stats()
+        return [
+            ('merge_pending_lines', 'gauge', 'Lignes en attente dans la fenêtre de réordonnancement', [({}, stats['pending'])]),
+            ('merge_late_lines_total', 'counter', 'Lignes émises hors ordre (arrivées après la fenêtre)', [({}, stats['late'])]),
+            ('merge_clock_offset_ms', 'gauge', 'Décalage d\'horloge du device par rapport à l\'hôte',
+             [({'device': device}, values['offsetMs']) for device, values in stats['devices'].items()]),
+        ]
+    
+    def handle_merged_line(self, merged):
+        """Lignes de tous les devices, dans l'ordre chronologique corrigé"""
+        if not self.running:
+            return
+        line = merged.routed.line.strip()
+        # Traiter les logs Carrefour
+        if line:
+            LINES_MATCHED.inc(device=merged.device_id)
+            self.process_carrefour_log(line, merged.device_id, self.device_infos[merged.device_id], merged.host_ms)
     
-    def process_carrefour_log(self, log_line: str, device_id: str, device_info: Dict[str, str]):
+    def process_carrefour_log(self, log_line: str, device_id: str, device_info: Dict[str, str],
+                              event_ms: Optional[float] = None):
         """Traite une ligne de log Carrefour"""
         try:
             # Extraire le contenu Markdown des logs
@@ -118,7 +116,8 @@ class CarrefourADBCapture:
                 if markdown_match:
                     markdown_content = markdown_match.group(1).strip()
                     if markdown_content:
-                        self.send_to_server('markdown', markdown_content, device_id, device_info)
+                        PAGES_ASSEMBLED.inc(device=device_id)
+                        self.send_to_server('markdown', markdown_content, device_id, device_info, event_ms)
             
             # Extraire le contenu HTML des logs
             elif '🎨 PAGE VISUELLE' in log_line:
@@ -127,15 +126,18 @@ class CarrefourADBCapture:
                 if html_match:
                     html_content = html_match.group(1).strip()
                     if html_content:
-                        self.send_to_server('visual', html_content, device_id, device_info)
+                        PAGES_ASSEMBLED.inc(device=device_id)
+                        self.send_to_server('visual', html_content, device_id, device_info, event_ms)
                         
         except Exception as e:
             print(f"❌ Erreur lors du traitement du log pour {device_id}: {e}")
     
-    def send_to_server(self, content_type: str, content: str, device_id: str, device_info: Dict[str, str]):
-        """Envoie le contenu au serveur Node.js"""
+    def send_to_server(self, content_type: str, content: str, device_id: str, device_info: Dict[str, str],
+                       event_ms: Optional[float] = None):
+        """Envoie le contenu au serveur Node.js (horodaté à l'heure hôte corrigée de l'événement)"""
+        endpoint_name = 'carrefour-page' if content_type == 'markdown' else f"carrefour-{content_type}"
         try:
-            timestamp = datetime.now().isoformat()
+            timestamp = (datetime.fromtimestamp(event_ms / 1000) if event_ms else datetime.now()).isoformat()
             
             if content_type == 'markdown':
                 endpoint = f"{self.server_url}/api/carrefour-page"
@@ -156,13 +158,16 @@ class CarrefourADBCapture:
             else:
                 return
             
-            response = requests.post(endpoint, json=data, timeout=5)
+            with UPLOAD_SECONDS.time(endpoint=endpoint_name):
+                response = requests.post(endpoint, json=data, timeout=5)
             if response.status_code == 200:
                 print(f"✅ {content_type.upper()} envoyé depuis {device_info['name']}")
             else:
+                UPLOAD_ERRORS.inc(endpoint=endpoint_name)
                 print(f"❌ Erreur envoi {content_type}: {response.status_code}")
                 
         except Exception as e:
+            UPLOAD_ERRORS.inc(endpoint=endpoint_name)
             print(f"❌ Erreur lors de l'envoi au serveur: {e}")
     
     def start_capture(self):
@@ -181,16 +186,11 @@ class CarrefourADBCapture:
         
         self.running = True
         
-        # Créer un thread pour chaque device
+        # Un flux logcat partagé (routeur) par device
         for device in devices:
             device_info = self.get_device_info(device)
-            thread = threading.Thread(
-                target=self.capture_device_logs,
-                args=(device, device_info),
-                daemon=True
-            )
-            thread.start()
-            self.device_threads[device] = thread
+            self.capture_device_logs(device, device_info)
+        self.merger.start()
         
         print("✅ Capture démarrée sur tous les devices")
         print("📊 Dashboard: http://localhost:3001/carrefour-dashboard")
@@ -207,24 +207,24 @@ class CarrefourADBCapture:
         """Arrête la capture"""
         self.running = False
         
-        # Arrêter tous les processus
-        for device, process in self.device_processes.items():
-            try:
-                process.terminate()
-                process.wait(timeout=5)
-            except:
-                process.kill()
+        # Se désabonner des flux logcat (chaque flux s'arrête avec son dernier abonné)
+        self.merger.stop()
+        self.device_subscriptions.clear()
         
         print("✅ Capture arrêtée")
 
 def main():
+    parser = argparse.ArgumentParser(description='Capture ADB multi-device des pages Carrefour')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
     print("🛒 Capture ADB Multi-Device Carrefour")
     print("=" * 50)
     
-    # Vérifier que ADB est disponible
+    # Vérifier que le serveur ADB est disponible
     try:
-        subprocess.run(['adb', 'version'], capture_output=True, check=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        get_client().version()
+    except (AdbError, OSError):
         print("❌ ADB n'est pas installé ou n'est pas dans le PATH")
         sys.exit(1)
     
@@ -238,7 +238,13 @@ def main():
         sys.exit(1)
     
     # Démarrer la capture
-    capture.start_capture()
+    start_metrics_server(metrics_port(9462))
+    profiler = start_from_args(args)
+    try:
+        capture.start_capture()
+    finally:
+        if profiler:
+            profiler.stop()
 
 if __name__ == "__main__":
     main()
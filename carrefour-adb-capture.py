@@ -4,23 +4,36 @@ Script de capture ADB pour les logs Carrefour
 Envoie les pages Markdown au serveur Node.js
 """
 
-import subprocess
+import argparse
 import requests
 import json
 import time
-import threading
 import re
 import sys
 from datetime import datetime
 
+from app_patterns import get_matcher
+from log_router import TRACKING_PACKAGE, get_router
+from metrics import counter, histogram, metrics_port, start_metrics_server
+from product_index import ProductIndex
+from profiler import add_profile_arguments, start_from_args
+
+LINES_MATCHED = counter('capture_lines_matched_total', 'Lignes OptimizedCarrefour reconnues par la capture', ['device'])
+PAGES_ASSEMBLED = counter('capture_pages_assembled_total', 'Pages Carrefour assemblées', ['device'])
+UPLOAD_SECONDS = histogram('capture_upload_seconds', 'Durée des envois au serveur Node.js', ['endpoint'])
+UPLOAD_ERRORS = counter('capture_upload_errors_total', 'Envois au serveur Node.js en échec', ['endpoint'])
+
 class CarrefourADBCapture:
-    def __init__(self, server_url="http://localhost:3001"):
+    def __init__(self, server_url="http://localhost:3001", device_id=None):
         self.server_url = server_url
-        self.adb_process = None
+        self.device_id = device_id
+        self.subscription = None
         self.running = False
         self.current_page = ""
         self.page_buffer = []
         self.page_started = False
+        self.page_tags = {}
+        self.product_index = None
         
     def check_server(self):
         """Vérifier que le serveur Node.js est accessible"""
@@ -41,24 +54,15 @@ class CarrefourADBCapture:
         try:
             print("🚀 Démarrage de la capture ADB Carrefour...")
             
-            # Commande adb logcat pour capturer les logs OptimizedCarrefour
-            cmd = [
-                "adb", "logcat", "-s", "OptimizedCarrefour"
-            ]
-            
-            # Démarrer le processus avec encodage UTF-8 et gestion d'erreurs
-            self.adb_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                bufsize=1,
-                universal_newlines=True
-            )
+            # Abonnement au flux logcat partagé du device (un seul logcat pour tous les consommateurs)
+            router = get_router(self.device_id)
+            self.subscription = router.subscribe('pages', ['OptimizedCarrefour'], self.handle_routed_line,
+                                                 on_close=self.close_index, package=TRACKING_PACKAGE)
+            router.start()
             
             print("✅ Capture ADB démarrée!")
+            print("📱 Lecture des logs en cours...")
+            print("🛒 Naviguez dans l'application Carrefour pour voir les pages")
             return True
             
         except Exception as e:
@@ -85,32 +89,53 @@ class CarrefourADBCapture:
         return content.startswith('============================================================') and \
                self.page_started and len(self.page_buffer) > 10
     
-    def send_page_to_server(self, page_content):
+    def tag_line(self, content):
+        """Compter les lignes panier / prix / navigation de la page en cours (motifs de app-configs.json)"""
+        for category in get_matcher('carrefour').classify(content):
+            self.page_tags[category] = self.page_tags.get(category, 0) + 1
+    
+    def send_page_to_server(self, page_content, tags=None):
         """Envoyer une page au serveur Node.js"""
         try:
             payload = {
                 "content": page_content,
                 "timestamp": datetime.now().isoformat()
             }
+            if tags:
+                payload["tags"] = tags
             
-            response = requests.post(
-                f"{self.server_url}/api/carrefour-page",
-                json=payload,
-                timeout=10
-            )
+            with UPLOAD_SECONDS.time(endpoint='carrefour-page'):
+                response = requests.post(
+                    f"{self.server_url}/api/carrefour-page",
+                    json=payload,
+                    timeout=10
+                )
             
             if response.status_code == 200:
                 result = response.json()
                 print(f"📄 Page envoyée au serveur (ID: {result.get('pageId', 'N/A')})")
                 return True
             else:
+                UPLOAD_ERRORS.inc(endpoint='carrefour-page')
                 print(f"❌ Erreur serveur: {response.status_code}")
                 return False
                 
         except requests.exceptions.RequestException as e:
+            UPLOAD_ERRORS.inc(endpoint='carrefour-page')
             print(f"❌ Erreur lors de l'envoi: {e}")
             return False
     
+    def index_page(self, page_content):
+        """Ajouter les produits / prix de la page à l'index SQLite (ouvert dans le thread de lecture)"""
+        try:
+            if self.product_index is None:
+                self.product_index = ProductIndex()
+            added = self.product_index.add_page(page_content, source="adb-capture")
+            if added:
+                print(f"   🏷️ {added} prix indexés")
+        except Exception as e:
+            print(f"⚠️ Indexation produits impossible: {e}")
+    
     def process_page(self):
         """Traiter la page complète"""
         if len(self.page_buffer) < 5:
@@ -123,58 +148,60 @@ class CarrefourADBCapture:
         page_content = page_content.strip()
         
         if len(page_content) > 100:  # Seulement si la page a du contenu
-            self.send_page_to_server(page_content)
+            PAGES_ASSEMBLED.inc(device=self.device_id or 'default')
+            self.send_page_to_server(page_content, self.page_tags)
+            self.index_page(page_content)
         
         # Réinitialiser
         self.page_buffer = []
         self.page_started = False
+        self.page_tags = {}
     
-    def read_logs(self):
-        """Lire les logs ADB en continu"""
-        print("📱 Lecture des logs en cours...")
-        print("🛒 Naviguez dans l'application Carrefour pour voir les pages")
+    def handle_routed_line(self, routed):
+        """Traiter une ligne OptimizedCarrefour reçue du routeur logcat"""
+        if not self.running:
+            return
+            
+        content = self.parse_log_line(routed.line)
+        if not content:
+            return
+        LINES_MATCHED.inc(device=self.device_id or 'default')
         
-        try:
-            for line in iter(self.adb_process.stdout.readline, ''):
-                if not self.running:
-                    break
-                    
-                content = self.parse_log_line(line)
-                if not content:
-                    continue
-                
-                # Détecter le début d'une page
-                if self.is_page_start(content) and not self.page_started:
-                    self.page_started = True
-                    self.page_buffer = [content]
-                    continue
-                
-                # Si on est dans une page, ajouter le contenu
-                if self.page_started:
-                    self.page_buffer.append(content)
-                    
-                    # Vérifier si c'est la fin de page
-                    if self.is_page_end(content):
-                        self.process_page()
-                        continue
-                
-                # Détecter les pages courtes (sans délimiteurs)
-                elif content.startswith('📄 PAGE CARREFOUR') or content.startswith('# 🛒 Page Carrefour'):
-                    # Page courte détectée
-                    self.page_buffer = [content]
-                    self.page_started = True
-                    
-                    # Attendre un peu pour voir s'il y a plus de contenu
-                    time.sleep(0.5)
-                    
-                    # Si pas assez de contenu, traiter quand même
-                    if len(self.page_buffer) < 5:
-                        self.process_page()
-                
-        except Exception as e:
-            print(f"❌ Erreur lors de la lecture: {e}")
-        finally:
-            print("🛑 Arrêt de la lecture des logs")
+        # Détecter le début d'une page
+        if self.is_page_start(content) and not self.page_started:
+            self.page_started = True
+            self.page_buffer = [content]
+            self.page_tags = {}
+            return
+        
+        # Si on est dans une page, ajouter le contenu
+        if self.page_started:
+            self.page_buffer.append(content)
+            self.tag_line(content)
+            
+            # Vérifier si c'est la fin de page
+            if self.is_page_end(content):
+                self.process_page()
+        
+        # Détecter les pages courtes (sans délimiteurs)
+        elif content.startswith('📄 PAGE CARREFOUR') or content.startswith('# 🛒 Page Carrefour'):
+            # Page courte détectée
+            self.page_buffer = [content]
+            self.page_started = True
+            
+            # Attendre un peu pour voir s'il y a plus de contenu
+            time.sleep(0.5)
+            
+            # Si pas assez de contenu, traiter quand même
+            if len(self.page_buffer) < 5:
+                self.process_page()
+    
+    def close_index(self):
+        """Fermer l'index produits (appelé dans le thread du consommateur à sa fin)"""
+        if self.product_index:
+            self.product_index.close()
+            self.product_index = None
+        print("🛑 Arrêt de la lecture des logs")
     
     def start(self):
         """Démarrer la capture"""
@@ -182,16 +209,13 @@ class CarrefourADBCapture:
             print("❌ Impossible de démarrer: serveur inaccessible")
             return False
         
+        self.running = True
+        
         if not self.start_adb_capture():
             print("❌ Impossible de démarrer: capture ADB échouée")
+            self.running = False
             return False
         
-        self.running = True
-        
-        # Démarrer la lecture des logs dans un thread séparé
-        log_thread = threading.Thread(target=self.read_logs, daemon=True)
-        log_thread.start()
-        
         return True
     
     def stop(self):
@@ -199,16 +223,24 @@ class CarrefourADBCapture:
         print("\n🛑 Arrêt de la capture...")
         self.running = False
         
-        if self.adb_process:
-            self.adb_process.terminate()
-            self.adb_process.wait()
-            print("✅ Processus ADB arrêté")
+        if self.subscription:
+            get_router(self.device_id).unsubscribe(self.subscription)
+            self.subscription = None
+            print("✅ Flux ADB arrêté")
 
 def main():
+    parser = argparse.ArgumentParser(description='Capture ADB des pages Carrefour vers le serveur Node.js')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
     print("🚀 Carrefour ADB Capture vers serveur Node.js")
     print("📡 Serveur cible: http://localhost:3001")
     
+    start_metrics_server(metrics_port(9461))
+    profiler = start_from_args(args)
     capture = CarrefourADBCapture()
+    # Reprise après la dernière ligne traitée si le script est relancé
+    get_router().enable_checkpoint()
     
     if not capture.start():
         print("❌ Échec du démarrage")
@@ -222,6 +254,8 @@ def main():
         print("\n👋 Arrêt demandé par l'utilisateur")
     finally:
         capture.stop()
+        if profiler:
+            profiler.stop()
 
 if __name__ == "__main__":
     main()
@@ -4,23 +4,120 @@ Dashboard Carrefour - Visualisation temps réel des pages Carrefour en Markdown
 Capture les logs du service OptimizedCarrefourTrackingService et les affiche dans un dashboard web
 """
 
+import argparse
 import asyncio
+import hashlib
+import html
 import websockets
 import json
-import subprocess
-import threading
 import time
 import os
+from collections import OrderedDict
 from datetime import datetime
 import re
+from typing import Dict, List, NamedTuple, Optional
 from aiohttp import web, WSMsgType
 import aiohttp_cors
 
+from adb_client import get_client
+from log_router import TRACKING_PACKAGE, get_router
+from logcat import parse_threadtime_line
+from metrics import counter, gauge, histogram, metrics_port, start_metrics_server
+from profiler import add_profile_arguments, start_from_args
+
+CLIENTS = gauge('dashboard_clients', 'Clients WebSocket connectés')
+PAGES = counter('dashboard_pages_total', 'Pages Carrefour assemblées par le dashboard')
+BROADCAST_SECONDS = histogram('dashboard_broadcast_seconds', 'Durée d\'une diffusion à tous les clients')
+MESSAGES_DROPPED = counter('dashboard_messages_dropped_total', 'Messages non remis (client déconnecté pendant l\'envoi)')
+RENDER_CACHE = counter('dashboard_render_cache_total', 'Rendus de page servis par le cache ou recalculés', ['result'])
+
+RENDER_CACHE_SIZE = 256
+INLINE_PATTERN = re.compile(r'\*\*(.+?)\*\*|\*(.+?)\*')
+
+
+class RenderedPage(NamedTuple):
+    markdown: str
+    html: str
+
+
+def _inline_html(text: str) -> str:
+    """Échappe le texte puis applique **gras** et *italique* (le texte des logs n'est jamais du HTML de confiance)"""
+    return INLINE_PATTERN.sub(
+        lambda m: f"<strong>{m.group(1)}</strong>" if m.group(1) is not None else f"<em>{m.group(2)}</em>",
+        html.escape(text, quote=False))
+
+
+def render_page(log_content: str) -> RenderedPage:
+    """
+    Rend le corps d'une page en Markdown et en HTML assaini, en une passe : chaque ligne est
+    classée sur son premier caractère (titre, élément de liste, séparateur, vide, texte)
+    """
+    markdown_lines = []
+    html_parts = []
+    in_list = False
+    for line in log_content.split('\n'):
+        line = line.strip()
+        first = line[:1]
+        if first == '=' or line.startswith('```'):
+            continue  # séparateurs et blocs de la sortie brute
+        if first == '-' and line.startswith('- '):
+            if line.startswith('- **'):
+                line = line.replace('**:', ':**')
+            markdown_lines.append(line)
+            if not in_list:
+                html_parts.append('<ul>')
+                in_list = True
+            html_parts.append(f"<li>{_inline_html(line[2:])}</li>")
+            continue
+        if in_list:
+            html_parts.append('</ul>')
+            in_list = False
+        if first == '#':
+            level = len(line) - len(line.lstrip('#'))
+            if level <= 3 and line[level:level + 1] == ' ':
+                title = line[level + 1:].strip()
+                markdown_lines.append(f"{'#' * level} {title}")
+                html_parts.append(f"<h{level}>{_inline_html(title)}</h{level}>")
+                continue
+        markdown_lines.append(line)
+        html_parts.append(f"{_inline_html(line)}<br>" if line else '<br>')
+    if in_list:
+        html_parts.append('</ul>')
+    return RenderedPage('\n'.join(markdown_lines), ''.join(html_parts))
+
+
+class PageRenderCache:
+    """Rendus récents indexés par empreinte du contenu : une page déjà vue n'est pas re-rendue"""
+
+    def __init__(self, maxsize: int = RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[str, RenderedPage]" = OrderedDict()
+
+    def render(self, log_content: str) -> RenderedPage:
+        key = hashlib.sha1(log_content.encode('utf-8')).hexdigest()
+        rendered = self.entries.get(key)
+        if rendered is not None:
+            self.entries.move_to_end(key)
+            RENDER_CACHE.inc(result='hit')
+            return rendered
+        RENDER_CACHE.inc(result='miss')
+        rendered = self.entries[key] = render_page(log_content)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return rendered
+
 class CarrefourDashboard:
-    def __init__(self):
+    def __init__(self, device_ids: Optional[List[Optional[str]]] = None):
+        # Devices suivis : réutilise les routeurs déjà configurés par le démon (un seul logcat par device)
+        self.device_ids = device_ids or [None]
         self.clients = set()
         self.current_page_data = {}
+        self.current_message: Optional[str] = None  # dernier page_update sérialisé, renvoyé tel quel aux nouveaux clients
+        self.render_cache = PageRenderCache()
         self.log_file = None
+        self.loop = None
+        self.page_lines: Dict[Optional[str], List[str]] = {}  # device -> page en cours d'assemblage
+        CLIENTS.set_function(lambda: len(self.clients))
         
     async def register_client(self, websocket):
         """Enregistre un nouveau client WebSocket"""
@@ -28,11 +125,8 @@ class CarrefourDashboard:
         print(f"📱 Client connecté: {websocket.remote_address}")
         
         # Envoyer les données actuelles au nouveau client
-        if self.current_page_data:
-            await websocket.send(json.dumps({
-                "type": "page_update",
-                "data": self.current_page_data
-            }))
+        if self.current_message:
+            await websocket.send(self.current_message)
     
     async def unregister_client(self, websocket):
         """Déconnecte un client WebSocket"""
@@ -40,23 +134,25 @@ class CarrefourDashboard:
         print(f"📱 Client déconnecté: {websocket.remote_address}")
     
     async def broadcast_page_update(self, page_data):
-        """Diffuse les données de page à tous les clients connectés"""
-        if not self.clients:
-            return
-            
+        """Diffuse les données de page à tous les clients connectés (sérialisées une seule fois)"""
         message = json.dumps({
             "type": "page_update",
             "data": page_data,
             "timestamp": datetime.now().isoformat()
         })
+        self.current_message = message
+        if not self.clients:
+            return
         
         # Diffuser à tous les clients connectés
         disconnected = set()
-        for client in self.clients:
-            try:
-                await client.send(message)
-            except websockets.exceptions.ConnectionClosed:
-                disconnected.add(client)
+        with BROADCAST_SECONDS.time():
+            for client in self.clients:
+                try:
+                    await client.send(message)
+                except websockets.exceptions.ConnectionClosed:
+                    disconnected.add(client)
+                    MESSAGES_DROPPED.inc()
         
         # Nettoyer les clients déconnectés
         for client in disconnected:
@@ -78,92 +174,60 @@ class CarrefourDashboard:
         }
     
     def start_log_monitoring(self):
-        """Démarre le monitoring des logs Carrefour en arrière-plan"""
-        def monitor_logs():
-            print("🔍 Démarrage du monitoring des logs Carrefour...")
-            
-            # Lancer adb logcat pour capturer les logs OptimizedCarrefour
-            process = subprocess.Popen(
-                ['adb', 'logcat', '-s', 'OptimizedCarrefour'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            current_page_lines = []
-            in_page_section = False
-            
-            try:
-                for line in process.stdout:
-                    line = line.strip()
-                    
-                    # Détecter le début d'une nouvelle page
-                    if "📄 PAGE CARREFOUR" in line:
-                        in_page_section = True
-                        current_page_lines = [line]
-                        continue
-                    
-                    # Détecter la fin d'une section de page
-                    if in_page_section and line.startswith("=" * 60):
-                        if len(current_page_lines) > 1:  # On a du contenu
-                            # Traiter la page complète
-                            page_content = "\n".join(current_page_lines)
-                            page_data = self.parse_carrefour_logs(page_content)
-                            
-                            if page_data:
-                                page_data["content"] = page_content
-                                page_data["markdown"] = self.convert_to_markdown(page_content)
-                                self.current_page_data = page_data
-                                
-                                # Notifier les clients WebSocket
-                                asyncio.run_coroutine_threadsafe(
-                                    self.broadcast_page_update(page_data),
-                                    asyncio.get_event_loop()
-                                )
-                        
-                        in_page_section = False
-                        current_page_lines = []
-                        continue
-                    
-                    # Accumuler les lignes de la page courante
-                    if in_page_section:
-                        current_page_lines.append(line)
-                        
-            except Exception as e:
-                print(f"❌ Erreur dans le monitoring des logs: {e}")
-            finally:
-                process.terminate()
-        
-        # Lancer le monitoring dans un thread séparé
-        thread = threading.Thread(target=monitor_logs, daemon=True)
-        thread.start()
+        """Abonne le dashboard au flux logcat OptimizedCarrefour partagé (routeur du device)"""
+        print("🔍 Démarrage du monitoring des logs Carrefour...")
+        
+        # Boucle asyncio du serveur WebSocket : les diffusions y sont planifiées depuis le thread du routeur
+        self.loop = asyncio.get_running_loop()
+        self.page_lines = {}
+        
+        for device_id in self.device_ids:
+            router = get_router(device_id)
+            router.subscribe('dashboard', ['OptimizedCarrefour'], self.handle_log_line, package=TRACKING_PACKAGE)
+            router.start()
     
-    def convert_to_markdown(self, log_content):
-        """Convertit le contenu des logs en Markdown formaté"""
-        lines = log_content.split('\n')
-        markdown_lines = []
-        
-        for line in lines:
-            if line.startswith("# "):
-                markdown_lines.append(f"# {line[2:].strip()}")
-            elif line.startswith("## "):
-                markdown_lines.append(f"## {line[3:].strip()}")
-            elif line.startswith("### "):
-                markdown_lines.append(f"### {line[4:].strip()}")
-            elif line.startswith("- **"):
-                # Formater les éléments de liste avec style
-                clean_line = line.replace("- **", "- **").replace("**:", ":**")
-                markdown_lines.append(clean_line)
-            elif line.strip() == "":
-                markdown_lines.append("")
-            elif not line.startswith("=") and not line.startswith("```"):
-                # Lignes de contenu normales
-                markdown_lines.append(line.strip())
-        
-        return "\n".join(markdown_lines)
+    def handle_log_line(self, routed):
+        """Accumule les messages d'une page Carrefour (sans le préfixe logcat) et la diffuse une fois complète"""
+        record = routed.record or parse_threadtime_line(routed.line)
+        line = (record.message if record else routed.line).strip()
+        
+        page_lines = self.page_lines.get(routed.device_id)
+        
+        # Détecter le début d'une nouvelle page
+        if "📄 PAGE CARREFOUR" in line:
+            self.page_lines[routed.device_id] = [line]
+            return
+        
+        # Détecter la fin d'une section de page
+        if page_lines is not None and line.startswith("=" * 60):
+            if len(page_lines) > 1:  # On a du contenu
+                # Traiter la page complète
+                page_content = "\n".join(page_lines)
+                page_data = self.parse_carrefour_logs(page_content)
+                
+                if page_data:
+                    PAGES.inc()
+                    page_data["device"] = routed.device_id
+                    page_data["content"] = page_content
+                    # L'en-tête (horodatage) change à chaque page : seul le corps sert de clé au cache
+                    header = page_lines[0]
+                    rendered = self.render_cache.render("\n".join(page_lines[1:]))
+                    page_data["markdown"] = f"{header}\n{rendered.markdown}"
+                    page_data["html"] = f"{_inline_html(header)}<br>{rendered.html}"
+                    self.current_page_data = page_data
+                    
+                    # Notifier les clients WebSocket
+                    asyncio.run_coroutine_threadsafe(
+                        self.broadcast_page_update(page_data),
+                        self.loop
+                    )
+            
+            del self.page_lines[routed.device_id]
+            return
+        
+        # Accumuler les lignes de la page courante
+        if page_lines is not None:
+            page_lines.append(line)
     
     async def handle_client(self, websocket, path):
         """Gère les connexions clients WebSocket"""
@@ -541,7 +605,7 @@ def create_dashboard_html():
                 
                 lastUpdate.textContent = `Dernière mise à jour: ${new Date().toLocaleTimeString()}`;
                 
-                if (!pageData || !pageData.markdown) {
+                if (!pageData || !pageData.html) {
                     content.innerHTML = `
                         <div class="no-data">
                             <h3>📱 Aucune donnée disponible</h3>
@@ -559,27 +623,15 @@ def create_dashboard_html():
                     </div>
                 `;
                 
+                // HTML rendu (et assaini) une fois par le serveur pour tous les clients
                 const markdownContent = `
                     <div class="markdown-content">
-                        ${this.formatMarkdown(pageData.markdown)}
+                        ${pageData.html}
                     </div>
                 `;
                 
                 content.innerHTML = pageInfo + markdownContent;
             }
-            
-            formatMarkdown(markdown) {
-                // Conversion basique Markdown vers HTML
-                return markdown
-                    .replace(/^# (.*$)/gim, '<h1>$1</h1>')
-                    .replace(/^## (.*$)/gim, '<h2>$1</h2>')
-                    .replace(/^### (.*$)/gim, '<h3>$1</h3>')
-                    .replace(/^\- \*\*(.*?)\*\*: (.*$)/gim, '<li><strong>$1:</strong> $2</li>')
-                    .replace(/^\- (.*$)/gim, '<li>$1</li>')
-                    .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-                    .replace(/\*(.*?)\*/g, '<em>$1</em>')
-                    .replace(/\n/g, '<br>');
-            }
         }
         
         // Démarrer le dashboard
@@ -592,15 +644,16 @@ def create_dashboard_html():
         f.write(html_content)
     print("📄 Dashboard HTML créé: dashboard.html")
 
-async def main():
-    """Fonction principale"""
+async def main(device_ids: Optional[List[Optional[str]]] = None):
+    """Fonction principale ; `device_ids` : devices dont les routeurs (partagés) sont suivis"""
     print("🚀 Démarrage du Dashboard Carrefour...")
     
     # Créer le fichier HTML du dashboard
     create_dashboard_html()
+    start_metrics_server(metrics_port(9463))
     
     # Créer l'instance du dashboard
-    dashboard = CarrefourDashboard()
+    dashboard = CarrefourDashboard(device_ids)
     
     # Démarrer le monitoring des logs
     dashboard.start_log_monitoring()
@@ -623,4 +676,19 @@ async def main():
     await server.wait_closed()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description='Dashboard Carrefour temps réel')
+    parser.add_argument('-d', '--device', action='append', dest='devices',
+                        help='Serial du device (répétable, "all" pour tous, défaut: device unique)')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    device_ids = args.devices
+    if device_ids and 'all' in device_ids:
+        device_ids = get_client().devices()
+    profiler = start_from_args(args)
+    try:
+        asyncio.run(main(device_ids))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if profiler:
+            profiler.stop()
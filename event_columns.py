@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Archive colonnaire des événements de tracking + agrégations vectorisées NumPy
+
+Chaque colonne est un fichier .npy (chargé en mmap) :
+  - timestamp, id           : int64
+  - eventType, sessionId,
+    packageName, platform   : codes int32 + dictionnaire de valeurs (dictionaries.json)
+Les analyses (comptages group-by, funnels par session, débit par minute) travaillent
+sur ces tableaux au lieu de boucler en Python sur des dicts.
+"""
+import argparse
+import json
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from tracking_events import TrackingEvent, normalize_timestamp
+from tracking_merge import iter_archive, iter_merged_exports
+
+DEFAULT_COLUMNS_DIR = "tracking-columns"
+DICTIONARIES_FILE = "dictionaries.json"
+DICTIONARY_COLUMNS = ('eventType', 'sessionId', 'packageName', 'platform')
+DEFAULT_FUNNEL = ('SESSION_START', 'VIEW_CLICKED', 'ADD_TO_CART')
+MISSING_ID = -1
+
+
+class _DictionaryEncoder:
+    """Encode des chaînes en codes entiers dans l'ordre d'apparition"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+        self.column = array('i')
+
+    def append(self, value: Optional[str]):
+        value = value or ''
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        self.column.append(code)
+
+
+def _event_fields(event) -> Tuple[int, int, str, str, str, str]:
+    """(timestamp, id, eventType, sessionId, packageName, platform) d'un TrackingEvent ou d'un dict brut"""
+    if isinstance(event, TrackingEvent):
+        return (event.timestamp, event.id if event.id is not None else MISSING_ID,
+                event.event_type, event.session_id, event.package_name, event.platform)
+    data = event.get('data') if isinstance(event.get('data'), dict) else {}
+    event_id = event.get('id')
+    return (normalize_timestamp(event.get('timestamp')),
+            event_id if isinstance(event_id, int) else MISSING_ID,
+            event.get('eventType'), event.get('sessionId'),
+            data.get('packageName'), event.get('platform') or data.get('platform'))
+
+
+def write_columns(events: Iterable, columns_dir: str = DEFAULT_COLUMNS_DIR) -> int:
+    """Encode les événements (TrackingEvent ou dicts de l'archive) en colonnes sur disque"""
+    timestamps = array('q')
+    ids = array('q')
+    encoders = {name: _DictionaryEncoder() for name in DICTIONARY_COLUMNS}
+
+    for event in events:
+        timestamp, event_id, event_type, session_id, package_name, platform = _event_fields(event)
+        if timestamp is None:
+            continue
+        timestamps.append(timestamp)
+        ids.append(event_id)
+        encoders['eventType'].append(event_type)
+        encoders['sessionId'].append(session_id)
+        encoders['packageName'].append(package_name)
+        encoders['platform'].append(platform)
+
+    os.makedirs(columns_dir, exist_ok=True)
+    np.save(os.path.join(columns_dir, 'timestamp.npy'), np.frombuffer(timestamps, dtype=np.int64))
+    np.save(os.path.join(columns_dir, 'id.npy'), np.frombuffer(ids, dtype=np.int64))
+    for name, encoder in encoders.items():
+        np.save(os.path.join(columns_dir, f'{name}.npy'), np.frombuffer(encoder.column, dtype=np.int32))
+    with open(os.path.join(columns_dir, DICTIONARIES_FILE), 'w', encoding='utf-8') as f:
+        json.dump({name: encoder.values for name, encoder in encoders.items()}, f, ensure_ascii=False)
+    return len(timestamps)
+
+
+class EventColumns:
+    """Vue colonnaire (éventuellement filtrée) sur l'archive"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], dictionaries: Dict[str, List[str]]):
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    @classmethod
+    def load(cls, columns_dir: str = DEFAULT_COLUMNS_DIR, mmap: bool = True) -> 'EventColumns':
+        mode = 'r' if mmap else None
+        columns = {name: np.load(os.path.join(columns_dir, f'{name}.npy'), mmap_mode=mode)
+                   for name in ('timestamp', 'id') + DICTIONARY_COLUMNS}
+        with open(os.path.join(columns_dir, DICTIONARIES_FILE), 'r', encoding='utf-8') as f:
+            dictionaries = json.load(f)
+        return cls(columns, dictionaries)
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def code(self, column: str, value: str) -> int:
+        """Code d'une valeur dans le dictionnaire d'une colonne (-1 si absente)"""
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return -1
+
+    def mask(self, start: Optional[int] = None, end: Optional[int] = None, **equals: str) -> np.ndarray:
+        """Masque booléen : fenêtre [start, end] + égalités sur les colonnes dictionnaire"""
+        timestamps = self.columns['timestamp']
+        selected = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            selected &= timestamps >= start
+        if end is not None:
+            selected &= timestamps <= end
+        for column, value in equals.items():
+            selected &= self.columns[column] == self.code(column, value)
+        return selected
+
+    def select(self, selected: np.ndarray) -> 'EventColumns':
+        return EventColumns({name: values[selected] for name, values in self.columns.items()}, self.dictionaries)
+
+    def count_by(self, column: str) -> Dict[str, int]:
+        """GROUP BY column COUNT(*) via np.bincount sur les codes"""
+        counts = np.bincount(self.columns[column], minlength=len(self.dictionaries[column]))
+        order = np.argsort(counts)[::-1]
+        return {self.dictionaries[column][code]: int(counts[code]) for code in order if counts[code]}
+
+    def count_by_pair(self, column_a: str, column_b: str) -> Dict[Tuple[str, str], int]:
+        """GROUP BY (column_a, column_b) COUNT(*) via un code combiné"""
+        size_b = len(self.dictionaries[column_b])
+        combined = self.columns[column_a].astype(np.int64) * size_b + self.columns[column_b]
+        codes, counts = np.unique(combined, return_counts=True)
+        return {(self.dictionaries[column_a][code // size_b], self.dictionaries[column_b][code % size_b]): int(count)
+                for code, count in zip(codes, counts)}
+
+    def per_minute_rate(self, event_type: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(début de minute en epoch ms, nombre d'événements) pour chaque minute non vide"""
+        timestamps = self.columns['timestamp']
+        if event_type is not None:
+            timestamps = timestamps[self.columns['eventType'] == self.code('eventType', event_type)]
+        minutes, counts = np.unique(timestamps // 60000, return_counts=True)
+        return minutes * 60000, counts
+
+    def session_funnel(self, steps: Iterable[str] = DEFAULT_FUNNEL) -> List[Tuple[str, int]]:
+        """
+        Nombre de sessions ayant atteint chaque étape dans l'ordre :
+        pour chaque étape, premier timestamp par session postérieur à l'étape précédente
+        """
+        sessions = self.columns['sessionId']
+        timestamps = self.columns['timestamp']
+        event_types = self.columns['eventType']
+        session_count = len(self.dictionaries['sessionId'])
+
+        reached_at = np.full(session_count, np.iinfo(np.int64).min, dtype=np.int64)
+        funnel = []
+        for step in steps:
+            candidates = (event_types == self.code('eventType', step)) & (timestamps >= reached_at[sessions])
+            first = np.full(session_count, np.iinfo(np.int64).max, dtype=np.int64)
+            np.minimum.at(first, sessions[candidates], timestamps[candidates])
+            reached = first != np.iinfo(np.int64).max
+            funnel.append((step, int(reached.sum())))
+            # Les sessions qui n'ont pas atteint l'étape ne peuvent plus progresser
+            reached_at = np.where(reached, first, np.iinfo(np.int64).max)
+        return funnel
+
+    def events_per_session(self) -> Dict[str, int]:
+        return self.count_by('sessionId')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive colonnaire des événements de tracking')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Construire l\'archive colonnaire')
+    build.add_argument('paths', nargs='*', default=['tracking-data-exports', 'temp-tracking-*.json'],
+                       help='Exports JSON, dédoublonnés sur l\'id (défaut: tracking-data-exports + temp-tracking-*.json)')
+    build.add_argument('--from-archive', help='Lire l\'archive dédoublonnée de tracking_merge.py au lieu des exports')
+    build.add_argument('-o', '--output', default=DEFAULT_COLUMNS_DIR)
+
+    stats = subparsers.add_parser('stats', help='Agrégations sur l\'archive colonnaire')
+    stats.add_argument('-i', '--input', default=DEFAULT_COLUMNS_DIR)
+    stats.add_argument('--funnel', nargs='+', default=list(DEFAULT_FUNNEL), help='Étapes du funnel (eventType)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if args.from_archive:
+            events = iter_archive(args.from_archive)
+        else:
+            # Les exports se recouvrent (backups successifs) : sans dédoublonnage, tout est gonflé
+            events = iter_merged_exports(args.paths)
+        count = write_columns(events, args.output)
+        print(f"✅ {count} événements encodés dans {args.output}/")
+        return
+
+    columns = EventColumns.load(args.input)
+    print(f"📊 {len(columns)} événements")
+    print("Par type:")
+    for event_type, count in columns.count_by('eventType').items():
+        print(f"   {event_type:<32} {count}")
+    print("Par plateforme:")
+    for platform, count in columns.count_by('platform').items():
+        print(f"   {platform or '(inconnue)':<32} {count}")
+    print("Funnel:")
+    for step, count in columns.session_funnel(args.funnel):
+        print(f"   {step:<32} {count} sessions")
+    minutes, counts = columns.per_minute_rate()
+    if len(counts):
+        peak = int(np.argmax(counts))
+        print(f"Débit max: {int(counts[peak])} événements/min (minute {int(minutes[peak])})")
+
+
+if __name__ == "__main__":
+    main()
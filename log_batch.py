@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Traitement hors-ligne multi-cœurs des logs de monitoring (monitoring-*.txt)
+
+Chaque fichier est découpé en morceaux alignés sur les fins de ligne ; les morceaux
+sont parsés en parallèle dans un ProcessPoolExecutor avec le parser logcat partagé
+(logcat.py) puis les résultats sont fusionnés dans l'ordre des fichiers et des morceaux.
+Le débit de chaque worker (Mo/s, lignes/s) est rapporté à la fin.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from logcat import parse_threadtime_line, year_from_filename
+from tracking_sessions import LogEventAdapter
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_PATTERNS = ['monitoring-*.txt']
+
+
+class Chunk(NamedTuple):
+    path: str
+    index: int
+    start: int
+    end: int
+
+
+def split_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Chunk]:
+    """Plages d'octets d'environ `chunk_size`, chacune se terminant sur une fin de ligne"""
+    size = os.path.getsize(path)
+    chunks = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                f.seek(end)
+                end += len(f.readline())
+            chunks.append(Chunk(path, len(chunks), start, end))
+            start = end
+    return chunks
+
+
+def process_chunk(chunk: Chunk) -> dict:
+    """Parse un morceau (exécuté dans un worker) ; le temps mesuré est du temps CPU du worker"""
+    started = time.process_time()
+    year = year_from_filename(chunk.path)
+    with open(chunk.path, 'rb') as f:
+        f.seek(chunk.start)
+        data = f.read(chunk.end - chunk.start)
+
+    tags = Counter()
+    priorities = Counter()
+    tracked_lines = []
+    lines = 0
+    parsed = 0
+    first_ms = last_ms = None
+    for line in data.decode('utf-8', errors='replace').lstrip('\ufeff').splitlines():
+        lines += 1
+        record = parse_threadtime_line(line, year)
+        if record is None:
+            continue
+        parsed += 1
+        tags[record.tag] += 1
+        priorities[record.priority] += 1
+        first_ms = record.timestamp_ms if first_ms is None else first_ms
+        last_ms = record.timestamp_ms
+        if 'Event tracked:' in record.message:
+            # Le rattachement aux sessions dépend des morceaux précédents : fait à la fusion
+            tracked_lines.append(line)
+
+    return {
+        'path': chunk.path,
+        'index': chunk.index,
+        'worker': os.getpid(),
+        'bytes': len(data),
+        'lines': lines,
+        'parsed': parsed,
+        'tags': tags,
+        'priorities': priorities,
+        'first_ms': first_ms,
+        'last_ms': last_ms,
+        'tracked_lines': tracked_lines,
+        'elapsed': time.process_time() - started,
+    }
+
+
+def expand_log_paths(patterns: Iterable[str]) -> List[str]:
+    paths = []
+    for pattern in patterns:
+        paths.extend(glob.glob(pattern) or [pattern])
+    return sorted(set(path for path in paths if os.path.isfile(path)))
+
+
+def run_batch(paths: List[str], jobs: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              events_file: Optional[str] = None) -> dict:
+    """Parse tous les fichiers en parallèle et fusionne les résultats dans l'ordre"""
+    chunks = [chunk for path in paths for chunk in split_file(path, chunk_size)]
+    started = time.perf_counter()
+
+    files: Dict[str, dict] = {path: {'bytes': 0, 'lines': 0, 'parsed': 0, 'tags': Counter(),
+                                     'first_ms': None, 'last_ms': None} for path in paths}
+    workers: Dict[int, dict] = {}
+    totals = {'tags': Counter(), 'priorities': Counter(), 'events': 0}
+    adapter = LogEventAdapter()
+    events_out = open(events_file, 'w', encoding='utf-8') if events_file else None
+
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # map() rend les résultats dans l'ordre de soumission : fusion ordonnée sans tri
+            for result in executor.map(process_chunk, chunks, chunksize=1):
+                summary = files[result['path']]
+                for key in ('bytes', 'lines', 'parsed'):
+                    summary[key] += result[key]
+                summary['tags'].update(result['tags'])
+                if result['first_ms'] is not None:
+                    summary['first_ms'] = summary['first_ms'] or result['first_ms']
+                    summary['last_ms'] = result['last_ms']
+                totals['tags'].update(result['tags'])
+                totals['priorities'].update(result['priorities'])
+
+                worker = workers.setdefault(result['worker'], {'chunks': 0, 'bytes': 0, 'lines': 0, 'busy': 0.0})
+                worker['chunks'] += 1
+                worker['bytes'] += result['bytes']
+                worker['lines'] += result['lines']
+                worker['busy'] += result['elapsed']
+
+                year = year_from_filename(result['path'])
+                for line in result['tracked_lines']:
+                    event = adapter.parse(line, year, source=os.path.basename(result['path']))
+                    if event is None:
+                        continue
+                    totals['events'] += 1
+                    if events_out:
+                        events_out.write(json.dumps(event._asdict(), ensure_ascii=False))
+                        events_out.write('\n')
+    finally:
+        if events_out:
+            events_out.close()
+
+    wall = time.perf_counter() - started
+    busy = sum(worker['busy'] for worker in workers.values())
+    return {
+        'files': files,
+        'workers': workers,
+        'chunks': len(chunks),
+        'wall': wall,
+        'busy': busy,
+        'bytes': sum(summary['bytes'] for summary in files.values()),
+        'lines': sum(summary['lines'] for summary in files.values()),
+        **totals,
+    }
+
+
+def print_report(report: dict, top_tags: int = 10):
+    megabytes = report['bytes'] / 1024 / 1024
+    print(f"📊 {len(report['files'])} fichiers, {report['chunks']} morceaux, {megabytes:.1f} Mo, "
+          f"{report['lines']} lignes en {report['wall']:.2f}s "
+          f"({megabytes / report['wall']:.1f} Mo/s)")
+    if report['wall']:
+        print(f"   Parallélisme effectif: x{report['busy'] / report['wall']:.1f} "
+              f"({len(report['workers'])} workers)")
+    print("Workers:")
+    for pid, worker in sorted(report['workers'].items()):
+        rate = worker['bytes'] / 1024 / 1024 / worker['busy'] if worker['busy'] else 0
+        lines_rate = worker['lines'] / worker['busy'] if worker['busy'] else 0
+        print(f"   PID {pid:<8} {worker['chunks']:>4} morceaux  {rate:7.1f} Mo/s  {lines_rate:10.0f} lignes/s")
+    print("Tags:")
+    for tag, count in report['tags'].most_common(top_tags):
+        print(f"   {tag:<32} {count}")
+    print(f"✅ {report['events']} événements de tracking extraits")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Traitement parallèle hors-ligne des logs de monitoring')
+    parser.add_argument('paths', nargs='*', default=DEFAULT_PATTERNS, help='Fichiers ou globs (défaut: monitoring-*.txt)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Nombre de processus (défaut: nombre de cœurs)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE // 1024, help='Taille des morceaux en Ko')
+    parser.add_argument('--events', help='Écrire les événements de tracking extraits (JSON-lines, dans l\'ordre)')
+    args = parser.parse_args()
+
+    paths = expand_log_paths(args.paths)
+    if not paths:
+        print("❌ Aucun fichier de log trouvé")
+        return
+    print(f"🚀 Traitement de {len(paths)} fichiers avec {args.jobs} processus...")
+    print_report(run_batch(paths, args.jobs, args.chunk_size * 1024, args.events))
+
+
+if __name__ == "__main__":
+    main()
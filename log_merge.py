@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Fusion des flux logcat de plusieurs devices en un seul flux ordonné dans le temps
+
+Les horodatages logcat sont ceux de l'horloge du device (et, au format texte, de son
+fuseau) : ils ne sont pas alignés sur l'hôte. Le décalage de chaque device est estimé
+en échantillonnant `date +%s%N%z` via adb (l'échantillon au plus court aller-retour est
+retenu), puis les lignes de tous les routeurs sont fusionnées par tas (k-way merge) sur
+l'heure hôte corrigée. Une ligne est émise quand tous les devices ont dépassé son
+horodatage, ou au plus tard une fenêtre de réordonnancement après sa réception.
+"""
+import argparse
+import heapq
+import itertools
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from adb_client import get_client
+from log_router import LogcatRouter, RoutedLine, get_router
+
+DEFAULT_REORDER_WINDOW_MS = 500
+DEFAULT_CLOCK_SAMPLES = 5
+CLOCK_REFRESH_INTERVAL = 300  # secondes : les horloges dérivent
+MAX_PENDING_LINES = 50000
+DATE_OUTPUT_PATTERN = re.compile(r'(\d+)([+-]\d{4})')
+
+
+class ClockOffset(NamedTuple):
+    device_id: Optional[str]
+    offset_ms: float  # horloge du device - horloge de l'hôte (epoch)
+    zone_ms: int  # fuseau du device - fuseau de l'hôte (lignes threadtime en heure locale)
+    rtt_ms: float  # aller-retour adb de l'échantillon retenu (incertitude ~ rtt / 2)
+
+    def to_host_ms(self, timestamp_ms: int, binary: bool = False) -> float:
+        """Horodatage d'une entrée logcat ramené sur l'horloge (epoch) de l'hôte"""
+        return timestamp_ms - self.offset_ms - (0 if binary else self.zone_ms)
+
+
+def _zone_ms(zone: str) -> int:
+    sign = -1 if zone[0] == '-' else 1
+    return sign * (int(zone[1:3]) * 3600 + int(zone[3:5]) * 60) * 1000
+
+
+def estimate_clock_offset(device_id: Optional[str] = None, samples: int = DEFAULT_CLOCK_SAMPLES) -> ClockOffset:
+    """Décalage de l'horloge du device par rapport à l'hôte (à la NTP : milieu de l'aller-retour le plus court)"""
+    device = get_client().device(device_id)
+    best = None
+    for _ in range(samples):
+        sent = time.time_ns()
+        output = device.shell(['date', '+%s%N%z'])
+        received = time.time_ns()
+        match = DATE_OUTPUT_PATTERN.search(output)
+        if not match:
+            raise ValueError(f"Sortie de date inattendue: {output.strip()!r}")
+        digits, zone = match.groups()
+        # Sans %N (anciens toybox), seules les secondes sont disponibles
+        device_ns = int(digits) if len(digits) > 12 else int(digits) * 1_000_000_000
+        rtt = received - sent
+        if best is None or rtt < best[0]:
+            best = (rtt, device_ns - (sent + received) / 2, zone)
+
+    rtt, offset_ns, zone = best
+    host_zone_ms = int(datetime.now().astimezone().utcoffset().total_seconds() * 1000)
+    return ClockOffset(device_id, offset_ns / 1_000_000, _zone_ms(zone) - host_zone_ms, rtt / 1_000_000)
+
+
+class MergedLine(NamedTuple):
+    host_ms: float  # horodatage corrigé sur l'horloge de l'hôte
+    device_id: Optional[str]
+    routed: RoutedLine
+    latency_ms: float  # réception par l'hôte - émission sur le device
+
+
+class LogMerger:
+    """
+    K-way merge des lignes de plusieurs routeurs sur l'heure hôte corrigée.
+    `handler` est appelé dans le thread du merger, dans l'ordre des horodatages corrigés.
+    """
+
+    def __init__(self, handler: Callable[[MergedLine], None], reorder_window_ms: int = DEFAULT_REORDER_WINDOW_MS,
+                 clock_samples: int = DEFAULT_CLOCK_SAMPLES):
+        self.handler = handler
+        self.reorder_window_ms = reorder_window_ms
+        self.clock_samples = clock_samples
+        self.offsets: Dict[Optional[str], ClockOffset] = {}
+        self.routers: Dict[Optional[str], LogcatRouter] = {}
+        self.latest: Dict[Optional[str], float] = {}  # dernier horodatage corrigé reçu par device
+        self.subscriptions = []
+        self.heap: list = []
+        self.sequence = itertools.count()  # départage les égalités sans comparer les lignes
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        self.emitted = 0
+        self.late = 0  # lignes arrivées après la fenêtre (émises hors ordre)
+        self.last_emitted_ms = float('-inf')
+        self.latency: Dict[Optional[str], list] = {}  # device -> [n, somme, max]
+
+    def add_device(self, device_id: Optional[str], tags: Optional[Iterable[str]], router: Optional[LogcatRouter] = None,
+                   **subscribe_options):
+        """Mesure l'horloge du device et abonne le merger à son routeur"""
+        router = router or get_router(device_id)
+        self.routers[device_id] = router
+        self.refresh_offset(device_id)
+        subscription = router.subscribe(f"merge-{device_id or 'default'}", tags,
+                                        lambda routed: self.push(routed), **subscribe_options)
+        self.subscriptions.append((router, subscription))
+        return subscription
+
+    def refresh_offset(self, device_id: Optional[str]) -> Optional[ClockOffset]:
+        try:
+            offset = estimate_clock_offset(device_id, self.clock_samples)
+        except Exception as e:
+            print(f"⚠️ Horloge de {device_id or 'device'} non mesurée ({e}) : décalage supposé nul")
+            offset = self.offsets.get(device_id) or ClockOffset(device_id, 0.0, 0, 0.0)
+        self.offsets[device_id] = offset
+        return offset
+
+    def push(self, routed: RoutedLine):
+        """Appelé par les threads des routeurs : met la ligne en attente dans le tas"""
+        received_ms = time.time() * 1000
+        offset = self.offsets.get(routed.device_id)
+        if routed.record is None or offset is None:
+            host_ms = received_ms
+        else:
+            router = self.routers.get(routed.device_id)
+            host_ms = offset.to_host_ms(routed.record.timestamp_ms, binary=bool(router and router.binary))
+        merged = MergedLine(host_ms, routed.device_id, routed, received_ms - host_ms)
+        with self.condition:
+            if host_ms > self.latest.get(routed.device_id, float('-inf')):
+                self.latest[routed.device_id] = host_ms
+            heapq.heappush(self.heap, (host_ms, next(self.sequence), received_ms, merged))
+            self.condition.notify()
+
+    def _ready(self) -> List[MergedLine]:
+        """
+        Têtes du tas émissibles : tous les devices ont dépassé leur horodatage (k-way merge),
+        ou elles attendent depuis plus que la fenêtre (device silencieux ou en retard)
+        """
+        ready = []
+        merged_up_to = min(self.latest.values()) if len(self.latest) == len(self.routers) else float('-inf')
+        expired = time.time() * 1000 - self.reorder_window_ms
+        while self.heap:
+            host_ms, _, received_ms, merged = self.heap[0]
+            if host_ms > merged_up_to and received_ms > expired and len(self.heap) <= MAX_PENDING_LINES:
+                break
+            heapq.heappop(self.heap)
+            ready.append(merged)
+        return ready
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='log-merge', daemon=True)
+        self.thread.start()
+        for router, _ in self.subscriptions:
+            router.start()
+
+    def _run(self):
+        refreshed = time.monotonic()
+        while self.running:
+            with self.condition:
+                ready = self._ready()
+                if not ready:
+                    # Réveil au plus tard quand la tête du tas sort de la fenêtre
+                    timeout = self.reorder_window_ms / 1000
+                    if self.heap:
+                        timeout = max(0.005, (self.heap[0][2] + self.reorder_window_ms - time.time() * 1000) / 1000)
+                    self.condition.wait(timeout)
+                    continue
+            for merged in ready:
+                self._emit(merged)
+            if time.monotonic() - refreshed >= CLOCK_REFRESH_INTERVAL:
+                refreshed = time.monotonic()
+                for device_id in list(self.routers):
+                    self.refresh_offset(device_id)
+        with self.condition:
+            remaining = [heapq.heappop(self.heap)[3] for _ in range(len(self.heap))]
+        for merged in remaining:
+            self._emit(merged)
+
+    def _emit(self, merged: MergedLine):
+        if merged.host_ms < self.last_emitted_ms:
+            self.late += 1
+        else:
+            self.last_emitted_ms = merged.host_ms
+        self.emitted += 1
+        stats = self.latency.setdefault(merged.device_id, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += merged.latency_ms
+        stats[2] = max(stats[2], merged.latency_ms)
+        try:
+            self.handler(merged)
+        except Exception as e:
+            print(f"❌ Erreur dans le consommateur du flux fusionné: {e}")
+
+    def stop(self):
+        """Désabonne les routeurs puis vide le tas dans l'ordre"""
+        for router, subscription in self.subscriptions:
+            router.unsubscribe(subscription)
+        self.subscriptions = []
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        if self.thread and threading.current_thread() is not self.thread:
+            self.thread.join(5)
+
+    def stats(self) -> dict:
+        with self.condition:
+            pending = len(self.heap)
+        return {
+            'emitted': self.emitted,
+            'late': self.late,
+            'pending': pending,
+            'devices': {
+                device_id or 'default': {
+                    'offsetMs': round(offset.offset_ms, 1),
+                    'zoneMs': offset.zone_ms,
+                    'rttMs': round(offset.rtt_ms, 1),
+                    'meanLatencyMs': round(self.latency[device_id][1] / self.latency[device_id][0], 1)
+                    if self.latency.get(device_id) else None,
+                    'maxLatencyMs': round(self.latency[device_id][2], 1) if self.latency.get(device_id) else None,
+                }
+                for device_id, offset in self.offsets.items()
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flux logcat fusionné de plusieurs devices, ordonné sur l\'horloge de l\'hôte')
+    parser.add_argument('-d', '--device', action='append', dest='devices', help='Serial du device (répétable, défaut: tous)')
+    parser.add_argument('-t', '--tag', action='append', dest='tags', help='Tag à suivre (répétable, défaut: tous)')
+    parser.add_argument('--window', type=int, default=DEFAULT_REORDER_WINDOW_MS, help='Fenêtre de réordonnancement (ms)')
+    parser.add_argument('--offsets', action='store_true', help='Afficher seulement les décalages d\'horloge mesurés')
+    args = parser.parse_args()
+
+    device_ids = args.devices or get_client().devices()
+    if args.offsets:
+        for device_id in device_ids:
+            offset = estimate_clock_offset(device_id)
+            print(f"⏱️ {device_id}: {offset.offset_ms:+.1f} ms (fuseau {offset.zone_ms / 3600000:+.1f} h, "
+                  f"aller-retour {offset.rtt_ms:.1f} ms)")
+        return
+
+    def print_line(merged: MergedLine):
+        moment = datetime.fromtimestamp(merged.host_ms / 1000).strftime('%H:%M:%S.%f')[:-3]
+        print(f"[{moment}] [{merged.device_id}] {merged.routed.line}")
+
+    merger = LogMerger(print_line, args.window)
+    for device_id in device_ids:
+        merger.add_device(device_id, args.tags)
+    merger.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        merger.stop()
+        print(f"📊 {merger.stats()}")
+
+
+if __name__ == "__main__":
+    main()
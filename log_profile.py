@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Profil de volume des logs : quels tags et quels modèles de message coûtent le plus
+
+Chaque ligne logcat est réduite à un modèle (template) en masquant nombres, ids,
+noms de package et valeurs `clé=valeur`. Pour chaque couple (tag, template) on compte
+lignes, octets et débit, sur des fichiers archivés ou en direct sur un appareil.
+Le rapport indique directement quelles instructions de log supprimer ou limiter.
+"""
+import argparse
+import json
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+from log_batch import expand_log_paths
+from log_scan import repair_mojibake
+from logcat import iter_text_lines, parse_threadtime_line, year_from_filename
+
+DEFAULT_PATTERNS = ['monitoring-*.txt']
+
+# Appliqués dans l'ordre : les plus spécifiques d'abord
+TEMPLATE_MASKS = (
+    (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', re.IGNORECASE), '<uuid>'),
+    (re.compile(r'\b[a-z]+_session_[\w]+'), '<session>'),
+    (re.compile(r'\b[a-zA-Z][\w]*(?:\.[a-zA-Z_][\w]*){2,}\b'), '<pkg>'),
+    (re.compile(r'=[^,{}\[\]]+'), '=<v>'),
+    (re.compile(r'\b0x[0-9a-f]+\b|\b[0-9a-f]*\d[0-9a-f]*[a-f][0-9a-f]*\b', re.IGNORECASE), '<hex>'),
+    (re.compile(r'\d+(?:[.,]\d+)?'), '<n>'),
+)
+
+
+@lru_cache(maxsize=65536)
+def message_template(message: str) -> str:
+    """Modèle d'un message : parties variables masquées (mis en cache, les messages se répètent)"""
+    for pattern, replacement in TEMPLATE_MASKS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+class VolumeProfiler:
+    """Agrégation lignes / octets par (tag, template)"""
+
+    def __init__(self):
+        self.stats: Dict[Tuple[str, str], list] = {}  # clé -> [lignes, octets, exemple]
+        self.tag_stats: Dict[str, list] = {}  # tag -> [lignes, octets]
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.unparsed_lines = 0
+        # [premier, dernier] timestamp de chaque source : le débit ignore les trous entre captures
+        self.spans: list = []
+        self.start_source()
+
+    def start_source(self):
+        """Commence une nouvelle source (fichier ou flux) pour le calcul de la durée couverte"""
+        if not self.spans or self.spans[-1][0] is not None:
+            self.spans.append([None, None])
+
+    def add_line(self, line: str, size: int, year: Optional[int] = None):
+        """Ajoute une ligne brute ; `size` = octets qu'elle occupe dans le flux (fin de ligne comprise)"""
+        self.total_lines += 1
+        self.total_bytes += size
+        record = parse_threadtime_line(line, year)
+        if record is None:
+            self.unparsed_lines += 1
+            return
+        span = self.spans[-1]
+        if span[0] is None or record.timestamp_ms < span[0]:
+            span[0] = record.timestamp_ms
+        if span[1] is None or record.timestamp_ms > span[1]:
+            span[1] = record.timestamp_ms
+
+        key = (record.tag, message_template(record.message))
+        entry = self.stats.get(key)
+        if entry is None:
+            self.stats[key] = [1, size, record.message]
+        else:
+            entry[0] += 1
+            entry[1] += size
+        tag_entry = self.tag_stats.setdefault(record.tag, [0, 0])
+        tag_entry[0] += 1
+        tag_entry[1] += size
+
+    def add_file(self, path: str):
+        year = year_from_filename(path)
+        self.start_source()
+        with open(path, 'rb') as f:
+            for raw in f:
+                self.add_line(repair_mojibake(raw.decode('utf-8', errors='replace').lstrip('\ufeff')), len(raw), year)
+
+    @property
+    def duration_s(self) -> float:
+        return sum(last - first for first, last in self.spans if first is not None) / 1000
+
+    def report(self, top: int = 20) -> dict:
+        """Templates et tags triés par octets, avec part du volume et débit (lignes/min, octets/s)"""
+        duration = self.duration_s
+
+        def rates(lines, size):
+            return {
+                'linesPerMinute': round(lines * 60 / duration, 1) if duration else None,
+                'bytesPerSecond': round(size / duration, 1) if duration else None,
+                'bytesShare': round(size * 100 / self.total_bytes, 2) if self.total_bytes else 0,
+            }
+
+        templates = sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        tags = sorted(self.tag_stats.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'lines': self.total_lines,
+            'bytes': self.total_bytes,
+            'unparsedLines': self.unparsed_lines,
+            'durationSeconds': duration,
+            'templateCount': len(self.stats),
+            'tags': [{'tag': tag, 'lines': lines, 'bytes': size, **rates(lines, size)}
+                     for tag, (lines, size) in tags],
+            'templates': [{'tag': tag, 'template': template, 'lines': lines, 'bytes': size,
+                           'example': example, **rates(lines, size)}
+                          for (tag, template), (lines, size, example) in templates],
+        }
+
+
+def profile_live(profiler: VolumeProfiler, device_id: Optional[str] = None, duration: Optional[float] = None,
+                 logcat_args: Iterable[str] = ()):
+    """Profil d'un flux logcat en direct (Ctrl+C ou `duration` secondes pour arrêter)"""
+    from adb_client import get_client
+
+    stream = get_client().device(device_id).logcat(*logcat_args)
+    profiler.start_source()
+    deadline = time.monotonic() + duration if duration else None
+    try:
+        for raw in iter_text_lines(stream.raw):
+            profiler.add_line(str(raw, 'utf-8', 'replace'), len(raw) + 1)
+            if deadline and time.monotonic() >= deadline:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.close()
+
+
+def print_report(report: dict):
+    megabytes = report['bytes'] / 1024 / 1024
+    print(f"📊 {report['lines']} lignes, {megabytes:.2f} Mo sur {report['durationSeconds'] / 60:.1f} min "
+          f"({report['templateCount']} templates, {report['unparsedLines']} lignes non logcat)")
+    print("Par tag:")
+    for entry in report['tags']:
+        print(f"   {entry['tag']:<28} {entry['lines']:>9} lignes {entry['bytes'] / 1024:>10.0f} Ko "
+              f"{entry['bytesShare']:>6.2f}%  {entry['linesPerMinute'] or 0:>8.0f} l/min")
+    print("Templates les plus coûteux:")
+    for entry in report['templates']:
+        print(f"   {entry['bytesShare']:>6.2f}% {entry['lines']:>9} lignes "
+              f"{entry['linesPerMinute'] or 0:>8.0f} l/min  [{entry['tag']}] {entry['template'][:100]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profil de volume des logs par tag et template de message')
+    parser.add_argument('paths', nargs='*', default=DEFAULT_PATTERNS, help='Fichiers ou globs (défaut: monitoring-*.txt)')
+    parser.add_argument('--live', action='store_true', help='Profiler le flux logcat de l\'appareil au lieu des fichiers')
+    parser.add_argument('-d', '--device', help='Serial de l\'appareil (mode --live)')
+    parser.add_argument('--duration', type=float, help='Durée de la capture en secondes (mode --live)')
+    parser.add_argument('--top', type=int, default=20, help='Nombre de templates affichés')
+    parser.add_argument('--json', action='store_true', help='Sortie JSON')
+    args = parser.parse_args()
+
+    profiler = VolumeProfiler()
+    if args.live:
+        print(f"🔍 Profil du flux logcat{' pendant ' + str(args.duration) + 's' if args.duration else ''} (Ctrl+C pour arrêter)...")
+        profile_live(profiler, args.device, args.duration)
+    else:
+        for path in expand_log_paths(args.paths):
+            profiler.add_file(path)
+
+    report = profiler.report(args.top)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
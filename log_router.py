@@ -0,0 +1,791 @@
+#!/usr/bin/env python3
+"""
+Flux logcat unique par device + routage par tag vers les consommateurs (pub/sub en process)
+
+Au lieu d'un `adb logcat` par consommateur (capture des pages, fichier de monitoring,
+dashboard, parsers par app), chaque device a un seul flux logcat filtré sur l'union des
+tags demandés. Chaque ligne est parsée une fois puis distribuée aux abonnés de son tag ;
+chaque abonné a sa file et son thread, un consommateur lent ne bloque donc pas les autres.
+
+Lancé directement, ce module est le démon de capture qui héberge les consommateurs
+dans un seul process.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import zlib
+from collections import Counter, deque
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from adb_client import get_client
+from logcat import LogcatRecord, format_threadtime, iter_binary_records, iter_text_lines, parse_threadtime_line
+from metrics import add_collector, metrics_port, start_metrics_server
+from profiler import add_profile_arguments, start_from_args
+
+PRIORITIES = 'VDIWEFAS'
+# Rang de chaque priorité : une lettre inconnue vaut V plutôt que de lever dans le thread lecteur
+PRIORITY_RANKS = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+DEFAULT_QUEUE_SIZE = 10000
+TRACKING_PACKAGE = "com.bascule.leclerctracking"
+# Bruit systemui que le serveur blackliste de toute façon : filtré dès le device (logcat -e)
+EXCLUDE_SYSTEMUI_PATTERN = r'^(?!.*com\.android\.systemui)'
+PID_REFRESH_INTERVAL = 15
+RECONNECT_DELAY = 2
+MAX_RECONNECT_DELAY = 30
+# Reprise : -T un peu avant la dernière ligne traitée (les buffers main/system ne sont pas
+# strictement ordonnés), puis les lignes déjà distribuées sont écartées par empreinte
+DEDUP_WINDOW_MS = 1000
+DEDUP_MAX_LINES = 5000
+CHECKPOINT_INTERVAL = 5
+CHECKPOINT_FILE_TEMPLATE = ".logcat-checkpoint-{device}.json"
+# Pertes : au-delà de DROP_RESIZE_THRESHOLD événements de perte, le buffer du device est doublé (logcat -G)
+DROP_RESIZE_THRESHOLD = 3
+MAX_BUFFER_SIZE = 16 * 1024 * 1024
+CHATTY_PATTERN = re.compile(r'(?:identical|expire) (\d+) lines?')
+BUFFER_SIZE_PATTERN = re.compile(r'ring buffer is (\d+(?:\.\d+)?)\s*([KMG]?)i?B', re.IGNORECASE)
+
+
+class RoutedLine(NamedTuple):
+    device_id: Optional[str]
+    line: str  # ligne threadtime brute, sans fin de ligne
+    record: Optional[LogcatRecord]
+
+
+class LogSubscription:
+    """Un abonné : file bornée + thread qui appelle `handler` pour chaque ligne"""
+
+    def __init__(self, name: str, tags: Optional[Iterable[str]], handler: Callable[[RoutedLine], None],
+                 min_priority: str = 'V', queue_size: int = DEFAULT_QUEUE_SIZE,
+                 on_close: Optional[Callable[[], None]] = None, pattern: Optional[str] = None,
+                 package: Optional[str] = None):
+        self.name = name
+        self.tags = frozenset(tags) if tags is not None else None  # None = toutes les lignes
+        self.handler = handler
+        self.min_priority = min_priority
+        self.on_close = on_close
+        # Filtres poussés vers le device quand tous les abonnés du flux en ont un
+        self.pattern = pattern
+        self.regex = re.compile(pattern) if pattern else None
+        self.package = package
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.delivered = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name=f"log-{name}", daemon=True)
+        self.thread.start()
+
+    def accepts(self, record: LogcatRecord, package_pid: Optional[int]) -> bool:
+        """Filtres de l'abonné vérifiés côté hôte (le flux peut être partagé avec des abonnés plus larges)"""
+        if PRIORITY_RANKS.get(record.priority, 0) < PRIORITY_RANKS.get(self.min_priority, 0):
+            return False
+        if self.package and package_pid is not None and record.pid != package_pid:
+            return False
+        return not self.regex or self.regex.search(record.message) is not None
+
+    def offer(self, routed: RoutedLine):
+        """Ajoute sans bloquer le lecteur : si la file est pleine la ligne est comptée comme perdue"""
+        try:
+            self.queue.put_nowait(routed)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        try:
+            while True:
+                routed = self.queue.get()
+                if routed is None:
+                    return
+                try:
+                    self.handler(routed)
+                    self.delivered += 1
+                except Exception as e:
+                    print(f"❌ Erreur dans le consommateur {self.name}: {e}")
+        finally:
+            if self.on_close:
+                self.on_close()
+
+    def close(self, timeout: Optional[float] = 5):
+        """Termine le thread après avoir traité les lignes déjà en file"""
+        self.queue.put(None)
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
+
+
+class ResumeWindow:
+    """
+    Point de reprise d'un flux logcat : dernière ligne traitée (horodatage, pid, tid, séquence
+    dans la milliseconde) et empreintes des lignes de la dernière seconde.
+    Après une reconnexion avec `-T`, les lignes rejouées par logcat sont reconnues et écartées :
+    une ligne identique répétée légitimement n'est écartée que autant de fois qu'elle avait été vue.
+    """
+
+    def __init__(self, window_ms: int = DEDUP_WINDOW_MS, max_lines: int = DEDUP_MAX_LINES):
+        self.window_ms = window_ms
+        self.max_lines = max_lines
+        self.recent: deque = deque()  # empreintes (ms, pid, tid, crc32 du message) dans l'ordre de lecture
+        self.counts: Counter = Counter()
+        self.replay: Optional[Counter] = None  # empreintes revues depuis la reprise (None = pas de reprise en cours)
+        self.last: Optional[tuple] = None  # (ms, pid, tid, séquence)
+        self.duplicates = 0
+        self.check_gap = False  # vérifier que la reprise recouvre bien la fenêtre
+        self.gaps = 0
+        self.gap_ms = 0
+
+    @staticmethod
+    def fingerprint(record: LogcatRecord) -> tuple:
+        return (record.timestamp_ms, record.pid, record.tid, zlib.crc32(record.message.encode('utf-8')))
+
+    def seen(self, record: LogcatRecord) -> bool:
+        """True si l'entrée a déjà été traitée avant la reconnexion (à écarter)"""
+        if self.replay is None:
+            return False
+        timestamp = record.timestamp_ms
+        if self.check_gap:
+            # Le buffer a gardé la fenêtre : la première entrée rejouée est déjà connue.
+            # Sinon il a tourné pendant la coupure et les lignes intermédiaires sont perdues
+            self.check_gap = False
+            if timestamp > self.last[0]:
+                self.gaps += 1
+                self.gap_ms += timestamp - self.last[0]
+        if timestamp > self.last[0] + self.window_ms:
+            self.replay = None  # au-delà de la fenêtre : tout ce qui suit est nouveau
+            return False
+        if timestamp < self.recent[0][0]:
+            self.duplicates += 1  # plus ancien que la fenêtre : déjà traité avant la coupure
+            return True
+        fingerprint = self.fingerprint(record)
+        if self.replay[fingerprint] < self.counts[fingerprint]:
+            self.replay[fingerprint] += 1
+            self.duplicates += 1
+            return True
+        return False
+
+    def add(self, record: LogcatRecord):
+        fingerprint = self.fingerprint(record)
+        timestamp = fingerprint[0]
+        if self.last is not None and self.last[0] == timestamp:
+            sequence = self.last[3] + 1
+        else:
+            sequence = 0
+        self.last = (timestamp, record.pid, record.tid, sequence)
+        self.recent.append(fingerprint)
+        self.counts[fingerprint] += 1
+        while self.recent and (len(self.recent) > self.max_lines or self.recent[0][0] < timestamp - self.window_ms):
+            oldest = self.recent.popleft()
+            self.counts[oldest] -= 1
+            if not self.counts[oldest]:
+                del self.counts[oldest]
+
+    def resume_ms(self, check_gap: bool = False) -> Optional[int]:
+        """Horodatage à passer à `-T` (début de la fenêtre), et passage en mode reprise"""
+        if not self.recent:
+            return None
+        self.replay = Counter()
+        self.check_gap = check_gap
+        return self.recent[0][0]
+
+    def to_dict(self) -> dict:
+        return {'last': self.last, 'recent': list(self.recent)}
+
+    def load(self, data: dict):
+        self.last = tuple(data['last']) if data.get('last') else None
+        for fingerprint in data.get('recent', []):
+            fingerprint = tuple(fingerprint)
+            self.recent.append(fingerprint)
+            self.counts[fingerprint] += 1
+
+
+def parse_buffer_size(output: str) -> Optional[int]:
+    """Taille (octets) du plus petit buffer dans la sortie de `logcat -g`"""
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    sizes = [int(float(value) * units[unit.upper()]) for value, unit in BUFFER_SIZE_PATTERN.findall(output)]
+    return min(sizes) if sizes else None
+
+
+class _CountingReader:
+    """Compte les octets lus sur le flux brut"""
+
+    def __init__(self, raw, router: 'LogcatRouter'):
+        self.raw = raw
+        self.router = router
+
+    def read1(self, size: int) -> bytes:
+        chunk = self.raw.read1(size)
+        self.router.bytes_read += len(chunk)
+        return chunk
+
+
+class LogcatRouter:
+    """
+    Un flux logcat par device, distribué aux abonnés selon le tag.
+    En mode `binary`, le flux est lu au format `logcat -B` (pas de regex par ligne).
+    """
+
+    def __init__(self, device_id: Optional[str] = None, binary: bool = False, pushdown: bool = True):
+        self.device_id = device_id
+        self.binary = binary
+        self.pushdown = pushdown
+        self.subscriptions: List[LogSubscription] = []
+        self.lock = threading.Lock()
+        self.stream = None
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        self.restart_requested = False
+        self.resume = ResumeWindow()
+        self.checkpoint_file: Optional[str] = None  # point de reprise persistant (voir enable_checkpoint)
+        self._checkpoint_saved = 0.0
+        self.check_resume_gap = False  # prochaine reprise : vérifier que le buffer n'a pas tourné
+        self.stream_pid: Optional[int] = None  # --pid du flux qui a produit le point de reprise
+        # Pertes détectées : lignes résumées par chatty, "read: unexpected EOF" de logcat, trous à la reprise
+        self.auto_resize = True
+        self.drops: Counter = Counter()
+        self.drops_since_resize = 0
+        self.buffer_size: Optional[int] = None
+        self.resizes = 0
+        self.package_pids: Dict[str, Optional[int]] = {}
+        self.lines_read = 0  # mode binaire ; en texte, compté par iter_text_lines dans text_stats
+        self.text_stats: dict = {}
+        self.lines_routed = 0
+        self.bytes_read = 0
+        self.bytes_unrouted = 0  # octets transférés puis jetés côté hôte (aucun abonné)
+        self.reconnects = 0
+        self.reader_errors = 0  # exceptions du lecteur hors fermeture volontaire du flux
+
+    def subscribe(self, name: str, tags: Optional[Iterable[str]], handler: Callable[[RoutedLine], None],
+                  min_priority: str = 'V', queue_size: int = DEFAULT_QUEUE_SIZE,
+                  on_close: Optional[Callable[[], None]] = None, pattern: Optional[str] = None,
+                  package: Optional[str] = None) -> LogSubscription:
+        """
+        Abonne `handler` aux lignes des `tags` (None = tout), éventuellement restreintes à un
+        regex sur le message (`pattern`) et au process d'un `package` ; relance le flux si le filtre change
+        """
+        subscription = LogSubscription(name, tags, handler, min_priority, queue_size, on_close, pattern, package)
+        if package and package not in self.package_pids:
+            self.package_pids[package] = self.resolve_pid(package)
+        with self.lock:
+            previous_filter = self.filter_args()
+            self.subscriptions.append(subscription)
+            changed = self.filter_args() != previous_filter
+        if changed and self.running:
+            self._request_restart()
+        return subscription
+
+    def resolve_pid(self, package: str) -> Optional[int]:
+        """PID du process `package` sur le device (pidof), None s'il ne tourne pas"""
+        try:
+            output = get_client().device(self.device_id).shell(['pidof', package]).split()
+            return int(output[0]) if output and output[0].isdigit() else None
+        except Exception:
+            return None
+
+    def unsubscribe(self, subscription: LogSubscription):
+        """Désabonne ; le flux s'arrête quand il n'y a plus d'abonné"""
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+            remaining = len(self.subscriptions)
+        subscription.close()
+        if not remaining:
+            self.stop()
+
+    def filter_specs(self) -> List[str]:
+        """
+        Arguments logcat : union des tags au niveau de priorité le plus bas demandé,
+        plus `chatty` pour compter les lignes que logd a résumées
+        """
+        if not self.subscriptions or any(sub.tags is None for sub in self.subscriptions):
+            return []
+        levels: Dict[str, str] = {}
+        for subscription in self.subscriptions:
+            for tag in subscription.tags:
+                current = levels.get(tag)
+                if current is None or PRIORITY_RANKS.get(subscription.min_priority, 0) < PRIORITY_RANKS.get(current, 0):
+                    levels[tag] = subscription.min_priority
+        levels.setdefault('chatty', 'I')
+        return ['-s'] + [f"{tag}:{priority}" for tag, priority in sorted(levels.items())]
+
+    def pushdown_args(self) -> List[str]:
+        """
+        Filtres exécutés par logcat sur le device, seulement s'ils valent pour tous les abonnés :
+        `-e` (union des regex) et `--pid` (un seul package commun dont le process tourne)
+        """
+        subscriptions = self.subscriptions
+        if not subscriptions or not self.pushdown:
+            return []
+        args = []
+        patterns = sorted({sub.pattern for sub in subscriptions if sub.pattern})
+        if len(patterns) and all(sub.pattern for sub in subscriptions):
+            args += ['-e', patterns[0] if len(patterns) == 1 else '|'.join(f'(?:{pattern})' for pattern in patterns)]
+        pid = self.pushdown_pid()
+        if pid is not None:
+            args += ['--pid', str(pid)]
+        return args
+
+    def pushdown_pid(self) -> Optional[int]:
+        """PID passé à `--pid` (un seul package commun à tous les abonnés, process en cours)"""
+        packages = {sub.package for sub in self.subscriptions}
+        if not self.pushdown or len(packages) != 1 or None in packages:
+            return None
+        return self.package_pids.get(next(iter(packages)))
+
+    def filter_args(self) -> List[str]:
+        return self.pushdown_args() + self.filter_specs()
+
+    def logcat_args(self) -> List[str]:
+        args = ['-B'] if self.binary else ['-v', 'threadtime']
+        pid = self.pushdown_pid()
+        # Process filtré redémarré depuis le point de reprise : les entrées de l'ancien pid sont
+        # exclues par --pid, la première entrée reçue est forcément plus récente (pas un trou)
+        resume_ms = self.resume.resume_ms(check_gap=self.check_resume_gap and pid == self.stream_pid)
+        self.check_resume_gap = False
+        self.stream_pid = pid
+        if resume_ms is not None:
+            # Reprise après un changement de filtre ou une reconnexion : ne pas rejouer tout le buffer
+            args += ['-T', self._format_time(resume_ms)]
+        return args + self.filter_args()
+
+    def _format_time(self, timestamp_ms: int) -> str:
+        """Argument -T : epoch en binaire, heure locale du device (comme les lignes threadtime) en texte"""
+        seconds, millis = divmod(timestamp_ms, 1000)
+        if self.binary:
+            return f"{seconds}.{millis:03d}"
+        return f"{time.strftime('%m-%d %H:%M:%S', time.localtime(seconds))}.{millis:03d}"
+
+    def enable_checkpoint(self, path: Optional[str] = None):
+        """
+        Persiste le point de reprise : un redémarrage du process reprend après la dernière
+        ligne distribuée au lieu de rejouer tout le buffer circulaire
+        """
+        self.checkpoint_file = path or CHECKPOINT_FILE_TEMPLATE.format(device=self.device_id or 'default')
+        if not os.path.exists(self.checkpoint_file):
+            return
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Point de reprise illisible ({self.checkpoint_file}): {e}")
+            return
+        if state.get('binary') != self.binary:
+            print(f"⚠️ Point de reprise ignoré ({self.checkpoint_file}): format logcat différent")
+            return
+        self.resume.load(state)
+        self.stream_pid = state.get('pid')
+        self.check_resume_gap = True
+
+    def save_checkpoint(self):
+        if not self.checkpoint_file or self.resume.last is None:
+            return
+        state = {'device': self.device_id, 'binary': self.binary, 'pid': self.stream_pid, **self.resume.to_dict()}
+        temporary = self.checkpoint_file + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.checkpoint_file)
+        self._checkpoint_saved = time.monotonic()
+
+    def measure_pushdown(self) -> dict:
+        """Octets du buffer actuel (logcat -d) avec le seul filtre de tags vs avec les filtres poussés au device"""
+        device = get_client().device(self.device_id)
+        with self.lock:
+            tag_filter = self.filter_specs()
+            pushdown = self.pushdown_args()
+
+        def dump_size(args):
+            stream = device.logcat('-d', *args)
+            try:
+                return len(stream.read())
+            finally:
+                stream.close()
+
+        before = dump_size(tag_filter)
+        after = dump_size(pushdown + tag_filter) if pushdown else before
+        return {'before': before, 'after': after, 'pushdown': pushdown,
+                'savedPercent': round((before - after) * 100 / before, 1) if before else 0.0}
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._read_loop, name=f"logcat-{self.device_id or 'default'}",
+                                       daemon=True)
+        self.thread.start()
+        if self.package_pids:
+            threading.Thread(target=self._watch_pids, name=f"pidof-{self.device_id or 'default'}", daemon=True).start()
+
+    def _watch_pids(self):
+        """Relance le flux (avec -T) quand un process filtré par --pid redémarre"""
+        while self.running:
+            time.sleep(PID_REFRESH_INTERVAL)
+            changed = False
+            for package, pid in list(self.package_pids.items()):
+                current = self.resolve_pid(package)
+                if current != pid:
+                    self.package_pids[package] = current
+                    changed = True
+            if changed and self.running:
+                self._request_restart()
+
+    def stop(self):
+        self.running = False
+        stream = self.stream
+        if stream:
+            stream.close()
+
+    def _request_restart(self):
+        self.restart_requested = True
+        stream = self.stream
+        if stream:
+            stream.close()
+
+    def _read_loop(self):
+        delay = RECONNECT_DELAY
+        while self.running:
+            self.restart_requested = False
+            try:
+                self.stream = get_client().device(self.device_id).logcat(*self.logcat_args())
+            except Exception as e:
+                # Device débranché ou serveur adb relancé : nouvelle tentative avec backoff
+                if delay == RECONNECT_DELAY:
+                    print(f"❌ Impossible d'ouvrir logcat ({self.device_id or 'device par défaut'}): {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            delay = RECONNECT_DELAY
+            try:
+                if self.binary:
+                    for record in iter_binary_records(_CountingReader(self.stream.raw, self)):
+                        if not self.running:
+                            break
+                        self._route_record(record)
+                else:
+                    # Lignes filtrées par tag sur les octets : seules celles d'un abonné sont décodées
+                    for raw in iter_text_lines(_CountingReader(self.stream.raw, self), self.wanted_tags(),
+                                               (b'unexpected EOF',), stats=self.text_stats):
+                        if not self.running:
+                            break
+                        self._route(raw)
+            except OSError:
+                pass  # socket adb coupée (device débranché) ou fermée par stop() : reconnexion ci-dessous
+            except ValueError:
+                # Lecture sur un flux fermé par stop() ou pour un redémarrage : attendu.
+                # Sinon c'est un bug (décodage, filtre d'abonné) : signalé au lieu d'une reconnexion muette
+                if self.running and not self.restart_requested:
+                    self.reader_errors += 1
+                    print(f"❌ Erreur dans le lecteur logcat ({self.device_id or 'device par défaut'}):")
+                    traceback.print_exc()
+            finally:
+                self.stream.close()
+                self.stream = None
+                self.save_checkpoint()
+            if self.running and not self.restart_requested:
+                # Fin de flux inattendue (ou erreur du lecteur signalée ci-dessus) : reconnexion à partir du dernier horodatage vu (-T)
+                self.reconnects += 1
+                self.check_resume_gap = True
+                print(f"⚠️ Flux logcat interrompu ({self.device_id or 'device par défaut'}), reconnexion...")
+                time.sleep(RECONNECT_DELAY)
+        # Les abonnés restent en place : leurs propriétaires les désabonnent (unsubscribe)
+
+    def wanted_tags(self) -> Optional[List[str]]:
+        """Tags lus côté hôte (ceux du filtre -s), None si un abonné veut toutes les lignes"""
+        with self.lock:
+            specs = self.filter_specs()
+        return [spec.rsplit(':', 1)[0] for spec in specs[1:]] if specs else None
+
+    def _route(self, raw):
+        """Ligne texte (octets ou memoryview, sans fin de ligne) retenue par le filtre de tags"""
+        line = str(raw, 'utf-8', 'replace').rstrip('\r')
+        record = parse_threadtime_line(line)
+        if record is not None:
+            if not self._track(record):
+                return
+        elif 'unexpected EOF' in line:
+            # logcat n'a pas suivi : le buffer a tourné sous le lecteur
+            self._count_drop('overrun')
+        if not self._dispatch(line, record):
+            self.bytes_unrouted += len(raw) + 1
+
+    def _route_record(self, record: LogcatRecord):
+        """Entrée binaire : une ligne routée par ligne du message, comme logcat en texte"""
+        if not self._track(record):
+            return
+        for message_line in record.message.split('\n'):
+            self.lines_read += 1
+            line_record = record._replace(message=message_line) if message_line != record.message else record
+            if not self._dispatch(format_threadtime(line_record), line_record):
+                self.bytes_unrouted += len(message_line) + len(record.tag)
+
+    def _track(self, record: LogcatRecord) -> bool:
+        """Point de reprise et détection des pertes ; False si l'entrée est un doublon rejoué"""
+        if self.resume.seen(record):
+            return False
+        if self.resume.gaps != self.drops['gap']:
+            self._report_gap()
+        self.resume.add(record)
+        self._maybe_checkpoint()
+        if record.tag == 'chatty':
+            self._count_chatty(record)
+        return True
+
+    def _count_chatty(self, record: LogcatRecord):
+        match = CHATTY_PATTERN.search(record.message)
+        if match:
+            self.drops['chattyLines'] += int(match.group(1))
+            self._count_drop('chatty')
+
+    def _report_gap(self):
+        """Le buffer a tourné pendant une coupure : les lignes entre le point de reprise et la reprise sont perdues"""
+        self.drops['gapMs'] = self.resume.gap_ms
+        print(f"⚠️ Trou dans le flux logcat ({self.device_id or 'device par défaut'}): "
+              f"{self.resume.gap_ms} ms perdues au total")
+        self._count_drop('gap', self.resume.gaps - self.drops['gap'])
+
+    def _count_drop(self, kind: str, count: int = 1):
+        self.drops[kind] += count
+        self.drops_since_resize += count
+        if self.auto_resize and self.drops_since_resize >= DROP_RESIZE_THRESHOLD:
+            self.drops_since_resize = 0
+            threading.Thread(target=self.grow_buffer, name=f"logcat-G-{self.device_id or 'default'}",
+                             daemon=True).start()
+
+    def grow_buffer(self) -> Optional[int]:
+        """Double la taille des buffers logcat du device (logcat -G), plafonnée à MAX_BUFFER_SIZE"""
+        device = get_client().device(self.device_id)
+        try:
+            current = self.buffer_size or parse_buffer_size(device.shell(['logcat', '-g']))
+            if current is None or current >= MAX_BUFFER_SIZE:
+                return current
+            size = min(current * 2, MAX_BUFFER_SIZE)
+            output = device.shell(['logcat', '-G', f"{size // 1024}K"])
+        except Exception as e:
+            print(f"❌ Redimensionnement du buffer logcat impossible ({self.device_id or 'device par défaut'}): {e}")
+            return None
+        if 'failed' in output.lower() or 'error' in output.lower():
+            print(f"❌ logcat -G refusé ({self.device_id or 'device par défaut'}): {output.strip()}")
+            return current
+        self.buffer_size = size
+        self.resizes += 1
+        print(f"📈 Buffer logcat {self.device_id or 'device'}: {current // 1024} Ko → {size // 1024} Ko "
+              f"(pertes: {dict(self.drops)})")
+        return size
+
+    def _maybe_checkpoint(self):
+        if self.checkpoint_file and time.monotonic() - self._checkpoint_saved >= CHECKPOINT_INTERVAL:
+            self.save_checkpoint()
+
+    def _dispatch(self, line: str, record: Optional[LogcatRecord]) -> bool:
+        """Distribue la ligne aux abonnés concernés ; False si aucun ne la voulait"""
+        with self.lock:
+            subscriptions = self.subscriptions
+        routed = None
+        for subscription in subscriptions:
+            if subscription.tags is not None:
+                if record is None or record.tag not in subscription.tags:
+                    continue
+            if record is not None and not subscription.accepts(record, self.package_pids.get(subscription.package)):
+                continue
+            routed = routed or RoutedLine(self.device_id, line, record)
+            subscription.offer(routed)
+            self.lines_routed += 1
+        return routed is not None
+
+    def stats(self) -> dict:
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        return {
+            'device': self.device_id,
+            'linesRead': self.lines_read + self.text_stats.get('lines', 0),
+            'linesRouted': self.lines_routed,
+            'bytesRead': self.bytes_read,
+            'bytesUnrouted': self.bytes_unrouted + self.text_stats.get('skippedBytes', 0),
+            'reconnects': self.reconnects,
+            'readerErrors': self.reader_errors,
+            'duplicatesSkipped': self.resume.duplicates,
+            'drops': dict(self.drops),
+            'bufferSize': self.buffer_size,
+            'bufferResizes': self.resizes,
+            'checkpoint': self.resume.last,
+            'filters': self.filter_args(),
+            'subscribers': {sub.name: {'delivered': sub.delivered, 'dropped': sub.dropped,
+                                       'queued': sub.queue.qsize()} for sub in subscriptions},
+        }
+
+
+_routers: Dict[Optional[str], LogcatRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(device_id: Optional[str] = None) -> LogcatRouter:
+    """Routeur partagé du device (un seul flux logcat par device dans le process)"""
+    with _routers_lock:
+        router = _routers.get(device_id)
+        if router is None:
+            router = _routers[device_id] = LogcatRouter(device_id)
+        return router
+
+
+def all_routers() -> List[LogcatRouter]:
+    with _routers_lock:
+        return list(_routers.values())
+
+
+def _router_metrics():
+    """Statistiques des routeurs lues au moment du scrape (aucun coût dans la boucle de lecture)"""
+    stats = [router.stats() for router in all_routers()]
+
+    def per_device(key):
+        return [({'device': entry['device'] or 'default'}, entry[key]) for entry in stats]
+
+    def per_subscriber(key):
+        return [({'device': entry['device'] or 'default', 'subscriber': name}, values[key])
+                for entry in stats for name, values in entry['subscribers'].items()]
+
+    return [
+        ('logcat_lines_read_total', 'counter', 'Lignes logcat lues', per_device('linesRead')),
+        ('logcat_lines_routed_total', 'counter', 'Lignes distribuées aux abonnés', per_device('linesRouted')),
+        ('logcat_bytes_read_total', 'counter', 'Octets logcat reçus du device', per_device('bytesRead')),
+        ('logcat_bytes_unrouted_total', 'counter', 'Octets reçus puis jetés côté hôte', per_device('bytesUnrouted')),
+        ('logcat_reconnects_total', 'counter', 'Reconnexions après fin de flux inattendue', per_device('reconnects')),
+        ('logcat_reader_errors_total', 'counter', 'Erreurs inattendues du thread lecteur', per_device('readerErrors')),
+        ('logcat_duplicates_skipped_total', 'counter', 'Lignes rejouées écartées à la reprise', per_device('duplicatesSkipped')),
+        ('logcat_drops_total', 'counter', 'Pertes détectées (chatty, overrun, gap)',
+         [({'device': entry['device'] or 'default', 'kind': kind}, count) for entry in stats
+          for kind, count in entry['drops'].items() if kind in ('chatty', 'overrun', 'gap')]),
+        ('logcat_chatty_lines_total', 'counter', 'Lignes résumées par chatty',
+         [({'device': entry['device'] or 'default'}, entry['drops'].get('chattyLines', 0)) for entry in stats]),
+        ('logcat_subscriber_queue_depth', 'gauge', 'Lignes en attente dans la file de l\'abonné', per_subscriber('queued')),
+        ('logcat_subscriber_delivered_total', 'counter', 'Lignes traitées par l\'abonné', per_subscriber('delivered')),
+        ('logcat_subscriber_dropped_total', 'counter', 'Lignes perdues (file pleine)', per_subscriber('dropped')),
+    ]
+
+
+add_collector(_router_metrics)
+
+
+class AppLineClassifier:
+    """Parser par app : lignes de tracking mentionnant le package de l'app, classées par motif"""
+
+    TAGS = ('CrossAppTracking', 'AndroidTracking')
+
+    def __init__(self, config_file: str = 'app-configs.json'):
+        import json
+        from app_patterns import get_matcher
+
+        with open(config_file, 'r', encoding='utf-8') as f:
+            apps = json.load(f)['apps']
+        self.packages = {app['packageName']: key for key, app in apps.items() if app.get('packageName')}
+        self.matchers = {key: get_matcher(key, config_file) for key in apps}
+        self.counts: Dict[str, Counter] = {key: Counter() for key in apps}
+
+    def handle(self, routed: RoutedLine):
+        message = routed.record.message if routed.record else routed.line
+        for package, app_key in self.packages.items():
+            if package in message:
+                counts = self.counts[app_key]
+                counts['lines'] += 1
+                counts.update(self.matchers[app_key].classify(message))
+
+    def summary(self) -> Dict[str, dict]:
+        return {app_key: dict(counts) for app_key, counts in self.counts.items() if counts}
+
+
+def _load_script(filename: str):
+    """Importe un script du dépôt dont le nom n'est pas un identifiant Python (carrefour-adb-capture.py...)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    module_name = os.path.splitext(filename)[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Démon de capture : un flux logcat par device, routé vers tous les consommateurs')
+    parser.add_argument('-d', '--device', help='Serial du device (défaut: device par défaut, "all" pour tous)')
+    parser.add_argument('--no-pages', action='store_true', help='Ne pas assembler/envoyer les pages Carrefour')
+    parser.add_argument('--monitor-file', help='Écrire les lignes CrossAppTracking dans ce fichier de monitoring')
+    parser.add_argument('--no-apps', action='store_true', help='Ne pas lancer les parsers par app (app-configs.json)')
+    parser.add_argument('--dashboard', action='store_true', help='Héberger aussi le dashboard WebSocket (carrefour-dashboard.py)')
+    parser.add_argument('--server', default='http://localhost:3001', help='Serveur Node.js pour les pages')
+    parser.add_argument('--binary', action='store_true', help='Lire logcat au format binaire (-B) : moins de CPU par ligne')
+    parser.add_argument('--no-pushdown', action='store_true', help='Ne pas filtrer côté device (-e, --pid)')
+    parser.add_argument('--no-checkpoint', action='store_true', help='Ne pas persister le point de reprise (relit le buffer au redémarrage)')
+    parser.add_argument('--no-auto-resize', action='store_true', help='Ne pas agrandir le buffer logcat (-G) en cas de pertes')
+    parser.add_argument('--metrics-port', type=int, default=metrics_port(9460), help='Port des métriques Prometheus (0 = désactivé)')
+    add_profile_arguments(parser)
+    parser.add_argument('--measure-pushdown', action='store_true', help='Comparer les octets transférés avec/sans filtres device')
+    args = parser.parse_args()
+
+    if args.device == 'all':
+        device_ids = get_client().devices()
+    else:
+        device_ids = [args.device]
+
+    print(f"🚀 Démon de capture logcat ({len(device_ids)} device(s))")
+    start_metrics_server(args.metrics_port)
+    profiler = start_from_args(args)
+    classifier = None
+    captures = []
+    for device_id in device_ids:
+        router = get_router(device_id)
+        router.binary = args.binary
+        router.pushdown = not args.no_pushdown
+        router.auto_resize = not args.no_auto_resize
+        if not args.no_checkpoint:
+            router.enable_checkpoint()
+        if not args.no_pages:
+            capture = _load_script('carrefour-adb-capture.py').CarrefourADBCapture(args.server, device_id=device_id)
+            if capture.start():
+                captures.append(capture)
+        if args.monitor_file:
+            import start_monitoring
+            start_monitoring.subscribe_log_file(router, ['CrossAppTracking'], args.monitor_file,
+                                                f"APK {device_id}" if device_id else "APK", min_priority='D',
+                                                pattern=EXCLUDE_SYSTEMUI_PATTERN, package=TRACKING_PACKAGE)
+        if not args.no_apps:
+            classifier = classifier or AppLineClassifier()
+            router.subscribe('apps', AppLineClassifier.TAGS, classifier.handle,
+                             pattern=EXCLUDE_SYSTEMUI_PATTERN, package=TRACKING_PACKAGE)
+        if args.measure_pushdown:
+            measure = router.measure_pushdown()
+            print(f"   📏 {device_id or 'device'}: {measure['before']} → {measure['after']} octets "
+                  f"(-{measure['savedPercent']}%) avec {' '.join(measure['pushdown']) or 'aucun filtre device'}")
+        router.start()
+
+    if args.dashboard:
+        dashboard = _load_script('carrefour-dashboard.py')
+        threading.Thread(target=lambda: asyncio.run(dashboard.main(device_ids)), name='dashboard', daemon=True).start()
+
+    print("⏹️ Appuyez sur Ctrl+C pour arrêter")
+    try:
+        while any(router.running for router in all_routers()):
+            time.sleep(10)
+            for router in all_routers():
+                stats = router.stats()
+                subscribers = ', '.join(f"{name}: {values['delivered']}" + (f" (-{values['dropped']})" if values['dropped'] else '')
+                                        for name, values in stats['subscribers'].items())
+                print(f"   📊 {stats['device'] or 'device'}: {stats['linesRead']} lignes lues, "
+                      f"{stats['bytesRead']} octets ({stats['bytesUnrouted']} jetés côté hôte, "
+                      f"{stats['duplicatesSkipped']} doublons après reprise) → {subscribers}")
+                if stats['drops']:
+                    print(f"   ⚠️ Pertes {stats['device'] or 'device'}: {stats['drops']}")
+    except KeyboardInterrupt:
+        print("\n👋 Arrêt demandé par l'utilisateur")
+    finally:
+        for capture in captures:
+            capture.stop()
+        for router in all_routers():
+            router.stop()
+        if classifier:
+            for app_key, counts in classifier.summary().items():
+                print(f"   🛒 {app_key}: {counts}")
+        if profiler:
+            profiler.stop()
+
+
+if __name__ == "__main__":
+    main()
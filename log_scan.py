@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Scan mmap des gros fichiers de log : recherche des tags sur les octets bruts
+
+Le fichier est projeté en mémoire et les marqueurs de tag (CrossAppTracking, AndroidTracking,
+OptimizedCarrefour...) sont cherchés directement dans les octets ; seules les lignes qui
+correspondent sont extraites et décodées. Gère le BOM UTF-8, l'UTF-16 (BOM FF FE / FE FF)
+et le mojibake des fichiers écrits par PowerShell (UTF-8 relu en CP437 : `Γ£à` au lieu de `✅`).
+"""
+import argparse
+import mmap
+import os
+import re
+import time
+from collections import Counter
+from typing import Iterable, Iterator, NamedTuple, Tuple
+
+from log_batch import expand_log_paths
+
+DEFAULT_TAGS = ('CrossAppTracking', 'AndroidTracking', 'OptimizedCarrefour')
+DEFAULT_PATTERNS = ['monitoring-*.txt']
+
+BOMS = (
+    (b'\xef\xbb\xbf', 'utf-8'),
+    (b'\xff\xfe', 'utf-16-le'),
+    (b'\xfe\xff', 'utf-16-be'),
+)
+
+
+class ScannedLine(NamedTuple):
+    offset: int  # position du début de ligne dans le fichier (octets)
+    tag: str
+    text: str
+
+
+def detect_encoding(head: bytes) -> Tuple[str, int]:
+    """(encodage, taille du BOM) d'après les premiers octets"""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    return 'utf-8', 0
+
+
+def repair_mojibake(text: str) -> str:
+    """
+    Répare le texte UTF-8 relu en CP437 par PowerShell (`Γ£à` -> `✅`, `├⌐` -> `é`).
+    Une ligne qui n'est pas du mojibake ne survit pas à l'aller-retour et est rendue telle quelle.
+    """
+    if text.isascii():
+        return text
+    try:
+        return text.encode('cp437').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+class LogScanner:
+    """Recherche de tags compilée une fois, réutilisable sur tous les fichiers"""
+
+    def __init__(self, tags: Iterable[str] = DEFAULT_TAGS, repair: bool = True):
+        self.tags = tuple(tags)
+        self.repair = repair
+        self._patterns = {}
+
+    def _pattern(self, encoding: str):
+        """Regex des marqueurs ` TAG:` encodés dans l'encodage du fichier"""
+        pattern = self._patterns.get(encoding)
+        if pattern is None:
+            markers = [f' {tag}:'.encode(encoding) for tag in self.tags]
+            pattern = self._patterns[encoding] = re.compile(b'|'.join(re.escape(marker) for marker in markers))
+        return pattern
+
+    def scan_file(self, path: str) -> Iterator[ScannedLine]:
+        """Lignes contenant un des tags, dans l'ordre du fichier"""
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            encoding, bom_length = detect_encoding(data[:4])
+            newline = '\n'.encode(encoding)
+            unit = len(newline)  # 2 octets par unité en UTF-16
+            pattern = self._pattern(encoding)
+            tags_by_marker = {}
+
+            position = bom_length
+            size = len(data)
+            while position < size:
+                match = pattern.search(data, position)
+                if match is None:
+                    return
+                start = match.start()
+                if (start - bom_length) % unit:
+                    # Correspondance à cheval sur deux caractères UTF-16
+                    position = start + 1
+                    continue
+
+                line_start = self._find_line_start(data, start, newline, bom_length, unit)
+                line_end = data.find(newline, match.end())
+                while line_end != -1 and (line_end - bom_length) % unit:
+                    line_end = data.find(newline, line_end + 1)
+                if line_end == -1:
+                    line_end = size
+
+                marker = match.group(0)
+                tag = tags_by_marker.get(marker)
+                if tag is None:
+                    tag = tags_by_marker[marker] = marker.decode(encoding).strip(' :')
+                text = data[line_start:line_end].decode(encoding, errors='replace').rstrip('\r')
+                if self.repair:
+                    text = repair_mojibake(text)
+                yield ScannedLine(line_start, tag, text)
+                position = line_end + unit
+
+    @staticmethod
+    def _find_line_start(data, position: int, newline: bytes, bom_length: int, unit: int) -> int:
+        index = data.rfind(newline, bom_length, position)
+        while index != -1 and (index - bom_length) % unit:
+            index = data.rfind(newline, bom_length, index)
+        return bom_length if index == -1 else index + unit
+
+    def scan(self, paths: Iterable[str]) -> Iterator[Tuple[str, ScannedLine]]:
+        for path in paths:
+            for line in self.scan_file(path):
+                yield path, line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scan mmap des logs par tag (décodage des seules lignes retenues)')
+    parser.add_argument('paths', nargs='*', default=DEFAULT_PATTERNS, help='Fichiers ou globs (défaut: monitoring-*.txt)')
+    parser.add_argument('-t', '--tag', action='append', dest='tags', help='Tag à rechercher (répétable)')
+    parser.add_argument('--count', action='store_true', help='Compter les lignes par tag au lieu de les afficher')
+    parser.add_argument('--raw', action='store_true', help='Ne pas réparer le mojibake CP437')
+    parser.add_argument('--grep', help='Ne garder que les lignes contenant ce texte (après décodage)')
+    args = parser.parse_args()
+
+    paths = expand_log_paths(args.paths)
+    scanner = LogScanner(args.tags or DEFAULT_TAGS, repair=not args.raw)
+    counts = Counter()
+    started = time.perf_counter()
+    for path, line in scanner.scan(paths):
+        if args.grep and args.grep not in line.text:
+            continue
+        counts[line.tag] += 1
+        if not args.count:
+            print(line.text)
+
+    elapsed = time.perf_counter() - started
+    megabytes = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+    if args.count:
+        for tag, count in counts.most_common():
+            print(f"   {tag:<32} {count}")
+    print(f"✅ {sum(counts.values())} lignes dans {len(paths)} fichiers "
+          f"({megabytes:.1f} Mo en {elapsed:.2f}s, {megabytes / elapsed if elapsed else 0:.0f} Mo/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Parser partagé des lignes logcat au format `threadtime`
+  MM-DD HH:MM:SS.mmm  PID  TID P TAG: message
+Accepte aussi les lignes préfixées par start_monitoring.py / monitor-*.ps1
+(`[HH:MM:SS.mmm] [APK] ...`)
+
+Décode aussi le format binaire de `logcat -B` (entrées logger_entry) vers le même
+LogcatRecord : pas de regex ni de décodage de la ligne entière, timestamps à la nanoseconde.
+
+Les flux texte sont lus en octets par gros blocs (iter_text_lines) : les lignes sont
+découpées en memoryview et filtrées par tag sur les octets, seules les retenues sont décodées.
+"""
+import argparse
+import glob
+import os
+import re
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+THREADTIME_PATTERN = re.compile(
+    r'(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})\.(\d{3})\s+(\d+)\s+(\d+)\s+([VDIWEFA])\s+(.*?)\s*: ?(.*)$'
+)
+
+
+class LogcatRecord(NamedTuple):
+    """Une entrée logcat"""
+    sec: int  # epoch secondes
+    nsec: int
+    pid: int
+    tid: int
+    priority: str  # V, D, I, W, E, F, A
+    tag: str
+    message: str
+
+    @property
+    def timestamp_ms(self) -> int:
+        return self.sec * 1000 + self.nsec // 1_000_000
+
+
+def parse_threadtime_line(line: str, year: Optional[int] = None) -> Optional[LogcatRecord]:
+    """
+    Parse une ligne `threadtime` (None si la ligne n'en est pas une).
+    Le format n'a ni année ni fuseau : `year` (défaut: année courante) et l'heure locale sont utilisés.
+    """
+    match = THREADTIME_PATTERN.search(line)
+    if not match:
+        return None
+    month, day, hour, minute, second, millis, pid, tid, priority, tag, message = match.groups()
+    try:
+        moment = datetime(year or datetime.now().year, int(month), int(day),
+                          int(hour), int(minute), int(second))
+    except ValueError:
+        return None
+    return LogcatRecord(
+        sec=int(time.mktime(moment.timetuple())),
+        nsec=int(millis) * 1_000_000,
+        pid=int(pid),
+        tid=int(tid),
+        priority=priority,
+        tag=tag,
+        message=message.rstrip('\r\n')
+    )
+
+
+def year_from_filename(path: str) -> Optional[int]:
+    """Année d'un fichier de log horodaté (monitoring-20251001-..., monitoring-logs-2025-10-01_...)"""
+    match = re.search(r'(20\d{2})-?\d{2}-?\d{2}', path)
+    return int(match.group(1)) if match else None
+
+
+# struct logger_entry : len, hdr_size, pid, tid, sec, nsec (+ lid en v3, + uid en v4)
+LOGGER_ENTRY_HEADER = struct.Struct('<HHiIII')
+LOGGER_ENTRY_V1_SIZE = 20  # v1 : hdr_size vaut 0 (ancien champ de padding)
+PRIORITY_CODES = {'V': 2, 'D': 3, 'I': 4, 'W': 5, 'E': 6, 'F': 7, 'S': 8}
+# 0 (UNKNOWN) et 1 (DEFAULT) ne sont pas émis par logd mais peuvent venir d'un writer tiers :
+# ramenés à V pour que tout record ait une priorité connue des filtres
+BINARY_PRIORITIES = {0: 'V', 1: 'V', **{code: priority for priority, code in PRIORITY_CODES.items()}}
+BINARY_READ_SIZE = 64 * 1024
+
+
+def decode_binary_records(buffer, offset: int = 0) -> Tuple[List[LogcatRecord], int]:
+    """
+    Décode les entrées complètes de `buffer` à partir de `offset`.
+    Renvoie (records, offset de la première entrée incomplète) : le reste est à compléter
+    avec les octets suivants du flux.
+    """
+    records = []
+    unpack_from = LOGGER_ENTRY_HEADER.unpack_from
+    header_min = LOGGER_ENTRY_HEADER.size
+    end = len(buffer)
+    while end - offset >= header_min:
+        payload_length, header_size, pid, tid, sec, nsec = unpack_from(buffer, offset)
+        header_size = header_size or LOGGER_ENTRY_V1_SIZE
+        entry_end = offset + header_size + payload_length
+        if entry_end > end:
+            break
+        payload_start = offset + header_size
+        offset = entry_end
+        if not payload_length:
+            continue
+
+        # Charge utile : priorité (1 octet), tag\0, message\0
+        tag_end = buffer.find(b'\0', payload_start + 1, entry_end)
+        if tag_end == -1:
+            continue
+        message_end = buffer.find(b'\0', tag_end + 1, entry_end)
+        if message_end == -1:
+            message_end = entry_end
+        records.append(LogcatRecord(
+            sec=sec,
+            nsec=nsec,
+            pid=pid,
+            tid=tid,
+            priority=BINARY_PRIORITIES.get(buffer[payload_start], 'V'),
+            tag=bytes(buffer[payload_start + 1:tag_end]).decode('utf-8', errors='replace'),
+            message=bytes(buffer[tag_end + 1:message_end]).decode('utf-8', errors='replace').rstrip('\n')
+        ))
+    return records, offset
+
+
+def iter_binary_records(stream: BinaryIO, read_size: int = BINARY_READ_SIZE) -> Iterator[LogcatRecord]:
+    """Entrées d'un flux `logcat -B` (fichier ou AdbStream.raw), lues par blocs"""
+    buffer = bytearray()
+    while True:
+        chunk = stream.read1(read_size) if hasattr(stream, 'read1') else stream.read(read_size)
+        if not chunk:
+            return
+        buffer += chunk
+        records, consumed = decode_binary_records(buffer)
+        del buffer[:consumed]
+        yield from records
+
+
+def tag_line_pattern(tags: Iterable[str], markers: Iterable[bytes] = ()) -> 're.Pattern':
+    """Regex (octets) repérant ` P TAG: ` (ou ` P TAG:` en fin de ligne) des tags donnés, ou un des `markers` littéraux"""
+    alternatives = [rb' [VDIWEFA] (?:' + b'|'.join(re.escape(tag.encode('utf-8')) for tag in tags) + rb') *:(?=[ \r\n])']
+    alternatives += [re.escape(marker) for marker in markers]
+    return re.compile(b'|'.join(alternatives))
+
+
+def iter_text_lines(stream: BinaryIO, tags: Optional[Iterable[str]] = None, markers: Iterable[bytes] = (),
+                    read_size: int = BINARY_READ_SIZE, stats: Optional[dict] = None) -> Iterator[memoryview]:
+    """
+    Lignes d'un flux texte (logcat -v threadtime, fichier de log) lues par blocs d'octets et rendues
+    en memoryview, sans fin de ligne ni décodage.
+    Avec `tags`, seules les lignes de ces tags (ou contenant un des `markers`) sont rendues : elles
+    sont repérées par une regex sur le bloc entier, les autres lignes ne sont ni découpées ni décodées.
+    `stats` (dict) reçoit lines, bytes et skippedBytes au fil de la lecture.
+    """
+    pattern = tag_line_pattern(tags, markers) if tags is not None else None
+    stats = stats if stats is not None else {}
+    for key in ('lines', 'bytes', 'skippedBytes'):
+        stats.setdefault(key, 0)
+    pending = b''
+    while True:
+        chunk = stream.read1(read_size) if hasattr(stream, 'read1') else stream.read(read_size)
+        if not chunk:
+            if not pending:
+                return
+            chunk = b'\n'  # dernière ligne sans fin de ligne
+        buffer = pending + chunk if pending else chunk
+        end = buffer.rfind(b'\n') + 1
+        if not end:
+            pending = buffer
+            continue
+        pending = buffer[end:]
+        view = memoryview(buffer)
+        stats['lines'] += buffer.count(b'\n', 0, end)
+        stats['bytes'] += end
+        if pattern is None:
+            start = 0
+            while start < end:
+                stop = buffer.index(b'\n', start)
+                yield view[start:stop]
+                start = stop + 1
+            continue
+        kept = 0
+        position = 0
+        while True:
+            match = pattern.search(buffer, position, end)
+            if match is None:
+                break
+            start = buffer.rfind(b'\n', 0, match.start()) + 1
+            stop = buffer.index(b'\n', match.end())
+            kept += stop + 1 - start
+            yield view[start:stop]
+            position = stop + 1
+        stats['skippedBytes'] += end - kept
+
+
+def encode_binary_record(record: LogcatRecord) -> bytes:
+    """Entrée logger_entry v4 (fixtures de test à partir de logs texte)"""
+    payload = (bytes([PRIORITY_CODES.get(record.priority, 3)]) + record.tag.encode('utf-8') + b'\0'
+               + record.message.encode('utf-8') + b'\0')
+    header = LOGGER_ENTRY_HEADER.pack(len(payload), 28, record.pid, record.tid, record.sec, record.nsec)
+    return header + struct.pack('<II', 0, 0) + payload
+
+
+_prefix_cache: dict = {}
+
+
+def format_threadtime(record: LogcatRecord) -> str:
+    """Ligne `threadtime` équivalente (heure locale), pour les consommateurs qui attendent du texte"""
+    prefix = _prefix_cache.get(record.sec)
+    if prefix is None:
+        if len(_prefix_cache) > 1024:
+            _prefix_cache.clear()
+        prefix = _prefix_cache[record.sec] = time.strftime('%m-%d %H:%M:%S', time.localtime(record.sec))
+    return (f"{prefix}.{record.nsec // 1_000_000:03d} {record.pid:5d} {record.tid:5d} "
+            f"{record.priority} {record.tag}: {record.message}")
+
+
+def bench_readers(paths: List[str], tags: Iterable[str]) -> List[dict]:
+    """
+    Lecteur texte (décodage de chaque ligne, comme `text=True`) contre lecture en octets
+    avec filtre de tags et décodage paresseux, sur des logs enregistrés
+    """
+    tags = list(tags)
+    wanted = set(tags)
+
+    def text_reader(path):
+        decoded = kept = 0
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                decoded += 1
+                record = parse_threadtime_line(line)
+                if record is not None and record.tag in wanted:
+                    kept += 1
+        return decoded, kept
+
+    def byte_reader(path):
+        decoded = kept = 0
+        with open(path, 'rb') as f:
+            for raw in iter_text_lines(f, tags):
+                decoded += 1
+                record = parse_threadtime_line(str(raw, 'utf-8', 'replace'))
+                if record is not None and record.tag in wanted:
+                    kept += 1
+        return decoded, kept
+
+    size = sum(os.path.getsize(path) for path in paths)
+    results = []
+    for name, reader in (('texte (text=True)', text_reader), ('octets + décodage paresseux', byte_reader)):
+        started = time.perf_counter()
+        decoded = kept = 0
+        for path in paths:
+            path_decoded, path_kept = reader(path)
+            decoded += path_decoded
+            kept += path_kept
+        elapsed = time.perf_counter() - started
+        results.append({'reader': name, 'seconds': elapsed, 'bytes': size, 'decodedLines': decoded, 'keptLines': kept,
+                        'megabytesPerSecond': size / 1024 / 1024 / elapsed if elapsed else 0})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Enregistrement / décodage des flux logcat binaires (logcat -B)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Enregistrer le flux binaire d\'un device')
+    record_parser.add_argument('output')
+    record_parser.add_argument('-d', '--device', help='Serial du device')
+    record_parser.add_argument('--dump', action='store_true', help='Buffer actuel seulement (logcat -d)')
+    record_parser.add_argument('filters', nargs='*', help='Filtres logcat (ex: CrossAppTracking:D *:S)')
+
+    decode_parser = subparsers.add_parser('decode', help='Afficher un dump binaire au format threadtime')
+    decode_parser.add_argument('input')
+
+    encode_parser = subparsers.add_parser('encode', help='Convertir un log texte threadtime en dump binaire (fixture)')
+    encode_parser.add_argument('input')
+    encode_parser.add_argument('output')
+
+    bench_parser = subparsers.add_parser('bench', help='Comparer lecture texte et lecture en octets sur des logs enregistrés')
+    bench_parser.add_argument('paths', nargs='*', default=['monitoring-*.txt'], help='Fichiers ou globs')
+    bench_parser.add_argument('-t', '--tag', action='append', dest='tags', help='Tag retenu (répétable, défaut: OptimizedCarrefour)')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from adb_client import get_client
+        logcat_args = ['-B'] + (['-d'] if args.dump else []) + args.filters
+        stream = get_client().device(args.device).logcat(*logcat_args)
+        size = 0
+        try:
+            with open(args.output, 'wb') as f:
+                while True:
+                    chunk = stream.read(BINARY_READ_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stream.close()
+        print(f"✅ {size} octets enregistrés dans {args.output}")
+    elif args.command == 'bench':
+        paths = sorted({path for pattern in args.paths for path in glob.glob(pattern) or [pattern] if os.path.isfile(path)})
+        for result in bench_readers(paths, args.tags or ['OptimizedCarrefour']):
+            print(f"   {result['reader']:<28} {result['megabytesPerSecond']:7.1f} Mo/s  {result['seconds']:6.2f}s  "
+                  f"{result['decodedLines']:>9} lignes décodées  {result['keptLines']:>7} retenues")
+    elif args.command == 'decode':
+        with open(args.input, 'rb') as f:
+            for record in iter_binary_records(f):
+                print(format_threadtime(record))
+    else:
+        year = year_from_filename(args.input)
+        count = 0
+        with open(args.input, 'r', encoding='utf-8-sig', errors='replace') as source, open(args.output, 'wb') as f:
+            for line in source:
+                record = parse_threadtime_line(line, year)
+                if record:
+                    f.write(encode_binary_record(record))
+                    count += 1
+        print(f"✅ {count} entrées écrites dans {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
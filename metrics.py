@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Métriques d'exécution des process Python (capture, dashboard, monitoring)
+
+Registre léger de compteurs, jauges et histogrammes à buckets fixes, exposé au format
+texte Prometheus sur un port HTTP local (`/metrics`). Les valeurs déjà tenues ailleurs
+(statistiques des routeurs logcat) sont lues au moment du scrape par des collecteurs :
+rien n'est ajouté dans les boucles de lecture.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values: Dict[tuple, object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self.lock:
+            return [(self.name, self._labels(key), value) for key, value in self.values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.functions: Dict[tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """Valeur calculée au moment du scrape (taille d'une file, nombre de clients...)"""
+        with self.lock:
+            self.functions[self._key(labels)] = function
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = super().samples()
+        with self.lock:
+            functions = list(self.functions.items())
+        for key, function in functions:
+            try:
+                samples.append((self.name, self._labels(key), function()))
+            except Exception:
+                pass
+        return samples
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]  # comptes par bucket, somme, total
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe la durée (secondes) du bloc"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self.lock:
+            states = [(key, list(state[0]), state[1], state[2]) for key, state in self.values.items()]
+        for key, counts, total, count in states:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+# Collecteur : () -> [(nom, type, aide, [(labels, valeur)])]
+Collector = Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[Dict[str, str], float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Collector] = []
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, labelnames: Iterable[str], **options) -> _Metric:
+        """Une métrique déclarée par plusieurs modules chargés dans le même process est partagée"""
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, labelnames, **options)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Métrique {name} déjà déclarée avec un autre type ou d'autres labels")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def exposition(self) -> str:
+        """Toutes les métriques au format texte Prometheus"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                lines.append(f"# collecteur en erreur: {_escape(str(e))}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {_escape(help_text)}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+add_collector = REGISTRY.add_collector
+
+PROCESS_START = time.time()
+gauge('process_start_time_seconds', 'Démarrage du process (epoch)').set(PROCESS_START)
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def metrics_port(default: int) -> int:
+    """Port du serveur de métriques : METRICS_PORT (0 = désactivé) sinon `default`"""
+    return int(os.environ.get('METRICS_PORT', default))
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> Optional[ThreadingHTTPServer]:
+    """
+    Sert `/metrics` dans un thread ; un seul serveur par process (les scripts hébergés
+    par le démon de capture réutilisent le sien). Ne fait rien si `port` vaut 0.
+    """
+    global _server
+    if _server is not None or not port:
+        return _server
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.exposition().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # pas de ligne par scrape dans la console
+
+    try:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"⚠️ Serveur de métriques indisponible sur le port {port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+    print(f"📈 Métriques: http://{host}:{port}/metrics")
+    return _server
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Moteur de pipeline déclaratif pour les scripts de rebuild/restart
+Lit les étapes et leurs dépendances dans pipeline-configs.json, exécute en parallèle
+les étapes indépendantes, saute les étapes dont les entrées n'ont pas changé
+et produit une trace de timing par étape (format Chrome trace / Perfetto)
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from adb_client import AdbError, get_client
+from apk_install import install_apk_if_needed
+from proc_utils import find_listening_pids, is_port_open, wait_for_port
+
+PIPELINE_CONFIG_FILE = "pipeline-configs.json"
+APP_CONFIG_FILE = "app-configs.json"
+PIPELINE_CACHE_FILE = ".pipeline-cache.json"
+
+ACTIONS: Dict[str, Callable] = {}
+
+
+def action(name: str):
+    """Enregistre une fonction comme action de pipeline : fn(step, context) -> bool"""
+    def decorator(fn):
+        ACTIONS[name] = fn
+        return fn
+    return decorator
+
+
+class Step:
+    """Étape de pipeline telle que déclarée dans la config"""
+
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.action = config['action']
+        self.needs: List[str] = list(config.get('needs', []))
+        self.inputs: List[str] = list(config.get('inputs', []))
+        self.outputs: List[str] = list(config.get('outputs', []))
+        self.wait = config.get('wait', 0)
+        self.params = {key: value for key, value in config.items()
+                       if key not in ('action', 'needs', 'inputs', 'outputs', 'wait')}
+
+    def log(self, message: str):
+        print(f"   [{self.name}] {message}")
+
+
+class PipelineContext:
+    """État partagé par les étapes d'une exécution"""
+
+    def __init__(self, devices: List[Optional[str]], force_install: bool = False):
+        self.devices = devices
+        self.force_install = force_install
+        self.results: Dict[str, dict] = {}
+
+
+def load_pipeline(name: str, config_file: str = PIPELINE_CONFIG_FILE, skip: Iterable[str] = (),
+                  overrides: Optional[Dict[str, dict]] = None) -> Dict[str, Step]:
+    """
+    Charge un pipeline (en résolvant `extends`) et retourne ses étapes.
+    Les étapes de `skip` sont retirées (et des dépendances des autres) ;
+    `overrides` remplace des paramètres d'étapes ({étape: {paramètre: valeur}})
+    """
+    with open(config_file, 'r', encoding='utf-8') as f:
+        pipelines = json.load(f)['pipelines']
+    if name not in pipelines:
+        raise KeyError(f"Pipeline inconnu: {name} (disponibles: {', '.join(pipelines)})")
+
+    chain = []
+    current = name
+    while current:
+        chain.append(pipelines[current])
+        current = pipelines[current].get('extends')
+
+    step_configs = {}
+    for pipeline in reversed(chain):
+        step_configs.update(pipeline.get('steps', {}))
+    for step_name, params in (overrides or {}).items():
+        if step_name not in step_configs:
+            raise KeyError(f"Étape inconnue: {step_name}")
+        step_configs[step_name] = {**step_configs[step_name], **params}
+    skip = set(skip)
+    for step_name in skip:
+        if step_name not in step_configs:
+            raise KeyError(f"Étape inconnue: {step_name}")
+
+    def resolve_needs(needs):
+        """Une étape retirée est remplacée par ses propres dépendances (l'ordre est conservé)"""
+        resolved = []
+        for dependency in needs:
+            for name in (resolve_needs(step_configs[dependency].get('needs', [])) if dependency in skip else [dependency]):
+                if name not in resolved:
+                    resolved.append(name)
+        return resolved
+
+    step_configs = {step_name: {**config, 'needs': resolve_needs(config.get('needs', []))}
+                    for step_name, config in step_configs.items() if step_name not in skip}
+
+    steps = {step_name: Step(step_name, step_config) for step_name, step_config in step_configs.items()}
+    for step in steps.values():
+        if step.action not in ACTIONS:
+            raise KeyError(f"Action inconnue pour l'étape {step.name}: {step.action}")
+        for dependency in step.needs:
+            if dependency not in steps:
+                raise KeyError(f"Dépendance inconnue pour l'étape {step.name}: {dependency}")
+    _check_acyclic(steps)
+    return steps
+
+
+def _check_acyclic(steps: Dict[str, Step]):
+    """Vérifie l'absence de cycle dans les dépendances"""
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Cycle de dépendances: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for dependency in steps[name].needs:
+            visit(dependency, path + [name])
+        state[name] = 'done'
+
+    for name in steps:
+        visit(name, [])
+
+
+def step_fingerprint(step: Step) -> Optional[str]:
+    """Empreinte des paramètres + fichiers d'entrée ; None si l'étape n'est pas cachable"""
+    if not step.inputs:
+        return None
+    digest = hashlib.md5(json.dumps([step.action, step.params], sort_keys=True).encode())
+    for pattern in step.inputs:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            digest.update(path.encode())
+            with open(path, 'rb') as f:
+                digest.update(hashlib.md5(f.read()).digest())
+    return digest.hexdigest()
+
+
+class PipelineRunner:
+    """Exécute un graphe d'étapes en parallèle dans l'ordre des dépendances"""
+
+    def __init__(self, steps: Dict[str, Step], context: PipelineContext,
+                 cache_file: str = PIPELINE_CACHE_FILE, max_workers: int = 4, use_cache: bool = True,
+                 rerun: Iterable[str] = ()):
+        self.steps = steps
+        self.context = context
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self.use_cache = use_cache
+        self.rerun = set(rerun)  # étapes ré-exécutées même si leurs entrées n'ont pas changé
+        self.cache = self._load_cache()
+        self.trace: List[dict] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _load_cache(self) -> Dict[str, str]:
+        if not self.use_cache or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        if self.use_cache:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, indent=2)
+
+    def _run_step(self, step: Step) -> str:
+        start = time.perf_counter()
+        fingerprint = step_fingerprint(step)
+        cached = (self.use_cache and fingerprint is not None and step.name not in self.rerun
+                  and self.cache.get(step.name) == fingerprint
+                  and all(os.path.exists(path) for path in step.outputs))
+
+        if cached:
+            step.log("✅ Entrées inchangées - skip")
+            status = 'cached'
+        else:
+            try:
+                ok = ACTIONS[step.action](step, self.context)
+            except Exception as e:
+                step.log(f"❌ Erreur: {e}")
+                ok = False
+            if ok and step.wait:
+                time.sleep(step.wait)
+            status = 'ok' if ok else 'failed'
+            if ok and fingerprint is not None:
+                with self._lock:
+                    self.cache[step.name] = fingerprint
+
+        self._record(step.name, status, start, time.perf_counter())
+        return status
+
+    def _record(self, name: str, status: str, start: float, end: float):
+        with self._lock:
+            self.trace.append({
+                'name': name,
+                'cat': status,
+                'ph': 'X',
+                'ts': round((start - self._origin) * 1e6),
+                'dur': round((end - start) * 1e6),
+                'pid': os.getpid(),
+                'tid': threading.get_ident()
+            })
+
+    def run(self) -> Dict[str, str]:
+        """Exécute le pipeline ; les dépendants d'une étape échouée sont ignorés"""
+        statuses: Dict[str, str] = {}
+        pending = dict(self.steps)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Répéter tant que des étapes sont ignorées (propagation en cascade)
+                changed = True
+                while changed:
+                    changed = False
+                    for name, step in list(pending.items()):
+                        if any(statuses.get(dep) in ('failed', 'skipped') for dep in step.needs):
+                            statuses[name] = 'skipped'
+                            step.log("⏭️ Ignorée (dépendance en échec)")
+                            del pending[name]
+                            changed = True
+                        elif all(statuses.get(dep) in ('ok', 'cached') for dep in step.needs):
+                            running[executor.submit(self._run_step, step)] = name
+                            del pending[name]
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    statuses[running.pop(future)] = future.result()
+
+        self._save_cache()
+        return statuses
+
+    def write_trace(self, path: str):
+        """Écrit la trace au format Chrome trace (chrome://tracing, ui.perfetto.dev)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.trace}, f, indent=2)
+
+    def print_summary(self, statuses: Dict[str, str]):
+        icons = {'ok': '✅', 'cached': '💾', 'failed': '❌', 'skipped': '⏭️'}
+        for event in sorted(self.trace, key=lambda e: e['ts']):
+            print(f"   {icons[event['cat']]} {event['name']:<24} "
+                  f"début +{event['ts'] / 1000:8.0f} ms  durée {event['dur'] / 1000:8.0f} ms")
+        for name, status in statuses.items():
+            if status == 'skipped':
+                print(f"   {icons[status]} {name:<24} ignorée")
+
+
+def _for_each_device(step: Step, context: PipelineContext, fn) -> bool:
+    ok = True
+    for device_id in context.devices:
+        try:
+            ok = fn(device_id) and ok
+        except (AdbError, OSError) as e:
+            step.log(f"❌ {device_id or 'device'}: {e}")
+            ok = False
+    return ok
+
+
+@action('gradle')
+def run_gradle(step: Step, context: PipelineContext) -> bool:
+    gradlew = 'gradlew.bat' if os.name == 'nt' else './gradlew'
+    cwd = step.params.get('cwd', 'android-app')
+    for task in step.params.get('tasks', ['assembleDebug']):
+        step.log(f"Exécution: gradlew {task}")
+        try:
+            result = subprocess.run([gradlew, task], cwd=cwd, capture_output=True, text=True,
+                                    encoding='utf-8', errors='replace',
+                                    timeout=step.params.get('timeout', 600),
+                                    shell=(os.name == 'nt'))
+        except subprocess.TimeoutExpired:
+            step.log(f"❌ Timeout gradlew {task}")
+            return False
+        if result.returncode != 0:
+            step.log(f"❌ gradlew {task} échoué")
+            return False
+    return True
+
+
+@action('install_apk')
+def install_apk(step: Step, context: PipelineContext) -> bool:
+    apk_path = step.params['apk']
+    return _for_each_device(step, context, lambda device_id: install_apk_if_needed(
+        apk_path, device_id, force=context.force_install))
+
+
+@action('adb_shell')
+def adb_shell(step: Step, context: PipelineContext) -> bool:
+    command = step.params['command']
+
+    def run(device_id):
+        step.log(f"{device_id or 'device'}: {command}")
+        get_client().device(device_id).shell(command)
+        return True
+
+    return _for_each_device(step, context, run)
+
+
+@action('launch_app')
+def launch_app(step: Step, context: PipelineContext) -> bool:
+    package = step.params.get('package')
+    if not package:
+        with open(APP_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            package = json.load(f)['apps'][step.params['app']]['packageName']
+
+    def run(device_id):
+        step.log(f"{device_id or 'device'}: lancement de {package}")
+        get_client().device(device_id).shell(
+            ['monkey', '-p', package, '-c', 'android.intent.category.LAUNCHER', '1'])
+        return True
+
+    return _for_each_device(step, context, run)
+
+
+@action('start_server')
+def start_server(step: Step, context: PipelineContext) -> bool:
+    port = step.params.get('port', 3001)
+    if is_port_open(port):
+        pids = find_listening_pids(port)
+        holder = f" (PID {', '.join(map(str, pids))})" if pids else ""
+        step.log(f"⚠️ Serveur déjà en cours d'exécution sur le port {port}{holder}")
+        return True
+    subprocess.Popen(step.params.get('command', ['node', 'server.js']),
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(port, timeout=step.params.get('timeout', 10)):
+        step.log(f"❌ Le serveur ne répond pas sur le port {port}")
+        return False
+    return True
+
+
+@action('auscultation_checks')
+def auscultation_checks(step: Step, context: PipelineContext) -> bool:
+    from rebuild_and_restart_auscultation import run_auscultation_checks
+    verification = run_auscultation_checks(step.params.get('checks', []))
+    context.results[step.name] = verification
+    return verification['ok']
+
+
+def select_devices(requested: Optional[str]) -> List[Optional[str]]:
+    """Même sélection de devices que rebuild_and_restart.py (-d <id> / -d all / auto)"""
+    try:
+        devices = get_client().devices()
+    except (AdbError, OSError):
+        devices = []
+    if not devices:
+        print("❌ Aucun device Android connecté!")
+        sys.exit(1)
+    if requested == "all":
+        return devices
+    if requested:
+        if requested not in devices:
+            print(f"❌ Device '{requested}' non trouvé! Devices disponibles: {devices}")
+            sys.exit(1)
+        return [requested]
+    if len(devices) > 1:
+        print(f"⚠️ Plusieurs devices détectés: {devices}")
+        print("💡 Utilisez -d <device_id> ou -d all pour spécifier")
+        sys.exit(1)
+    return devices
+
+
+def run_pipeline(name: str, device: Optional[str] = None, config_file: str = PIPELINE_CONFIG_FILE,
+                 force_install: bool = False, use_cache: bool = True, jobs: int = 4, trace: Optional[str] = None,
+                 skip: Iterable[str] = (), overrides: Optional[Dict[str, dict]] = None,
+                 rerun: Iterable[str] = ()) -> Tuple[bool, PipelineContext]:
+    """Exécute un pipeline et affiche le timing par étape ; retourne (succès, contexte)"""
+    steps = load_pipeline(name, config_file, skip, overrides)
+    context = PipelineContext(select_devices(device), force_install=force_install)
+
+    print("=" * 60)
+    print(f"  PIPELINE {name.upper()} ({len(steps)} étapes)")
+    print("=" * 60)
+    print()
+
+    runner = PipelineRunner(steps, context, max_workers=jobs, use_cache=use_cache, rerun=rerun)
+    statuses = runner.run()
+
+    print()
+    print("Timing par étape:")
+    runner.print_summary(statuses)
+    if trace:
+        runner.write_trace(trace)
+        print(f"📄 Trace écrite: {trace}")
+    return not any(status in ('failed', 'skipped') for status in statuses.values()), context
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exécute un pipeline déclaré dans pipeline-configs.json')
+    parser.add_argument('pipeline', nargs='?', default='restart', help='Nom du pipeline (défaut: restart)')
+    parser.add_argument('-d', '--device', help='Device ID spécifique (ou "all" pour tous)')
+    parser.add_argument('--config', default=PIPELINE_CONFIG_FILE, help='Fichier de configuration des pipelines')
+    parser.add_argument('--force-install', action='store_true', help='Réinstaller l\'APK même s\'il est identique')
+    parser.add_argument('--no-cache', action='store_true', help='Ré-exécuter toutes les étapes')
+    parser.add_argument('--skip', action='append', default=[], metavar='STEP', help='Retirer une étape (répétable)')
+    parser.add_argument('--rerun', action='append', default=[], metavar='STEP',
+                        help='Ré-exécuter une étape même si ses entrées n\'ont pas changé (répétable)')
+    parser.add_argument('--jobs', type=int, default=4, help='Nombre d\'étapes exécutées en parallèle')
+    parser.add_argument('--trace', help='Fichier de trace JSON (format Chrome trace)')
+    args = parser.parse_args()
+
+    ok, _ = run_pipeline(args.pipeline, args.device, args.config, args.force_install, not args.no_cache,
+                         args.jobs, args.trace, args.skip, rerun=args.rerun)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Détection de ports et de processus sans passer par `netstat | findstr`
+Sonde TCP directe (multi-plateforme) + scan de /proc sous Linux (psutil si disponible ailleurs)
+"""
+import os
+import socket
+import sys
+import time
+from typing import List, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+TCP_LISTEN_STATE = '0A'
+
+
+def is_port_open(port: int, host: str = '127.0.0.1', timeout: float = 0.2) -> bool:
+    """Vérifie qu'un service écoute sur host:port (connexion TCP avec timeout court)"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_for_port(port: int, host: str = '127.0.0.1', timeout: float = 10, interval: float = 0.1) -> bool:
+    """Attend qu'un port accepte les connexions (au lieu d'un sleep fixe)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_port_open(port, host):
+            return True
+        time.sleep(interval)
+    return False
+
+
+def _listening_inodes(port: int) -> set:
+    """Inodes des sockets en écoute sur `port` (lecture de /proc/net/tcp et tcp6)"""
+    inodes = set()
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table, 'r') as f:
+                next(f, None)  # en-tête
+                for line in f:
+                    fields = line.split()
+                    local_port = int(fields[1].rsplit(':', 1)[1], 16)
+                    if local_port == port and fields[3] == TCP_LISTEN_STATE:
+                        inodes.add(fields[9])
+        except OSError:
+            continue
+    return inodes
+
+
+def _proc_pids() -> List[int]:
+    return [int(entry) for entry in os.listdir('/proc') if entry.isdigit()]
+
+
+def find_listening_pids(port: int) -> Optional[List[int]]:
+    """
+    PIDs des processus qui écoutent sur `port`.
+    Retourne None si la plateforme ne permet pas de le savoir (ni /proc ni psutil).
+    """
+    if psutil is not None:
+        try:
+            return sorted({conn.pid for conn in psutil.net_connections(kind='tcp')
+                           if conn.laddr and conn.laddr.port == port
+                           and conn.status == psutil.CONN_LISTEN and conn.pid})
+        except (psutil.AccessDenied, OSError):
+            pass
+
+    if not sys.platform.startswith('linux'):
+        return None
+
+    targets = {f'socket:[{inode}]' for inode in _listening_inodes(port)}
+    if not targets:
+        return []
+
+    pids = []
+    for pid in _proc_pids():
+        try:
+            fds = os.listdir(f'/proc/{pid}/fd')
+        except OSError:
+            continue  # processus terminé ou d'un autre utilisateur
+        for fd in fds:
+            try:
+                if os.readlink(f'/proc/{pid}/fd/{fd}') in targets:
+                    pids.append(pid)
+                    break
+            except OSError:
+                continue
+    return pids
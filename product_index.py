@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Index produits / prix extrait des pages Carrefour capturées
+
+Chaque page (markdown de CarrefourADBCapture ou dump Appium) est découpée en lignes ;
+les prix sont repérés avec les pricePatterns de app-configs.json (app_patterns.py) et
+associés au nom de produit qui les précède. Les observations sont ajoutées à une base
+SQLite en WAL (pages déjà indexées ignorées via leur hash) :
+  - products : nom normalisé, première/dernière apparition
+  - prices   : historique des prix par produit
+Un trie en mémoire des noms normalisés sert aux recherches par préfixe.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app_patterns import get_matcher
+
+DEFAULT_DB_FILE = "carrefour-products.db"
+MAX_NAME_LENGTH = 120
+# Quantités / conditionnements ("50cL", "1L", "x6", "500 g") : jamais un nom de produit
+QUANTITY_PATTERN = re.compile(r'^(x\s*)?\d+([,.]\d+)?\s*(k?g|c?l|ml|cl|x\s*\d+.*)?$', re.IGNORECASE)
+MARKDOWN_NOISE = re.compile(r'[*_`#>\[\]]+|^\s*[-•]\s*')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT UNIQUE NOT NULL,
+    captured_at INTEGER NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    normalized_name TEXT UNIQUE NOT NULL,
+    display_name TEXT NOT NULL,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_first_seen ON products(first_seen);
+CREATE TABLE IF NOT EXISTS prices (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    page_id INTEGER NOT NULL REFERENCES pages(id),
+    observed_at INTEGER NOT NULL,
+    price_cents INTEGER NOT NULL,
+    unit_price_cents INTEGER,
+    unit TEXT
+);
+CREATE INDEX IF NOT EXISTS prices_product_time ON prices(product_id, observed_at);
+"""
+
+
+class ProductPrice(NamedTuple):
+    name: str
+    price_cents: int
+    unit_price_cents: Optional[int] = None
+    unit: Optional[str] = None
+
+
+def normalize_name(name: str) -> str:
+    """Minuscules, sans accents, ponctuation réduite à des espaces simples"""
+    decomposed = unicodedata.normalize('NFKD', name.lower())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', stripped).split())
+
+
+def parse_price_cents(text: str) -> Optional[int]:
+    match = re.search(r'(\d+)[,.](\d{2})', text)
+    return int(match.group(1)) * 100 + int(match.group(2)) if match else None
+
+
+def _clean_line(line: str) -> str:
+    return MARKDOWN_NOISE.sub('', line).strip(' :-–|\t')
+
+
+def _is_name_candidate(text: str) -> bool:
+    return (2 < len(text) <= MAX_NAME_LENGTH and any(char.isalpha() for char in text)
+            and not QUANTITY_PATTERN.match(text))
+
+
+def extract_products(lines: Iterable[str], app_key: str = 'carrefour') -> List[ProductPrice]:
+    """
+    Couples (produit, prix) d'une page.
+    Le nom est le texte de la ligne du prix s'il en reste, sinon la dernière ligne "nom"
+    rencontrée depuis le prix précédent ; un prix suivi de "/KG", "/L"... est le prix unitaire
+    du produit courant.
+    """
+    matcher = get_matcher(app_key)
+    products: List[ProductPrice] = []
+    candidate_name = None
+
+    for raw_line in lines:
+        line = _clean_line(raw_line)
+        if not line:
+            continue
+        price_matches = list(matcher.price_regex.finditer(line)) if matcher.price_regex else []
+        if not price_matches:
+            if _is_name_candidate(line):
+                candidate_name = line
+            continue
+
+        for match in price_matches:
+            cents = parse_price_cents(match.group(0))
+            if cents is None:
+                continue
+            unit_match = re.match(r'\s*/\s*([A-Za-z]+)', line[match.end():])
+            unit = unit_match.group(1).upper() if unit_match else None
+            if unit is None and '/' in match.group(0):
+                unit = match.group(0).rsplit('/', 1)[1].upper()
+
+            if unit:
+                if products and products[-1].unit_price_cents is None:
+                    products[-1] = products[-1]._replace(unit_price_cents=cents, unit=unit)
+                continue
+
+            inline_name = _clean_line(matcher.price_regex.sub('', line))
+            name = inline_name if _is_name_candidate(inline_name) else candidate_name
+            if name:
+                products.append(ProductPrice(name, cents))
+        candidate_name = None
+    return products
+
+
+class NameTrie:
+    """Trie des noms normalisés -> id produit"""
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def insert(self, name: str, product_id: int):
+        node = self.root
+        for char in name:
+            node = node.setdefault(char, {})
+        node[None] = product_id
+
+    def get(self, name: str) -> Optional[int]:
+        node = self._find(name)
+        return node.get(None) if node is not None else None
+
+    def _find(self, prefix: str) -> Optional[dict]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def with_prefix(self, prefix: str, limit: int = 50) -> List[Tuple[str, int]]:
+        """(nom, id) des noms commençant par `prefix`"""
+        start = self._find(prefix)
+        if start is None:
+            return []
+        results = []
+        stack = [(prefix, start)]
+        while stack and len(results) < limit:
+            name, node = stack.pop()
+            for char, child in sorted(node.items(), key=lambda item: item[0] or '', reverse=True):
+                if char is None:
+                    results.append((name, child))
+                else:
+                    stack.append((name + char, child))
+        return results
+
+
+class ProductIndex:
+    """Index incrémental produits / historique de prix (SQLite WAL)"""
+
+    def __init__(self, db_file: str = DEFAULT_DB_FILE):
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self._trie: Optional[NameTrie] = None
+
+    def close(self):
+        self.connection.close()
+
+    @property
+    def trie(self) -> NameTrie:
+        """Trie chargé à la première recherche puis tenu à jour par add_page"""
+        if self._trie is None:
+            self._trie = NameTrie()
+            for product_id, name in self.connection.execute('SELECT id, normalized_name FROM products'):
+                self._trie.insert(name, product_id)
+        return self._trie
+
+    def add_page(self, content: str, captured_at: Optional[int] = None, source: Optional[str] = None,
+                 app_key: str = 'carrefour') -> Optional[int]:
+        """Indexe une page ; renvoie le nombre de prix ajoutés (None si la page était déjà indexée)"""
+        captured_at = captured_at or int(time.time() * 1000)
+        content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        products = extract_products(content.splitlines(), app_key)
+
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO pages (content_hash, captured_at, source) VALUES (?, ?, ?)',
+                (content_hash, captured_at, source))
+            if not cursor.rowcount:
+                return None
+            page_id = cursor.lastrowid
+            added = 0
+            for product in products:
+                normalized = normalize_name(product.name)
+                if not normalized:
+                    continue
+                product_id = self._upsert_product(normalized, product.name, captured_at)
+                self.connection.execute(
+                    'INSERT INTO prices (product_id, page_id, observed_at, price_cents, unit_price_cents, unit) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (product_id, page_id, captured_at, product.price_cents, product.unit_price_cents, product.unit))
+                added += 1
+        return added
+
+    def _upsert_product(self, normalized: str, display_name: str, seen_at: int) -> int:
+        row = self.connection.execute('SELECT id FROM products WHERE normalized_name = ?', (normalized,)).fetchone()
+        if row:
+            self.connection.execute(
+                'UPDATE products SET last_seen = MAX(last_seen, ?), first_seen = MIN(first_seen, ?) WHERE id = ?',
+                (seen_at, seen_at, row[0]))
+            return row[0]
+        product_id = self.connection.execute(
+            'INSERT INTO products (normalized_name, display_name, first_seen, last_seen) VALUES (?, ?, ?, ?)',
+            (normalized, display_name, seen_at, seen_at)).lastrowid
+        if self._trie is not None:
+            self._trie.insert(normalized, product_id)
+        return product_id
+
+    def find_products(self, query: str, limit: int = 50) -> List[Tuple[str, int]]:
+        """Produits dont le nom normalisé est `query` ou commence par `query`"""
+        normalized = normalize_name(query)
+        product_id = self.trie.get(normalized)
+        if product_id is not None:
+            return [(normalized, product_id)]
+        return self.trie.with_prefix(normalized, limit)
+
+    def price_history(self, query: str) -> Dict[str, List[Tuple[int, int, Optional[int], Optional[str]]]]:
+        """{nom affiché: [(observed_at, price_cents, unit_price_cents, unit), ...]} pour les produits trouvés"""
+        history = {}
+        for _, product_id in self.find_products(query):
+            display_name = self.connection.execute(
+                'SELECT display_name FROM products WHERE id = ?', (product_id,)).fetchone()[0]
+            history[display_name] = self.connection.execute(
+                'SELECT observed_at, price_cents, unit_price_cents, unit FROM prices '
+                'WHERE product_id = ? ORDER BY observed_at', (product_id,)).fetchall()
+        return history
+
+    def new_products_since(self, since: int) -> List[Tuple[str, int]]:
+        """(nom affiché, première apparition) des produits vus pour la première fois après `since` (epoch ms)"""
+        return self.connection.execute(
+            'SELECT display_name, first_seen FROM products WHERE first_seen > ? ORDER BY first_seen',
+            (since,)).fetchall()
+
+
+def _page_from_file(path: str) -> str:
+    """Contenu indexable d'un fichier : page markdown ou textes d'un dump Appium"""
+    if path.endswith('.xml'):
+        from ui_diff import parse_hierarchy
+        return '\n'.join(node.text for node in parse_hierarchy(path).values() if node.text)
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        return f.read()
+
+
+def _parse_since(value: str) -> int:
+    """Epoch ms, ou date/heure ISO (heure locale)"""
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def _format_ms(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index produits / prix des pages Carrefour')
+    parser.add_argument('--db', default=DEFAULT_DB_FILE, help=f'Base SQLite (défaut: {DEFAULT_DB_FILE})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add = subparsers.add_parser('add', help='Indexer des pages (markdown .md/.txt ou dumps Appium .xml)')
+    add.add_argument('files', nargs='+')
+
+    history = subparsers.add_parser('history', help='Historique de prix d\'un produit (nom ou préfixe)')
+    history.add_argument('name')
+
+    new = subparsers.add_parser('new', help='Produits apparus depuis une date')
+    new.add_argument('since', help='Epoch ms ou date ISO (2025-10-02T12:00)')
+    args = parser.parse_args()
+
+    index = ProductIndex(args.db)
+    try:
+        if args.command == 'add':
+            for path in args.files:
+                added = index.add_page(_page_from_file(path), int(os.path.getmtime(path) * 1000), source=path)
+                if added is None:
+                    print(f"   ⏭️ {path}: déjà indexée")
+                else:
+                    print(f"   ✅ {path}: {added} prix")
+        elif args.command == 'history':
+            results = index.price_history(args.name)
+            if not results:
+                print(f"❌ Aucun produit pour '{args.name}'")
+            for name, observations in results.items():
+                print(f"🛒 {name}")
+                for observed_at, price_cents, unit_price_cents, unit in observations:
+                    unit_text = f" ({unit_price_cents / 100:.2f}€/{unit})" if unit_price_cents is not None else ""
+                    print(f"   {_format_ms(observed_at)}  {price_cents / 100:.2f}€{unit_text}")
+        else:
+            products = index.new_products_since(_parse_since(args.since))
+            print(f"🆕 {len(products)} nouveaux produits")
+            for name, first_seen in products:
+                print(f"   {_format_ms(first_seen)}  {name}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
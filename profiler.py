@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Profilage des sessions de capture longues (mode --profile des scripts de capture et du dashboard)
+
+Un thread échantillonne les piles de tous les threads (`sys._current_frames`) à intervalle
+fixe ; chaque échantillon est pondéré par le temps CPU consommé par le thread depuis le
+précédent (Linux), ou compte 1 ailleurs (temps réel). Toutes les `window` secondes, la fenêtre
+est écrite au format « collapsed stacks » (flamegraph.pl, speedscope) puis remise à zéro.
+Seules les `keep` dernières fenêtres sont conservées.
+
+tracemalloc multiplie le coût des allocations : il n'est actif que pendant les dernières
+`memory_slice` secondes de chaque fenêtre, dont les plus grosses allocations encore vivantes
+(et leur évolution d'une fenêtre à l'autre) sont écrites à côté des piles.
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_SAMPLE_INTERVAL = 0.01  # 100 Hz
+DEFAULT_WINDOW = 60
+DEFAULT_KEEP_WINDOWS = 30
+DEFAULT_TOP_ALLOCATIONS = 25
+DEFAULT_MEMORY_SLICE = 1.0  # secondes de tracemalloc par fenêtre
+MAX_STACK_DEPTH = 64
+
+
+def _thread_cpu_clock(ident: int) -> Optional[int]:
+    """Horloge CPU d'un thread (Linux : l'ident Python est le pthread_t)"""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+
+class SamplingProfiler:
+    """Profileur par échantillonnage, sans instrumentation des fonctions profilées"""
+
+    def __init__(self, output_dir: str = DEFAULT_PROFILE_DIR, interval: float = DEFAULT_SAMPLE_INTERVAL,
+                 window: float = DEFAULT_WINDOW, keep: int = DEFAULT_KEEP_WINDOWS, memory: bool = True,
+                 top: int = DEFAULT_TOP_ALLOCATIONS, memory_slice: float = DEFAULT_MEMORY_SLICE):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.window = window
+        self.keep = keep
+        self.memory = memory
+        self.top = top
+        self.memory_slice = memory_slice
+        self.owns_tracemalloc = False  # tracemalloc démarré par quelqu'un d'autre : ne pas l'arrêter
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.cpu_mode = hasattr(time, 'pthread_getcpuclockid')
+        self.cpu_times: Dict[int, int] = {}  # ident -> temps CPU (ns) au précédent échantillon
+        self.frame_names: Dict[object, str] = {}  # code -> "fichier:fonction"
+        self.previous_snapshot = None
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        self.overhead = 0.0  # secondes passées à échantillonner
+
+    def start(self):
+        if self.running:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self.thread.start()
+        mode = 'CPU' if self.cpu_mode else 'temps réel'
+        print(f"🔬 Profilage ({mode}, {1 / self.interval:.0f} Hz) → {self.output_dir}/ toutes les {self.window:.0f}s")
+
+    def stop(self):
+        """Arrête l'échantillonnage et écrit la fenêtre en cours"""
+        if not self.running:
+            return
+        self.running = False
+        if self.thread and threading.current_thread() is not self.thread:
+            self.thread.join(self.interval * 10 + 1)
+        self.flush()
+
+    def _run(self):
+        window_start = time.monotonic()
+        while self.running:
+            time.sleep(self.interval)
+            started = time.perf_counter()
+            self.sample()
+            self.overhead += time.perf_counter() - started
+            elapsed = time.monotonic() - window_start
+            if self.memory and elapsed >= self.window - self.memory_slice and not tracemalloc.is_tracing():
+                tracemalloc.start(1)  # une frame par allocation
+                self.owns_tracemalloc = True
+            if elapsed >= self.window:
+                window_start = time.monotonic()
+                self.flush()
+
+    def _frame_name(self, code) -> str:
+        name = self.frame_names.get(code)
+        if name is None:
+            name = self.frame_names[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+        return name
+
+    def sample(self):
+        """Un échantillon des piles de tous les threads (sauf le profileur)"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            weight = 1
+            if self.cpu_mode:
+                clock = _thread_cpu_clock(ident)
+                if clock is None:
+                    continue
+                try:
+                    now = time.clock_gettime_ns(clock)
+                except OSError:
+                    continue
+                previous = self.cpu_times.get(ident)
+                self.cpu_times[ident] = now
+                if previous is None:
+                    continue
+                weight = (now - previous) // 1000  # microsecondes CPU depuis l'échantillon précédent
+                if weight <= 0:
+                    continue  # thread bloqué (file, socket, sleep) : pas de coût CPU
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(';', '_').replace(' ', '_'))
+            self.stacks[';'.join(reversed(stack))] += weight
+        for ident in [ident for ident in self.cpu_times if ident not in names]:
+            del self.cpu_times[ident]  # thread terminé
+        self.samples += 1
+
+    def flush(self):
+        """Écrit la fenêtre (collapsed stacks + allocations) puis la remet à zéro"""
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        stacks, self.stacks = self.stacks, Counter()
+        samples, self.samples = self.samples, 0
+        kind = 'cpu' if self.cpu_mode else 'wall'
+        if stacks:
+            path = os.path.join(self.output_dir, f"stacks-{kind}-{stamp}.folded")
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, weight in stacks.most_common():
+                    f.write(f"{stack} {weight}\n")
+            self._print_summary(stacks, samples)
+        if self.memory and tracemalloc.is_tracing():
+            self._write_allocations(os.path.join(self.output_dir, f"alloc-{stamp}.txt"))
+            if self.owns_tracemalloc:
+                tracemalloc.stop()
+                self.owns_tracemalloc = False
+        self._rotate()
+
+    def _print_summary(self, stacks: Counter, samples: int):
+        """Fonctions les plus coûteuses en propre (feuille de la pile) sur la fenêtre"""
+        leaves = Counter()
+        for stack, weight in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += weight
+        total = sum(leaves.values()) or 1
+        top = ', '.join(f"{name} {weight * 100 / total:.0f}%" for name, weight in leaves.most_common(3))
+        print(f"   🔬 {samples} échantillons (surcoût {self.overhead:.2f}s) : {top}")
+
+    def _write_allocations(self, path: str):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# allocations des {self.memory_slice:.0f} dernières secondes encore vivantes : "
+                    f"{current / 1024 / 1024:.1f} Mo (pic {peak / 1024 / 1024:.1f} Mo)\n")
+            f.write(f"# top {self.top} par ligne\n")
+            for statistic in snapshot.statistics('lineno')[:self.top]:
+                f.write(f"{statistic}\n")
+            if self.previous_snapshot is not None:
+                f.write(f"\n# top {self.top} variations depuis la fenêtre précédente\n")
+                for statistic in snapshot.compare_to(self.previous_snapshot, 'lineno')[:self.top]:
+                    f.write(f"{statistic}\n")
+        self.previous_snapshot = snapshot
+
+    def _rotate(self):
+        for pattern in ('stacks-*.folded', 'alloc-*.txt'):
+            paths = sorted(glob.glob(os.path.join(self.output_dir, pattern)))
+            for path in paths[:-self.keep] if self.keep else []:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """Options --profile communes aux scripts de capture et au dashboard"""
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_DIR, metavar='DIR',
+                        help=f'Profiler la session (piles + allocations dans DIR, défaut: {DEFAULT_PROFILE_DIR})')
+    parser.add_argument('--profile-window', type=float, default=DEFAULT_WINDOW, help='Durée d\'une fenêtre de profil (s)')
+    parser.add_argument('--profile-no-memory', action='store_true', help='Ne pas suivre les allocations (tracemalloc)')
+
+
+def start_from_args(args) -> Optional[SamplingProfiler]:
+    if not getattr(args, 'profile', None):
+        return None
+    profiler = SamplingProfiler(args.profile, window=args.profile_window, memory=not args.profile_no_memory)
+    profiler.start()
+    return profiler
+
+
+def merge_folded(paths, output: str):
+    """Additionne plusieurs fenêtres en un seul fichier collapsed (flamegraph de toute la session)"""
+    stacks = Counter()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                stack, _, weight = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    stacks[stack] += int(weight)
+    with open(output, 'w', encoding='utf-8') as f:
+        for stack, weight in stacks.most_common():
+            f.write(f"{stack} {weight}\n")
+    return len(stacks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fusion des fenêtres de profil (collapsed stacks) d\'une session')
+    parser.add_argument('paths', nargs='*', default=[os.path.join(DEFAULT_PROFILE_DIR, 'stacks-*.folded')],
+                        help='Fichiers .folded ou globs')
+    parser.add_argument('-o', '--output', default='session.folded', help='Fichier collapsed fusionné')
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.paths for path in glob.glob(pattern) or [pattern] if os.path.isfile(path)})
+    if not paths:
+        print("❌ Aucune fenêtre de profil trouvée")
+        return
+    count = merge_folded(paths, args.output)
+    print(f"✅ {len(paths)} fenêtres fusionnées ({count} piles) → {args.output}")
+    print("   flamegraph.pl session.folded > session.svg  (ou ouvrir dans https://speedscope.app)")
+
+
+if __name__ == "__main__":
+    main()
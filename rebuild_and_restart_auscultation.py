@@ -2,204 +2,52 @@
 """
 Script automatisé complet : Build + Install + Restart Service + Auscultation d'Accessibilité
 Version avec intégration des nouveaux aiguillages d'auscultation
+
+Les étapes sont celles du pipeline `auscultation` de pipeline-configs.json (exécutées par
+pipeline.py) ; ce module fournit les vérifications d'auscultation (action `auscultation_checks`)
+et traduit les options historiques du script en étapes retirées ou paramétrées.
 """
 
-import subprocess
 import sys
-import os
-import time
 import argparse
-import hashlib
 import json
+import subprocess
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-def run_command(cmd, cwd=None, check=True, timeout=300):
-    """Exécute une commande et retourne le résultat"""
-    print(f"   Exécution: {cmd}")
-    try:
-        result = subprocess.run(cmd, shell=True, cwd=cwd, check=check, capture_output=True, text=True, encoding='utf-8', timeout=timeout)
-        if result.stdout:
-            # Afficher les dernières lignes importantes
-            lines = result.stdout.strip().split('\n')
-            for line in lines[-5:]:  # Afficher les 5 dernières lignes
-                if line.strip():
-                    print(f"   {line.strip()}")
-        return result
-    except subprocess.TimeoutExpired as e:
-        print(f"   Timeout après {timeout}s - continuons...")
-        return e
-    except subprocess.CalledProcessError as e:
-        print(f"   Erreur: {e}")
-        if e.stderr:
-            print(f"   {e.stderr.strip()}")
-        return e
-
-def check_appium():
-    """Vérifie qu'Appium tourne"""
-    try:
-        result = subprocess.run("netstat -ano | findstr :4723", shell=True, capture_output=True, text=True)
-        return ":4723" in result.stdout
-    except:
-        return False
-
-def get_file_hash(filepath):
-    """Calcule le hash d'un fichier"""
-    if not os.path.exists(filepath):
-        return None
-    with open(filepath, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
-
-def get_source_files_hash():
-    """Calcule le hash de tous les fichiers sources Kotlin"""
-    source_dir = "android-app/app/src/main/java"
-    if not os.path.exists(source_dir):
-        return None
-    
-    hashes = []
-    for root, dirs, files in os.walk(source_dir):
-        for file in files:
-            if file.endswith('.kt'):
-                filepath = os.path.join(root, file)
-                file_hash = get_file_hash(filepath)
-                if file_hash:
-                    hashes.append(file_hash)
-    
-    if not hashes:
-        return None
-    
-    # Combiner tous les hashes
-    combined = ''.join(sorted(hashes))
-    return hashlib.md5(combined.encode()).hexdigest()
-
-def needs_rebuild():
-    """Vérifie si un rebuild est nécessaire"""
-    apk_path = "android-app/app/build/outputs/apk/debug/app-debug.apk"
-    hash_file = "android-app/.last_build_hash"
-    
-    # Si l'APK n'existe pas, rebuild nécessaire
-    if not os.path.exists(apk_path):
-        print("   APK n'existe pas - rebuild nécessaire")
-        return True
-    
-    # Calculer le hash des sources actuelles
-    current_hash = get_source_files_hash()
-    if not current_hash:
-        print("   Impossible de calculer le hash des sources - rebuild nécessaire")
-        return True
-    
-    # Lire le hash de la dernière build
-    last_hash = None
-    if os.path.exists(hash_file):
-        with open(hash_file, 'r') as f:
-            last_hash = f.read().strip()
-    
-    # Comparer les hashes
-    if current_hash != last_hash:
-        print(f"   Code modifié (hash: {current_hash[:8]}...) - rebuild nécessaire")
-        return True
-    else:
-        print(f"   Code inchangé (hash: {current_hash[:8]}...) - skip rebuild")
-        return False
+SERVER_PORT = 3001
+BUILD_STEPS = ('build', 'install')
 
-def save_build_hash():
-    """Sauvegarde le hash de la build actuelle"""
-    hash_file = "android-app/.last_build_hash"
-    current_hash = get_source_files_hash()
-    if current_hash:
-        with open(hash_file, 'w') as f:
-            f.write(current_hash)
+SERVER_URL = f"http://localhost:{SERVER_PORT}"
 
-def build_auscultation_apk():
-    """Construit l'APK avec l'intégration d'auscultation d'accessibilité"""
-    print("   🔍 Construction de l'APK avec intégration d'auscultation d'accessibilité...")
-    
-    # Vérifier que les fichiers d'auscultation existent
-    auscultation_files = [
-        "android-app/app/src/main/java/com/bascule/leclerctracking/auscultation/A11yEventRaw.kt",
-        "android-app/app/src/main/java/com/bascule/leclerctracking/auscultation/AppAuscultationAnalyzer.kt",
-        "public/auscultation-dashboard.html",
-        "accessibility-auscultation.js"
-    ]
-    
-    missing_files = []
-    for file_path in auscultation_files:
-        if not os.path.exists(file_path):
-            missing_files.append(file_path)
-    
-    if missing_files:
-        print(f"   ⚠️ Fichiers d'auscultation manquants: {missing_files}")
-        print("   📝 Les fichiers seront créés pendant le build...")
-    
-    # Nettoyer le build précédent
-    print("   🧹 Nettoyage du build précédent...")
-    run_command("gradlew clean", cwd="android-app")
-    
-    # Construire l'APK
-    print("   🔨 Construction de l'APK avec fonctionnalités d'auscultation...")
-    result = run_command("gradlew assembleDebug", cwd="android-app", timeout=600)
-    
-    if hasattr(result, 'returncode') and result.returncode != 0:
-        print("   ❌ Build échoué!")
-        return False
-    
-    print("   ✅ APK avec auscultation d'accessibilité construit avec succès!")
-    return True
-
-def start_server():
-    """Démarre le serveur Node.js"""
-    print("   🚀 Démarrage du serveur...")
-    try:
-        # Vérifier si le serveur tourne déjà
-        result = subprocess.run("netstat -ano | findstr :3001", shell=True, capture_output=True, text=True)
-        if ":3001" in result.stdout:
-            print("   ⚠️ Serveur déjà en cours d'exécution sur le port 3001")
-            return True
-        
-        # Démarrer le serveur en arrière-plan
-        subprocess.Popen(["node", "server.js"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        # Attendre que le serveur démarre
-        time.sleep(3)
-        
-        # Vérifier que le serveur répond
-        result = subprocess.run("curl -s http://localhost:3001", shell=True, capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            print("   ✅ Serveur démarré avec succès!")
-            return True
-        else:
-            print("   ⚠️ Serveur démarré mais ne répond pas encore")
-            return True
-            
-    except Exception as e:
-        print(f"   ❌ Erreur lors du démarrage du serveur: {e}")
-        return False
-
-def test_auscultation_integration():
+def test_auscultation_integration(http):
     """Teste l'intégration d'auscultation d'accessibilité"""
     print("   🧪 Test de l'intégration d'auscultation d'accessibilité...")
     
     try:
         # Tester l'endpoint d'auscultation
-        result = subprocess.run("curl -s http://localhost:3001/api/accessibility-stats", shell=True, capture_output=True, text=True, timeout=10)
+        response = http.get(f"{SERVER_URL}/api/accessibility-stats", timeout=10)
         
-        if result.returncode == 0:
+        if response.ok:
             print("   ✅ Endpoints d'auscultation fonctionnels")
             return True
         else:
-            print("   ⚠️ Endpoints d'auscultation non disponibles")
+            print(f"   ⚠️ Endpoints d'auscultation non disponibles (code: {response.status_code})")
             return False
             
     except Exception as e:
         print(f"   ❌ Erreur lors du test: {e}")
         return False
 
-def test_auscultation_advanced():
+def test_auscultation_advanced(http):
     """Teste l'auscultation avancée selon le prompt original"""
     print("   🔍 Test de l'auscultation avancée...")
     
     try:
-        # Exécuter le test d'auscultation avancée
-        result = subprocess.run("node test-auscultation-advanced.js", shell=True, capture_output=True, text=True, timeout=30)
+        # Exécuter le test d'auscultation avancée (script Node, pas de client HTTP partagé)
+        result = subprocess.run(["node", "test-auscultation-advanced.js"], capture_output=True, text=True, timeout=30)
         
         if result.returncode == 0:
             print("   ✅ Test d'auscultation avancée réussi")
@@ -213,31 +61,31 @@ def test_auscultation_advanced():
         print(f"   ❌ Erreur lors du test avancé: {e}")
         return False
 
-def check_auscultation_dashboards():
+def check_auscultation_dashboards(http):
     """Vérifie que les dashboards d'auscultation sont accessibles"""
     print("   📊 Vérification des dashboards d'auscultation...")
     
     dashboards = [
-        ("http://localhost:3001/auscultation-dashboard", "Dashboard d'auscultation avancée"),
-        ("http://localhost:3001/accessibility-dashboard", "Dashboard d'accessibilité standard")
+        (f"{SERVER_URL}/auscultation-dashboard", "Dashboard d'auscultation avancée"),
+        (f"{SERVER_URL}/accessibility-dashboard", "Dashboard d'accessibilité standard")
     ]
     
     accessible_dashboards = []
     
     for url, name in dashboards:
         try:
-            result = subprocess.run(f"curl -s -o nul -w \"%{{http_code}}\" {url}", shell=True, capture_output=True, text=True, timeout=10)
-            if result.stdout.strip() == "200":
+            response = http.get(url, timeout=10)
+            if response.status_code == 200:
                 print(f"   ✅ {name} accessible")
                 accessible_dashboards.append(name)
             else:
-                print(f"   ❌ {name} non accessible (code: {result.stdout.strip()})")
+                print(f"   ❌ {name} non accessible (code: {response.status_code})")
         except Exception as e:
             print(f"   ❌ Erreur lors de la vérification de {name}: {e}")
     
     return len(accessible_dashboards) > 0
 
-def generate_auscultation_report():
+def generate_auscultation_report(http):
     """Génère un rapport d'auscultation"""
     print("   📋 Génération d'un rapport d'auscultation...")
     
@@ -248,7 +96,7 @@ def generate_auscultation_report():
             "sessionId": "test-session-auscultation"
         }
         
-        response = requests.post("http://localhost:3001/api/auscultation-report", json=report_data, timeout=10)
+        response = http.post(f"{SERVER_URL}/api/auscultation-report", json=report_data, timeout=10)
         
         if response.status_code == 200:
             report = response.json()
@@ -262,180 +110,120 @@ def generate_auscultation_report():
         print(f"   ❌ Erreur lors de la génération du rapport: {e}")
         return False
 
+AUSCULTATION_CHECKS = {
+    "integration": test_auscultation_integration,
+    "advanced": test_auscultation_advanced,
+    "dashboards": check_auscultation_dashboards,
+    "report": generate_auscultation_report,
+}
+
+def _timed_check(name, check, http):
+    """Exécute une vérification et mesure sa latence"""
+    start = time.perf_counter()
+    try:
+        ok = bool(check(http))
+        error = None
+    except Exception as e:
+        ok = False
+        error = str(e)
+    return {
+        "check": name,
+        "ok": ok,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        "error": error
+    }
+
+def run_auscultation_checks(names):
+    """
+    Exécute les vérifications demandées en parallèle (indépendantes une fois le serveur démarré)
+    avec une session HTTP partagée, et retourne un résultat JSON consolidé
+    """
+    start = time.perf_counter()
+    http = requests.Session()
+    # Un connecteur par vérification concurrente
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(len(names), 1))
+    http.mount("http://", adapter)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(names), 1)) as executor:
+            futures = [executor.submit(_timed_check, name, AUSCULTATION_CHECKS[name], http) for name in names]
+            results = [future.result() for future in futures]
+    finally:
+        http.close()
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        "ok": all(result["ok"] for result in results),
+        "checks": results
+    }
+
 def main():
-    parser = argparse.ArgumentParser(description='Build + Install + Restart Service + Auscultation')
+    parser = argparse.ArgumentParser(description='Build + Install + Restart Service + Auscultation (pipeline "auscultation")')
     parser.add_argument('--skip-build', action='store_true', help='Skip APK build')
-    parser.add_argument('--auscultation-only', action='store_true', help='Build uniquement avec fonctionnalités d\'auscultation')
+    parser.add_argument('-d', '--device', help='Device ID spécifique (ou "all" pour tous)')
+    parser.add_argument('--force-install', action='store_true', help='Réinstaller l\'APK même s\'il est identique')
+    parser.add_argument('--auscultation-only', action='store_true', help='Rebuild forcé avec les fonctionnalités d\'auscultation')
     parser.add_argument('--test-auscultation', action='store_true', help='Tester l\'intégration d\'auscultation')
     parser.add_argument('--test-advanced', action='store_true', help='Tester l\'auscultation avancée')
     parser.add_argument('--start-server', action='store_true', help='Démarrer le serveur Node.js')
     parser.add_argument('--check-dashboards', action='store_true', help='Vérifier les dashboards')
     parser.add_argument('--generate-report', action='store_true', help='Générer un rapport d\'auscultation')
     parser.add_argument('--full-auscultation', action='store_true', help='Exécuter tous les tests d\'auscultation')
-    
+    parser.add_argument('--results-file', help='Fichier JSON pour le résultat consolidé des vérifications')
+    parser.add_argument('--trace', help='Fichier de trace JSON (format Chrome trace)')
     args = parser.parse_args()
-    
-    print("=" * 60)
-    print("  REBUILD & RESTART + AUSCULTATION D'ACCESSIBILITÉ")
-    print("=" * 60)
-    print()
-    
-    # Etape 1 : Build et Install APK (seulement si nécessaire)
-    if not args.skip_build:
-        print("1. Vérification des modifications...")
-        
-        if needs_rebuild() or args.auscultation_only:
-            print("   Rebuild nécessaire!")
-            
-            if args.auscultation_only or args.full_auscultation:
-                print("   🔍 Mode auscultation d'accessibilité activé")
-                if not build_auscultation_apk():
-                    sys.exit(1)
-            else:
-                print("   Nettoyage...")
-                run_command("gradlew clean", cwd="android-app")
-                
-                print("   Compilation... (peut prendre 2-3 minutes)")
-                result = run_command("gradlew assembleDebug", cwd="android-app", timeout=600)
-                if hasattr(result, 'returncode') and result.returncode != 0:
-                    print("   Build échoué!")
-                    sys.exit(1)
-                print("   Compilation terminée!")
-            
-            # Sauvegarder le hash de cette build
-            save_build_hash()
-        else:
-            print("   Pas de modifications détectées - skip compilation")
-        
-        # Vérification APK
-        apk_path = "android-app/app/build/outputs/apk/debug/app-debug.apk"
-        if not os.path.exists(apk_path):
-            print("   APK non trouvé!")
-            sys.exit(1)
-        
-        # Installation (toujours faire pour être sûr)
-        print("   Installation...")
-        full_path = os.path.abspath(apk_path)
-        print(f"   Chemin APK: {full_path}")
-        run_command(f'adb install -r "{full_path}"')
-        print("   APK installé")
-    else:
-        print("1. Build ignoré (SkipBuild)")
-        print()
-    
-    # Etape 2 : Force stop de l'app
-    print("2. Arrêt de l'app de tracking...")
-    run_command("adb shell am force-stop com.bascule.leclerctracking")
-    print("   App arrêtée")
-    print()
-    
-    # Etape 3 : Vider le cache Logcat
-    print("3. Vidage du cache Logcat...")
-    run_command("adb logcat -c")
-    print("   Cache vidé")
-    print()
-    
-    # Etape 4 : Démarrage du serveur (si demandé)
-    if args.start_server or args.test_auscultation or args.test_advanced or args.full_auscultation:
-        print("4. Démarrage du serveur...")
-        if start_server():
-            print("   ✅ Serveur opérationnel")
-        else:
-            print("   ⚠️ Problème avec le serveur")
-        print()
-    else:
-        print("4. Serveur ignoré (utilisez --start-server pour le démarrer)")
-        print()
-    
-    # Etape 5 : Test de l'intégration d'auscultation
+
+    from pipeline import run_pipeline
+
+    selected_checks = []
     if args.test_auscultation or args.full_auscultation:
-        print("5. Test de l'intégration d'auscultation...")
-        if test_auscultation_integration():
-            print("   ✅ Intégration d'auscultation fonctionnelle")
-        else:
-            print("   ⚠️ Problème avec l'intégration d'auscultation")
-        print()
-    else:
-        print("5. Test d'auscultation ignoré (utilisez --test-auscultation)")
-        print()
-    
-    # Etape 6 : Test de l'auscultation avancée
+        selected_checks.append("integration")
     if args.test_advanced or args.full_auscultation:
-        print("6. Test de l'auscultation avancée...")
-        if test_auscultation_advanced():
-            print("   ✅ Auscultation avancée fonctionnelle")
-        else:
-            print("   ⚠️ Problème avec l'auscultation avancée")
-        print()
-    else:
-        print("6. Test d'auscultation avancée ignoré (utilisez --test-advanced)")
-        print()
-    
-    # Etape 7 : Vérification des dashboards
+        selected_checks.append("advanced")
     if args.check_dashboards or args.full_auscultation:
-        print("7. Vérification des dashboards...")
-        if check_auscultation_dashboards():
-            print("   ✅ Dashboards d'auscultation accessibles")
-        else:
-            print("   ⚠️ Problème avec les dashboards")
-        print()
-    else:
-        print("7. Vérification des dashboards ignorée (utilisez --check-dashboards)")
-        print()
-    
-    # Etape 8 : Génération de rapport
+        selected_checks.append("dashboards")
     if args.generate_report or args.full_auscultation:
-        print("8. Génération de rapport d'auscultation...")
-        if generate_auscultation_report():
-            print("   ✅ Rapport d'auscultation généré")
+        selected_checks.append("report")
+
+    # Options historiques → étapes du pipeline retirées ou paramétrées
+    skip = list(BUILD_STEPS) if args.skip_build else []
+    if not (args.start_server or args.test_auscultation or args.test_advanced or args.full_auscultation):
+        skip.append('start_server')
+    if not selected_checks:
+        skip.append('auscultation_checks')
+    overrides = {'auscultation_checks': {'checks': selected_checks}} if selected_checks else None
+    rerun = ['build'] if args.auscultation_only else []
+
+    ok, context = run_pipeline('auscultation', args.device, force_install=args.force_install, trace=args.trace,
+                               skip=skip, overrides=overrides, rerun=rerun)
+    print()
+
+    verification = context.results.get('auscultation_checks')
+    if verification:
+        print("Vérifications d'auscultation:")
+        for result in verification["checks"]:
+            status = "✅" if result["ok"] else "⚠️"
+            print(f"   {status} {result['check']} ({result['latency_ms']} ms)")
+        print(f"   ⏱️ Durée totale: {verification['total_ms']} ms")
+        if args.results_file:
+            with open(args.results_file, 'w', encoding='utf-8') as f:
+                json.dump(verification, f, indent=2, ensure_ascii=False)
+            print(f"   📄 Résultats consolidés: {args.results_file}")
         else:
-            print("   ⚠️ Problème avec la génération du rapport")
-        print()
-    else:
-        print("8. Génération de rapport ignorée (utilisez --generate-report)")
+            print(json.dumps(verification, indent=2, ensure_ascii=False))
         print()
-    
-    # Etape 9 : Skip Appium (pas nécessaire pour l'auscultation)
-    print("9. Appium ignoré (pas nécessaire pour l'auscultation)")
-    print()
-    
-    # Etape 10 : Skip service restart (pas nécessaire sans Appium)
-    print("10. Service d'accessibilité ignoré (pas nécessaire sans Appium)")
-    print()
-    
-    # Etape 11 : Retour à l'accueil
-    print("11. Retour à l'écran d'accueil...")
-    run_command("adb shell input keyevent KEYCODE_HOME")
-    time.sleep(1)
-    print("   Accueil OK")
-    print()
-    
-    # Etape 12 : Lancer l'app de tracking
-    print("12. Lancement de l'app de tracking...")
-    run_command("adb shell monkey -p com.bascule.leclerctracking -c android.intent.category.LAUNCHER 1")
-    time.sleep(2)
-    print("   App lancée")
-    print()
-    
-    # Etape 13 : Ouvrir les paramètres d'accessibilité
-    print("13. Ouverture des paramètres d'accessibilité...")
-    run_command("adb shell am start -a android.settings.ACCESSIBILITY_SETTINGS")
-    time.sleep(3)
-    print("   Paramètres ouverts - Activez 'OptimizedCarrefourTracking' manuellement")
-    print()
-    
-    # Etape 14 : Lancer Carrefour
-    print("14. Lancement de Carrefour...")
-    run_command("adb shell monkey -p com.carrefour.fid.android -c android.intent.category.LAUNCHER 1")
-    time.sleep(2)
-    print("   Carrefour lancé")
-    print()
-    
+
+    if not ok:
+        print("❌ Pipeline en échec : voir les étapes ci-dessus")
+        sys.exit(1)
+
     print("=" * 60)
     print("  PRÊT POUR L'AUSCULTATION D'ACCESSIBILITÉ!")
     print("=" * 60)
     print()
     print("Prochaines étapes:")
+    print("  - Activez 'OptimizedCarrefourTracking' dans les paramètres d'accessibilité")
     print("  - Lance le serveur: python rebuild_and_restart_auscultation.py --start-server")
     print("  - Test d'auscultation: python rebuild_and_restart_auscultation.py --test-auscultation")
     print("  - Test avancé: python rebuild_and_restart_auscultation.py --test-advanced")
@@ -443,16 +231,8 @@ def main():
     print("  - Build auscultation: python rebuild_and_restart_auscultation.py --auscultation-only")
     print()
     print("Dashboards disponibles:")
-    print("  - Auscultation avancée: http://localhost:3001/auscultation-dashboard")
-    print("  - Accessibilité standard: http://localhost:3001/accessibility-dashboard")
-    print()
-    print("Fonctionnalités d'auscultation:")
-    print("  ✅ Détection d'app et profil d'auscultation")
-    print("  ✅ Normalisation des événements bruts")
-    print("  ✅ Catégorisation e-commerce (ADD_TO_CART, PRODUCT_DETAIL, etc.)")
-    print("  ✅ Inférence d'actions métier avec justification")
-    print("  ✅ Scoring de confiance détaillé")
-    print("  ✅ Rapport structuré JSON + résumé Markdown")
+    print(f"  - Auscultation avancée: {SERVER_URL}/auscultation-dashboard")
+    print(f"  - Accessibilité standard: {SERVER_URL}/accessibility-dashboard")
     print()
 
 if __name__ == "__main__":
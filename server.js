@@ -1486,7 +1486,7 @@ let currentCarrefourPage = '';
 
 // Endpoint pour recevoir les pages Carrefour en Markdown
 app.post('/api/carrefour-page', (req, res) => {
-  const { content, timestamp, deviceId } = req.body;
+  const { content, timestamp, deviceId, tags } = req.body;
   
   if (!content) {
     return res.status(400).json({
@@ -1503,6 +1503,7 @@ app.post('/api/carrefour-page', (req, res) => {
     timestamp: timestamp || new Date().toISOString(),
     content: content,
     deviceId: device,
+    tags: tags || {},
     preview: content.split('\n')[0] || 'Page Carrefour'
   };
   
@@ -2,6 +2,7 @@
 """
 Script de monitoring complet : APK logs + Server logs
 """
+import os
 import subprocess
 import sys
 import time
@@ -9,29 +10,90 @@ import threading
 import datetime
 import argparse
 
+from adb_client import get_client
+from log_merge import LogMerger
+from log_router import EXCLUDE_SYSTEMUI_PATTERN, TRACKING_PACKAGE, get_router
+from metrics import counter, metrics_port, start_metrics_server
+
+LINES_WRITTEN = counter('monitoring_lines_written_total', 'Lignes écrites dans le fichier de monitoring', ['source'])
+
+def write_log_line(f, line, prefix, timestamp_ms=None):
+    """Horodate une ligne (maintenant, ou `timestamp_ms` epoch), l'écrit dans le fichier de log ouvert et l'affiche"""
+    if line:
+        moment = datetime.datetime.fromtimestamp(timestamp_ms / 1000) if timestamp_ms else datetime.datetime.now()
+        timestamp = moment.strftime("%H:%M:%S.%f")[:-3]
+        log_line = f"[{timestamp}] [{prefix}] {line.strip()}\n"
+        f.write(log_line)
+        LINES_WRITTEN.inc(source=prefix)
+        f.flush()
+        print(f"[{timestamp}] [{prefix}] {line.strip()}")
+
+def write_lines_to_log(lines, log_file, prefix):
+    """Horodate chaque ligne, l'écrit dans le fichier de log et l'affiche"""
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(f"\n=== {prefix} STARTED ===\n")
+        
+        for line in lines:
+            write_log_line(f, line, prefix)
+
+def subscribe_log_file(router, tags, log_file, prefix, min_priority='V', pattern=None, package=None):
+    """Abonne un fichier de monitoring au flux logcat partagé du device (routeur)"""
+    f = open(log_file, 'a', encoding='utf-8')
+    f.write(f"\n=== {prefix} STARTED ===\n")
+    return router.subscribe(f"monitoring-{prefix}", tags, lambda routed: write_log_line(f, routed.line, prefix),
+                            min_priority=min_priority, on_close=f.close, pattern=pattern, package=package)
+
 def run_command_async(cmd, log_file, prefix):
     """Exécute une commande en arrière-plan et log les résultats"""
     try:
         process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, 
                                  stderr=subprocess.STDOUT, text=True, encoding='utf-8')
-        
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(f"\n=== {prefix} STARTED ===\n")
-            
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                    log_line = f"[{timestamp}] [{prefix}] {line.strip()}\n"
-                    f.write(log_line)
-                    f.flush()
-                    print(f"[{timestamp}] [{prefix}] {line.strip()}")
+        write_lines_to_log(iter(process.stdout.readline, ''), log_file, prefix)
                     
     except Exception as e:
         print(f"Erreur dans {prefix}: {e}")
 
+def capture_logcat_async(tags, log_file, prefix, min_priority='V', pushdown=True, device_id=None):
+    """
+    Abonne le fichier de log au flux logcat partagé (sans process adb) et démarre le flux.
+    Avec `pushdown`, le bruit systemui et les autres process sont filtrés sur le device (-e, --pid)
+    """
+    try:
+        router = get_router(device_id)
+        if pushdown:
+            subscribe_log_file(router, tags, log_file, prefix, min_priority,
+                               pattern=EXCLUDE_SYSTEMUI_PATTERN, package=TRACKING_PACKAGE)
+        else:
+            subscribe_log_file(router, tags, log_file, prefix, min_priority)
+        router.start()
+        return router
+    except Exception as e:
+        print(f"Erreur dans {prefix}: {e}")
+
+def capture_merged_logcat(device_ids, tags, log_file, prefix, min_priority='V', pushdown=True):
+    """
+    Plusieurs devices : un seul flux fusionné, ordonné sur l'horloge de l'hôte (décalage de
+    chaque device corrigé), écrit dans le fichier de log avec l'heure corrigée de chaque ligne
+    """
+    f = open(log_file, 'a', encoding='utf-8')
+    f.write(f"\n=== {prefix} STARTED ===\n")
+    merger = LogMerger(lambda merged: write_log_line(f, merged.routed.line, f"{prefix} {merged.device_id}",
+                                                     merged.host_ms))
+    options = {'pattern': EXCLUDE_SYSTEMUI_PATTERN, 'package': TRACKING_PACKAGE} if pushdown else {}
+    for device_id in device_ids:
+        merger.add_device(device_id, tags, min_priority=min_priority, **options)
+        offset = merger.offsets[device_id]
+        print(f"   {device_id}: horloge {offset.offset_ms:+.0f} ms par rapport à l'hôte")
+    merger.start()
+    return merger
+
 def main():
     parser = argparse.ArgumentParser(description='Monitoring complet du système')
     parser.add_argument('--duration', type=int, default=300, help='Durée en secondes (défaut: 300)')
+    parser.add_argument('-d', '--device', action='append', dest='devices',
+                        help='Serial du device (répétable, "all" pour tous ; plusieurs devices = flux fusionné)')
+    parser.add_argument('--metrics-port', type=int, default=metrics_port(9464), help='Port des métriques Prometheus (0 = désactivé)')
+    parser.add_argument('--no-pushdown', action='store_true', help='Ne pas filtrer côté device (garde le bruit systemui)')
     args = parser.parse_args()
     
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -44,6 +106,7 @@ def main():
     print(f"Log file: {log_file}")
     print(f"Duration: {args.duration} seconds")
     print()
+    start_metrics_server(args.metrics_port)
     
     # Créer le fichier de log avec header
     with open(log_file, 'w', encoding='utf-8') as f:
@@ -65,12 +128,16 @@ def main():
     print("Serveur Node.js démarré")
     
     print("Démarrage de la capture des logs APK...")
-    apk_thread = threading.Thread(
-        target=run_command_async,
-        args=("adb logcat -s CrossAppTracking:D *:S", log_file, "APK")
-    )
-    apk_thread.daemon = True
-    apk_thread.start()
+    device_ids = args.devices or [None]
+    if 'all' in device_ids:
+        device_ids = get_client().devices()
+    merger = None
+    if len(device_ids) > 1:
+        merger = capture_merged_logcat(device_ids, ["CrossAppTracking"], log_file, "APK", min_priority="D",
+                                       pushdown=not args.no_pushdown)
+    else:
+        capture_logcat_async(["CrossAppTracking"], log_file, "APK", min_priority="D",
+                             pushdown=not args.no_pushdown, device_id=device_ids[0] if device_ids else None)
     
     time.sleep(1)
     print("Capture APK démarrée")
@@ -85,6 +152,9 @@ def main():
         print("\nArrêt demandé par l'utilisateur")
     
     print("Arrêt du monitoring...")
+    if merger:
+        # Vider la fenêtre de réordonnancement dans le fichier
+        merger.stop()
     
     # Note: Les threads daemon s'arrêteront automatiquement
     print("Monitoring terminé")
@@ -0,0 +1,57 @@
+"""Décodage des entrées `logcat -B` (logger_entry v1 et v4)"""
+import struct
+
+from log_router import LogSubscription
+from logcat import LOGGER_ENTRY_HEADER, LogcatRecord, decode_binary_records, encode_binary_record
+
+
+def entry_v4(priority: int, tag: bytes, message: bytes, pid=1234, tid=1240, sec=1759312658, nsec=123000000) -> bytes:
+    """Entrée telle qu'écrite par logd (en-tête v4 de 28 octets : + lid, uid)"""
+    payload = bytes([priority]) + tag + b'\0' + message + b'\0'
+    return LOGGER_ENTRY_HEADER.pack(len(payload), 28, pid, tid, sec, nsec) + struct.pack('<II', 0, 10123) + payload
+
+
+def entry_v1(priority: int, tag: bytes, message: bytes, pid=42, tid=43, sec=1759312658, nsec=0) -> bytes:
+    """Ancien format : hdr_size vaut 0, en-tête de 20 octets"""
+    payload = bytes([priority]) + tag + b'\0' + message + b'\0'
+    return LOGGER_ENTRY_HEADER.pack(len(payload), 0, pid, tid, sec, nsec) + payload
+
+
+DUMP = (entry_v4(3, b'OptimizedCarrefour', b'\xf0\x9f\x93\x84 PAGE CARREFOUR - 10:17:38\n')
+        + entry_v4(0, b'unknown', b'priorite 0')
+        + entry_v4(1, b'default', b'priorite 1')
+        + entry_v4(8, b'silent', b'priorite 8')
+        + entry_v1(6, b'AndroidRuntime', b'FATAL EXCEPTION: main'))
+
+
+def test_decode_dump():
+    records, consumed = decode_binary_records(DUMP)
+    assert consumed == len(DUMP)
+    assert [(r.priority, r.tag) for r in records] == [
+        ('D', 'OptimizedCarrefour'), ('V', 'unknown'), ('V', 'default'), ('S', 'silent'), ('E', 'AndroidRuntime')]
+    assert records[0].message == '📄 PAGE CARREFOUR - 10:17:38'
+    assert records[0].timestamp_ms == 1759312658123
+    assert (records[4].pid, records[4].tid) == (42, 43)
+
+
+def test_incomplete_entry_is_kept_for_next_read():
+    records, consumed = decode_binary_records(DUMP[:-5])
+    assert len(records) == 4
+    assert consumed == len(DUMP) - len(entry_v1(6, b'AndroidRuntime', b'FATAL EXCEPTION: main'))
+
+
+def test_encode_round_trip():
+    record = LogcatRecord(1759312658, 5000000, 1, 2, 'W', 'CrossAppTracking', 'message')
+    assert decode_binary_records(encode_binary_record(record))[0] == [record]
+
+
+def test_unusual_priorities_pass_subscriber_filters():
+    records, _ = decode_binary_records(DUMP)
+    verbose = LogSubscription('v', None, lambda routed: None)
+    errors = LogSubscription('e', None, lambda routed: None, min_priority='E')
+    try:
+        assert [verbose.accepts(r, None) for r in records] == [True] * 5
+        assert [errors.accepts(r, None) for r in records] == [False, False, False, True, True]
+    finally:
+        verbose.close()
+        errors.close()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Lecture en flux des exports de tracking (tracking-data-exports/*.json, temp-tracking-*.json)
+Itère les événements un par un avec une mémoire bornée, quel que soit le format :
+  - exports serveur  {"events": [...], "sessions": ..., "stats": ...}
+  - dumps PowerShell {"value": [...], "Count": n} (avec BOM)
+et normalise les timestamps (epoch ms ou ISO 8601) en epoch millisecondes
+"""
+import argparse
+import glob
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+CHUNK_SIZE = 64 * 1024
+ENVELOPE_KEYS = ('events', 'value')
+WHITESPACE = ' \t\r\n'
+
+
+class TrackingEvent(NamedTuple):
+    """Événement de tracking normalisé"""
+    id: Optional[int]
+    timestamp: int  # epoch millisecondes (UTC)
+    session_id: str
+    event_type: str
+    platform: str
+    package_name: Optional[str]
+    url: Optional[str]
+    data: dict
+    source: str
+
+
+def normalize_timestamp(value) -> Optional[int]:
+    """Convertit un timestamp epoch (s ou ms, nombre ou chaîne) ou ISO 8601 en epoch ms"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        # Les epochs en secondes (< année 5000 en ms) sont ramenés en millisecondes
+        return int(value * 1000) if value < 1e11 else int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if value.isdigit():
+            return normalize_timestamp(int(value))
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp() * 1000)
+    return None
+
+
+def to_event(raw: dict, source: str = '') -> Optional[TrackingEvent]:
+    """Construit un TrackingEvent à partir d'un événement brut (None si inexploitable)"""
+    timestamp = normalize_timestamp(raw.get('timestamp'))
+    if timestamp is None:
+        return None
+    data = raw.get('data') if isinstance(raw.get('data'), dict) else {}
+    event_id = raw.get('id')
+    return TrackingEvent(
+        id=event_id if isinstance(event_id, int) else None,
+        timestamp=timestamp,
+        session_id=raw.get('sessionId') or '',
+        event_type=raw.get('eventType') or '',
+        platform=raw.get('platform') or data.get('platform') or '',
+        package_name=data.get('packageName'),
+        url=raw.get('url'),
+        data=data,
+        source=source
+    )
+
+
+class _ChunkReader:
+    """Tampon texte alimenté par blocs ; la partie déjà consommée est libérée au fil de l'eau"""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Ajoute un bloc au tampon ; False en fin de fichier"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > self.chunk_size:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        self.buffer += chunk
+        return True
+
+    def next_char(self) -> Optional[str]:
+        """Prochain caractère non blanc (sans le consommer)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return None
+
+
+def _seek_events_array(reader: _ChunkReader, keys=ENVELOPE_KEYS) -> bool:
+    """
+    Avance jusqu'au '[' du tableau d'événements : liste à la racine,
+    ou valeur d'une clé de premier niveau parmi `keys`
+    """
+    first = reader.next_char()
+    if first == '[':
+        reader.pos += 1
+        return True
+    if first != '{':
+        return False
+
+    depth = 0
+    in_string = escaped = False
+    key_chars = []
+    last_string = None
+    while True:
+        if reader.pos >= len(reader.buffer) and not reader.fill():
+            return False
+        char = reader.buffer[reader.pos]
+        reader.pos += 1
+
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+                last_string = ''.join(key_chars) if depth == 1 else None
+                continue
+            if depth == 1:
+                key_chars.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+            key_chars = []
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return False
+        elif char == ':' and depth == 1 and last_string in keys:
+            if reader.next_char() == '[':
+                reader.pos += 1
+                return True
+        elif char not in WHITESPACE:
+            last_string = None
+
+
+def _iter_array_items(reader: _ChunkReader) -> Iterator:
+    """Décode un à un les éléments d'un tableau JSON dont le '[' a été consommé"""
+    decoder = json.JSONDecoder()
+    while True:
+        char = reader.next_char()
+        if char is None or char == ']':
+            return
+        if char == ',':
+            reader.pos += 1
+            continue
+        try:
+            item, end = decoder.raw_decode(reader.buffer, reader.pos)
+        except json.JSONDecodeError:
+            if not reader.fill():
+                raise
+            continue
+        if end == len(reader.buffer) and reader.fill():
+            continue  # un nombre peut être tronqué en fin de bloc : relire avec la suite
+        reader.pos = end
+        yield item
+
+
+def iter_raw_events(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """Itère les événements bruts (dict) d'un fichier d'export"""
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        reader = _ChunkReader(f, chunk_size)
+        if not _seek_events_array(reader):
+            return
+        for item in _iter_array_items(reader):
+            if isinstance(item, dict):
+                yield item
+
+
+def iter_events(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[TrackingEvent]:
+    """Itère les événements normalisés d'un fichier d'export"""
+    source = os.path.basename(path)
+    for raw in iter_raw_events(path, chunk_size):
+        event = to_event(raw, source)
+        if event is not None:
+            yield event
+
+
+def expand_paths(patterns: Iterable[str]) -> list:
+    """Résout fichiers, dossiers et motifs glob en une liste triée de fichiers JSON"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(glob.glob(os.path.join(pattern, '*.json')))
+        else:
+            paths.extend(glob.glob(pattern) or [pattern])
+    return sorted(set(paths))
+
+
+def iter_all_events(patterns: Iterable[str]) -> Iterator[TrackingEvent]:
+    """Itère les événements de plusieurs exports, fichier par fichier"""
+    for path in expand_paths(patterns):
+        yield from iter_events(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Résumé en flux des exports de tracking')
+    parser.add_argument('paths', nargs='*', default=['tracking-data-exports', 'temp-tracking-*.json'],
+                        help='Fichiers, dossiers ou motifs glob (défaut: tracking-data-exports + temp-tracking-*.json)')
+    args = parser.parse_args()
+
+    by_type = Counter()
+    first = last = None
+    total = 0
+    for event in iter_all_events(args.paths):
+        total += 1
+        by_type[event.event_type] += 1
+        first = event.timestamp if first is None else min(first, event.timestamp)
+        last = event.timestamp if last is None else max(last, event.timestamp)
+
+    print(f"📊 {total} événements")
+    if total:
+        start = datetime.fromtimestamp(first / 1000, timezone.utc).isoformat()
+        end = datetime.fromtimestamp(last / 1000, timezone.utc).isoformat()
+        print(f"🕒 Du {start} au {end}")
+    for event_type, count in by_type.most_common():
+        print(f"   {event_type:<32} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Fusion et compaction des exports de tracking qui se recouvrent
+(backups "before-clear", exports manuels, dumps temp-tracking-*.json)
+
+Tri externe : les événements sont lus en flux, triés par paquets bornés (runs gzip
+temporaires), puis fusionnés par k-way merge sur (timestamp, id) avec dédoublonnage
+sur l'id d'événement. Le résultat est une archive compressée partitionnée par jour
+(ou par heure) que les analyses suivantes lisent en une seule passe.
+"""
+import argparse
+import glob
+import gzip
+import heapq
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional
+
+from tracking_events import expand_paths, iter_raw_events, normalize_timestamp
+
+DEFAULT_ARCHIVE_DIR = "tracking-archive"
+DEFAULT_RUN_SIZE = 50000
+MANIFEST_FILE = "manifest.json"
+# Les doublons d'un même événement ont le même timestamp : une fenêtre courte suffit
+DEDUP_WINDOW_MS = 5 * 60 * 1000
+
+PARTITION_FORMATS = {
+    'day': '%Y-%m-%d',
+    'hour': '%Y-%m-%dT%H',
+}
+
+
+def event_key(event: dict):
+    """Clé de dédoublonnage : l'id serveur, sinon (session, type, timestamp)"""
+    event_id = event.get('id')
+    if event_id is not None:
+        return event_id
+    return (event.get('sessionId'), event.get('eventType'), event['timestamp'])
+
+
+def _sort_key(event: dict):
+    event_id = event.get('id')
+    return event['timestamp'], event_id if isinstance(event_id, int) else -1
+
+
+def _write_run(events: list, run_dir: str, index: int) -> str:
+    events.sort(key=_sort_key)
+    path = os.path.join(run_dir, f"run-{index:05d}.jsonl.gz")
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=1) as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+    return path
+
+
+def _read_run(path: str) -> Iterator[dict]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def build_sorted_runs(paths: Iterable[str], run_dir: str, run_size: int = DEFAULT_RUN_SIZE) -> list:
+    """Phase 1 du tri externe : découpe l'entrée en runs triés d'au plus `run_size` événements"""
+    runs = []
+    batch = []
+    for path in paths:
+        for raw in iter_raw_events(path):
+            timestamp = normalize_timestamp(raw.get('timestamp'))
+            if timestamp is None:
+                continue
+            raw['timestamp'] = timestamp
+            batch.append(raw)
+            if len(batch) >= run_size:
+                runs.append(_write_run(batch, run_dir, len(runs)))
+                batch = []
+    if batch:
+        runs.append(_write_run(batch, run_dir, len(runs)))
+    return runs
+
+
+def merge_runs(runs: Iterable[str], dedup_window_ms: int = DEDUP_WINDOW_MS, stats: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Phase 2 : k-way merge des runs par timestamp, en ignorant les ids déjà vus
+    dans la fenêtre glissante (mémoire bornée par le débit d'événements de la fenêtre)
+    """
+    seen = set()
+    window = deque()
+    for event in heapq.merge(*(_read_run(run) for run in runs), key=_sort_key):
+        timestamp = event['timestamp']
+        while window and window[0][0] < timestamp - dedup_window_ms:
+            seen.discard(window.popleft()[1])
+
+        key = event_key(event)
+        if key in seen:
+            if stats is not None:
+                stats['duplicates'] = stats.get('duplicates', 0) + 1
+            continue
+        seen.add(key)
+        window.append((timestamp, key))
+        yield event
+
+
+def iter_merged_exports(patterns: Iterable[str], run_size: int = DEFAULT_RUN_SIZE,
+                        stats: Optional[dict] = None) -> Iterator[dict]:
+    """Événements bruts de tous les exports, dédoublonnés et dans l'ordre chronologique (sans archive)"""
+    run_dir = tempfile.mkdtemp(prefix="tracking-runs-")
+    try:
+        yield from merge_runs(build_sorted_runs(expand_paths(patterns), run_dir, run_size), stats=stats)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def partition_name(timestamp: int, partition: str = 'day') -> str:
+    return datetime.fromtimestamp(timestamp / 1000, timezone.utc).strftime(PARTITION_FORMATS[partition])
+
+
+def write_archive(events: Iterable[dict], archive_dir: str, partition: str = 'day') -> dict:
+    """Écrit les événements (déjà triés) en partitions gzip JSON-lines + manifest"""
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = {'partition': partition, 'partitions': []}
+    current_name = None
+    current_file = None
+    current_entry = None
+
+    try:
+        for event in events:
+            name = partition_name(event['timestamp'], partition)
+            if name != current_name:
+                if current_file:
+                    current_file.close()
+                current_name = name
+                filename = f"events-{name}.jsonl.gz"
+                current_file = gzip.open(os.path.join(archive_dir, filename), 'wt', encoding='utf-8')
+                current_entry = {'file': filename, 'count': 0,
+                                 'min_timestamp': event['timestamp'], 'max_timestamp': event['timestamp']}
+                manifest['partitions'].append(current_entry)
+            current_file.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+            current_file.write('\n')
+            current_entry['count'] += 1
+            current_entry['max_timestamp'] = event['timestamp']
+    finally:
+        if current_file:
+            current_file.close()
+
+    manifest['total'] = sum(entry['count'] for entry in manifest['partitions'])
+    manifest['createdAt'] = datetime.now(timezone.utc).isoformat()
+    with open(os.path.join(archive_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def compact_exports(patterns: Iterable[str], archive_dir: str = DEFAULT_ARCHIVE_DIR,
+                    partition: str = 'day', run_size: int = DEFAULT_RUN_SIZE) -> dict:
+    """Fusionne, dédoublonne et archive tous les exports correspondant à `patterns`"""
+    paths = expand_paths(patterns)
+    run_dir = tempfile.mkdtemp(prefix="tracking-runs-")
+    stats = {'files': len(paths)}
+    try:
+        runs = build_sorted_runs(paths, run_dir, run_size)
+        stats['runs'] = len(runs)
+        # Remplacer les partitions d'une archive précédente (et seulement elles)
+        for old_partition in glob.glob(os.path.join(archive_dir, 'events-*.jsonl.gz')):
+            os.remove(old_partition)
+        manifest = write_archive(merge_runs(runs, stats=stats), archive_dir, partition)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    manifest['stats'] = stats
+    return manifest
+
+
+def iter_archive(archive_dir: str = DEFAULT_ARCHIVE_DIR, start: Optional[int] = None,
+                 end: Optional[int] = None) -> Iterator[dict]:
+    """Lit l'archive en une passe, dans l'ordre chronologique, en sautant les partitions hors [start, end]"""
+    with open(os.path.join(archive_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for entry in manifest['partitions']:
+        if start is not None and entry['max_timestamp'] < start:
+            continue
+        if end is not None and entry['min_timestamp'] > end:
+            continue
+        with gzip.open(os.path.join(archive_dir, entry['file']), 'rt', encoding='utf-8') as f:
+            for line in f:
+                event = json.loads(line)
+                if start is not None and event['timestamp'] < start:
+                    continue
+                if end is not None and event['timestamp'] > end:
+                    return
+                yield event
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fusionne et dédoublonne les exports de tracking en une archive partitionnée')
+    parser.add_argument('paths', nargs='*', default=['tracking-data-exports', 'temp-tracking-*.json'],
+                        help='Fichiers, dossiers ou motifs glob (défaut: tracking-data-exports + temp-tracking-*.json)')
+    parser.add_argument('-o', '--output', default=DEFAULT_ARCHIVE_DIR, help=f'Dossier de l\'archive (défaut: {DEFAULT_ARCHIVE_DIR})')
+    parser.add_argument('--partition', choices=sorted(PARTITION_FORMATS), default='day', help='Granularité des partitions')
+    parser.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE, help='Événements triés en mémoire par run')
+    args = parser.parse_args()
+
+    print("🔀 Fusion des exports de tracking...")
+    manifest = compact_exports(args.paths, args.output, args.partition, args.run_size)
+    stats = manifest['stats']
+    print(f"✅ {manifest['total']} événements uniques archivés dans {args.output}/")
+    print(f"   {stats['files']} fichiers lus, {stats['runs']} runs, {stats.get('duplicates', 0)} doublons supprimés")
+    for entry in manifest['partitions']:
+        print(f"   📦 {entry['file']:<32} {entry['count']} événements")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Reconstruction incrémentale des sessions de tracking et funnel panier
+
+Les événements (exports JSON, archive dédoublonnée, logs de monitoring) sont groupés
+par sessionId en une seule passe. Les sessions ouvertes sont gardées dans un LRU borné
+et fermées après un délai d'inactivité ; chaque session fermée est écrite en JSON-lines.
+Une session qui reprend après sa fermeture est rouverte (même sessionId) et réécrite à
+sa prochaine fermeture : pour un sessionId, la dernière ligne fait foi.
+Un fichier d'état (offsets des logs, sessions ouvertes, totaux) permet de reprendre
+là où la passe précédente s'était arrêtée au lieu de tout recalculer.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from logcat import parse_threadtime_line, year_from_filename
+from tracking_events import TrackingEvent, expand_paths, to_event
+from tracking_merge import build_sorted_runs, merge_runs
+
+FUNNEL_STEPS = ('SESSION_START', 'VIEW_CLICKED', 'ADD_TO_CART')
+DEFAULT_IDLE_TIMEOUT_MS = 30 * 60 * 1000
+DEFAULT_MAX_OPEN_SESSIONS = 1000
+MAX_CLOSED_SESSIONS = 10000  # sessions fermées gardées pour être rouvertes
+MAX_PAGES_PER_SESSION = 100
+DEFAULT_STATE_FILE = ".sessions-state.json"
+DEFAULT_OUTPUT_FILE = "tracking-sessions.jsonl"
+
+EVENT_TRACKED_PATTERN = re.compile(r'Event tracked: (\w+) - (.*)$')
+SESSION_ID_PATTERN = re.compile(r'sessionId=([\w-]+)')
+PACKAGE_PATTERN = re.compile(r'packageName=([\w.]+)')
+
+
+class Session:
+    """Agrégats d'une session (pas la liste de ses événements)"""
+
+    __slots__ = ('session_id', 'platform', 'start', 'last', 'event_count',
+                 'event_types', 'pages', 'funnel_stage', 'cart_adds')
+
+    def __init__(self, session_id: str, platform: str, timestamp: int):
+        self.session_id = session_id
+        self.platform = platform
+        self.start = timestamp
+        self.last = timestamp
+        self.event_count = 0
+        self.event_types = Counter()
+        self.pages = deque(maxlen=MAX_PAGES_PER_SESSION)
+        self.funnel_stage = 0
+        self.cart_adds = 0
+
+    @property
+    def duration_ms(self) -> int:
+        return self.last - self.start
+
+    def add(self, event: TrackingEvent, funnel=FUNNEL_STEPS):
+        self.start = min(self.start, event.timestamp)
+        self.last = max(self.last, event.timestamp)
+        self.event_count += 1
+        self.event_types[event.event_type] += 1
+        if event.event_type == 'ADD_TO_CART':
+            self.cart_adds += 1
+        if self.funnel_stage < len(funnel) and event.event_type == funnel[self.funnel_stage]:
+            self.funnel_stage += 1
+
+        # Séquence de pages : URL (web) ou application (Android), sans répétitions consécutives
+        page = event.url or event.package_name
+        if page and (not self.pages or self.pages[-1] != page):
+            self.pages.append(page)
+
+    def to_dict(self) -> dict:
+        return {
+            'sessionId': self.session_id,
+            'platform': self.platform,
+            'start': self.start,
+            'last': self.last,
+            'durationMs': self.duration_ms,
+            'eventCount': self.event_count,
+            'eventTypes': dict(self.event_types),
+            'pages': list(self.pages),
+            'funnelStage': self.funnel_stage,
+            'cartAdds': self.cart_adds
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Session':
+        session = cls(data['sessionId'], data.get('platform', ''), data['start'])
+        session.last = data['last']
+        session.event_count = data['eventCount']
+        session.event_types = Counter(data['eventTypes'])
+        session.pages.extend(data['pages'])
+        session.funnel_stage = data['funnelStage']
+        session.cart_adds = data['cartAdds']
+        return session
+
+
+class SessionBuilder:
+    """
+    Regroupe les événements par session en une passe.
+    Les sessions ouvertes sont ordonnées par dernière activité (LRU) : les plus anciennes
+    sont fermées quand elles dépassent le délai d'inactivité ou la capacité maximale.
+    """
+
+    def __init__(self, idle_timeout_ms: int = DEFAULT_IDLE_TIMEOUT_MS,
+                 max_open: int = DEFAULT_MAX_OPEN_SESSIONS, funnel=FUNNEL_STEPS,
+                 on_close: Optional[Callable[[Session], None]] = None):
+        self.idle_timeout_ms = idle_timeout_ms
+        self.max_open = max_open
+        self.funnel = tuple(funnel)
+        self.on_close = on_close
+        self.open: 'OrderedDict[str, Session]' = OrderedDict()
+        self.closed: 'OrderedDict[str, Session]' = OrderedDict()
+        self.watermark = 0
+        self.totals = {
+            'events': 0,
+            'closedSessions': 0,
+            'closedDurationMs': 0,
+            'funnel': [0] * len(self.funnel)
+        }
+
+    def add(self, event: TrackingEvent):
+        if not event.session_id:
+            return
+        self.totals['events'] += 1
+        self.watermark = max(self.watermark, event.timestamp)
+        self.expire(self.watermark)
+
+        session = self.open.get(event.session_id)
+        if session is None:
+            session = self.closed.pop(event.session_id, None)
+            if session is not None:
+                self._count(session, -1)  # reprise après inactivité : même session
+            else:
+                session = Session(event.session_id, event.platform, event.timestamp)
+            self.open[event.session_id] = session
+            if len(self.open) > self.max_open:
+                self._close(next(iter(self.open)))
+        else:
+            self.open.move_to_end(event.session_id)
+        session.add(event, self.funnel)
+
+    def add_all(self, events: Iterable[TrackingEvent]):
+        for event in events:
+            self.add(event)
+
+    def expire(self, now_ms: int):
+        """Ferme les sessions inactives depuis plus de idle_timeout_ms"""
+        while self.open:
+            session_id, session = next(iter(self.open.items()))
+            if session.last >= now_ms - self.idle_timeout_ms:
+                break
+            self._close(session_id)
+
+    def close_all(self):
+        for session_id in list(self.open):
+            self._close(session_id)
+
+    def _count(self, session: Session, sign: int):
+        self.totals['closedSessions'] += sign
+        self.totals['closedDurationMs'] += sign * session.duration_ms
+        for stage in range(session.funnel_stage):
+            self.totals['funnel'][stage] += sign
+
+    def _close(self, session_id: str):
+        session = self.open.pop(session_id)
+        self._count(session, 1)
+        self.closed[session_id] = session
+        if len(self.closed) > MAX_CLOSED_SESSIONS:
+            self.closed.popitem(last=False)
+        if self.on_close:
+            self.on_close(session)
+
+    def summary(self) -> dict:
+        """Totaux des sessions fermées + état courant des sessions ouvertes"""
+        funnel = list(self.totals['funnel'])
+        for session in self.open.values():
+            for stage in range(session.funnel_stage):
+                funnel[stage] += 1
+        sessions = self.totals['closedSessions'] + len(self.open)
+        durations = self.totals['closedDurationMs'] + sum(s.duration_ms for s in self.open.values())
+        return {
+            'events': self.totals['events'],
+            'sessions': sessions,
+            'openSessions': len(self.open),
+            'averageDurationMs': durations // sessions if sessions else 0,
+            'funnel': list(zip(self.funnel, funnel))
+        }
+
+
+class LogEventAdapter:
+    """
+    Convertit les lignes `AndroidTracking: Event tracked: TYPE - {...}` des logs en événements.
+    Seul SESSION_START porte le sessionId : les événements suivants du même PID y sont rattachés.
+    """
+
+    def __init__(self, session_by_pid: Optional[Dict[str, str]] = None):
+        self.session_by_pid = session_by_pid if session_by_pid is not None else {}
+
+    def parse(self, line: str, year: Optional[int] = None, source: str = '') -> Optional[TrackingEvent]:
+        if 'Event tracked:' not in line:
+            return None
+        record = parse_threadtime_line(line, year)
+        if record is None:
+            return None
+        match = EVENT_TRACKED_PATTERN.search(record.message)
+        if not match:
+            return None
+        event_type, payload = match.groups()
+        pid = str(record.pid)
+
+        if event_type == 'SESSION_START':
+            session_match = SESSION_ID_PATTERN.search(payload)
+            if session_match:
+                self.session_by_pid[pid] = session_match.group(1)
+        session_id = self.session_by_pid.get(pid)
+        if not session_id:
+            return None
+
+        package_match = PACKAGE_PATTERN.search(payload)
+        return TrackingEvent(
+            id=None,
+            timestamp=record.timestamp_ms,
+            session_id=session_id,
+            event_type=event_type,
+            platform='android_native',
+            package_name=package_match.group(1) if package_match else None,
+            url=None,
+            data={},
+            source=source
+        )
+
+
+def read_new_lines(path: str, offset: int) -> Iterator[tuple]:
+    """Lignes complètes ajoutées depuis `offset` ; produit (ligne, offset après la ligne)"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                return  # ligne en cours d'écriture : reprise au prochain passage
+            offset += len(raw)
+            yield raw.decode('utf-8', errors='replace').lstrip('\ufeff'), offset
+
+
+class IncrementalSessions:
+    """Builder + état persistant : ne relit que les nouveaux fichiers / nouvelles lignes"""
+
+    def __init__(self, state_file: str = DEFAULT_STATE_FILE, output_file: str = DEFAULT_OUTPUT_FILE,
+                 idle_timeout_ms: int = DEFAULT_IDLE_TIMEOUT_MS, max_open: int = DEFAULT_MAX_OPEN_SESSIONS):
+        self.state_file = state_file
+        self.output_file = output_file
+        self.builder = SessionBuilder(idle_timeout_ms, max_open, on_close=self._write_session)
+        self.offsets: Dict[str, int] = {}
+        self.exports_done: List[str] = []
+        self.adapter = LogEventAdapter()
+        self._output = None
+        self._load_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.offsets = state.get('offsets', {})
+        self.exports_done = state.get('exportsDone', [])
+        self.adapter.session_by_pid.update(state.get('sessionByPid', {}))
+        self.builder.watermark = state.get('watermark', 0)
+        self.builder.totals = state.get('totals', self.builder.totals)
+        for data in state.get('openSessions', []):
+            session = Session.from_dict(data)
+            self.builder.open[session.session_id] = session
+        for data in state.get('recentlyClosed', []):
+            session = Session.from_dict(data)
+            self.builder.closed[session.session_id] = session
+
+    def save_state(self):
+        state = {
+            'offsets': self.offsets,
+            'exportsDone': self.exports_done,
+            'sessionByPid': self.adapter.session_by_pid,
+            'watermark': self.builder.watermark,
+            'totals': self.builder.totals,
+            'openSessions': [session.to_dict() for session in self.builder.open.values()],
+            'recentlyClosed': [session.to_dict() for session in self.builder.closed.values()]
+        }
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        if self._output:
+            self._output.flush()
+
+    def _write_session(self, session: Session):
+        if self._output is None:
+            self._output = open(self.output_file, 'a', encoding='utf-8')
+        self._output.write(json.dumps(session.to_dict(), ensure_ascii=False) + '\n')
+
+    def ingest_exports(self, paths: Iterable[str]) -> int:
+        """
+        Les exports sont immuables (chaque fichier n'est lu qu'une fois) mais se recouvrent :
+        les nouveaux fichiers sont fusionnés par timestamp et dédoublonnés sur l'id (tri externe
+        de tracking_merge), en ignorant les événements antérieurs au dernier déjà intégré
+        """
+        names = [name for name in dict.fromkeys(os.path.abspath(path) for path in paths)
+                 if name not in self.exports_done]
+        if not names:
+            return 0
+        start = self.builder.watermark + 1 if self.builder.watermark else None
+        run_dir = tempfile.mkdtemp(prefix="tracking-runs-")
+        try:
+            events = merge_runs(build_sorted_runs(names, run_dir))
+            count = self.ingest_events(event for event in events if start is None or event['timestamp'] >= start)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        self.exports_done.extend(names)
+        return count
+
+    def ingest_events(self, raw_events: Iterable[dict]) -> int:
+        """Événements bruts déjà triés (ex: tracking_merge.iter_archive)"""
+        count = 0
+        for raw in raw_events:
+            event = to_event(raw)
+            if event is not None:
+                self.builder.add(event)
+                count += 1
+        return count
+
+    def ingest_log(self, path: str) -> int:
+        """Traite les lignes ajoutées au log depuis le dernier passage"""
+        name = os.path.abspath(path)
+        offset = self.offsets.get(name, 0)
+        if os.path.getsize(path) < offset:
+            offset = 0  # fichier tronqué/recréé
+        year = year_from_filename(path)
+        count = 0
+        for line, offset in read_new_lines(path, offset):
+            event = self.adapter.parse(line, year, os.path.basename(path))
+            if event is not None:
+                self.builder.add(event)
+                count += 1
+            self.offsets[name] = offset
+        return count
+
+    def close(self, flush_open: bool = False):
+        if flush_open:
+            self.builder.close_all()
+        self.save_state()
+        if self._output:
+            self._output.close()
+            self._output = None
+
+
+def print_summary(summary: dict):
+    print(f"📊 {summary['events']} événements, {summary['sessions']} sessions "
+          f"({summary['openSessions']} ouvertes), durée moyenne {summary['averageDurationMs'] / 1000:.1f} s")
+    for step, count in summary['funnel']:
+        print(f"   {step:<20} {count} sessions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstruction incrémentale des sessions et funnel panier')
+    parser.add_argument('--exports', nargs='*', default=[], help='Exports JSON (fichiers, dossiers ou globs)')
+    parser.add_argument('--archive', help='Archive dédoublonnée produite par tracking_merge.py (ordre chronologique)')
+    parser.add_argument('--logs', nargs='*', default=[], help='Logs de monitoring (fichiers ou globs)')
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE, help='Fichier d\'état pour la reprise incrémentale')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE, help='Sessions fermées (JSON-lines)')
+    parser.add_argument('--idle-timeout', type=int, default=DEFAULT_IDLE_TIMEOUT_MS // 60000, help='Inactivité (minutes) avant fermeture')
+    parser.add_argument('--max-open', type=int, default=DEFAULT_MAX_OPEN_SESSIONS, help='Sessions ouvertes max (LRU)')
+    parser.add_argument('--follow', action='store_true', help='Suivre les logs en continu')
+    parser.add_argument('--flush', action='store_true', help='Fermer toutes les sessions ouvertes à la fin')
+    args = parser.parse_args()
+
+    sessions = IncrementalSessions(args.state, args.output, args.idle_timeout * 60000, args.max_open)
+    try:
+        if args.archive:
+            from tracking_merge import iter_archive
+            # Reprise après le dernier événement déjà intégré
+            start = sessions.builder.watermark + 1 if sessions.builder.watermark else None
+            sessions.ingest_events(iter_archive(args.archive, start=start))
+        sessions.ingest_exports(expand_paths(args.exports))
+        log_paths = expand_paths(args.logs)
+        for path in log_paths:
+            sessions.ingest_log(path)
+        print_summary(sessions.builder.summary())
+
+        while args.follow:
+            time.sleep(1)
+            if sum(sessions.ingest_log(path) for path in log_paths):
+                sessions.save_state()
+                print_summary(sessions.builder.summary())
+    except KeyboardInterrupt:
+        print("\n👋 Arrêt demandé par l'utilisateur")
+    finally:
+        sessions.close(flush_open=args.flush)
+
+
+if __name__ == "__main__":
+    main()
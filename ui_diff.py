@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Parser de hiérarchies UI Appium (2-app-source-before.xml / 3-app-source-after.xml)
+et diff structurel avant/après
+
+Le parsing se fait avec iterparse en ne gardant que les attributs utiles ;
+chaque nœud reçoit une clé stable (chemin de classes / resource-id depuis la racine)
+et le diff compare les deux index de clés en temps linéaire.
+"""
+import argparse
+import glob
+import json
+import os
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+BEFORE_FILE = "2-app-source-before.xml"
+AFTER_FILE = "3-app-source-after.xml"
+APP_CONFIG_FILE = "app-configs.json"
+DEFAULT_CART_KEYWORDS = ('panier', 'cart')
+
+
+class UiNode(NamedTuple):
+    key: str
+    depth: int
+    cls: str
+    text: str
+    resource_id: str
+    content_desc: str
+    bounds: str
+    clickable: bool
+
+    def label(self) -> str:
+        """Description courte pour l'affichage"""
+        name = self.cls.rsplit('.', 1)[-1]
+        detail = self.text or self.content_desc or self.resource_id
+        return f"{name} '{detail}'" if detail else name
+
+
+def parse_hierarchy(path: str) -> Dict[str, UiNode]:
+    """
+    Parse un dump de hiérarchie en index {clé: UiNode}.
+    La clé d'un nœud = clé du parent + classe (+ resource-id) + rang parmi les frères
+    de même classe/resource-id : une insertion ne décale que les frères équivalents.
+    """
+    nodes: Dict[str, UiNode] = {}
+    # Pile : (clé, compteur des enfants par signature)
+    stack: List[tuple] = []
+
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'end':
+            stack.pop()
+            element.clear()
+            continue
+
+        attributes = element.attrib
+        cls = attributes.get('class', element.tag)
+        resource_id = attributes.get('resource-id', '')
+        signature = f"{cls}#{resource_id}" if resource_id else cls
+
+        if stack:
+            parent_key, sibling_counts = stack[-1]
+            rank = sibling_counts.get(signature, 0)
+            sibling_counts[signature] = rank + 1
+            key = f"{parent_key}/{signature}[{rank}]"
+        else:
+            key = signature
+
+        stack.append((key, {}))
+        nodes[key] = UiNode(
+            key=key,
+            depth=len(stack) - 1,
+            cls=cls,
+            text=attributes.get('text', ''),
+            resource_id=resource_id,
+            content_desc=attributes.get('content-desc', ''),
+            bounds=attributes.get('bounds', ''),
+            clickable=attributes.get('clickable') == 'true'
+        )
+    return nodes
+
+
+def diff_hierarchies(before: Dict[str, UiNode], after: Dict[str, UiNode]) -> dict:
+    """Nœuds ajoutés, supprimés et modifiés (attributs conservés qui diffèrent)"""
+    added = [after[key] for key in after if key not in before]
+    removed = [before[key] for key in before if key not in after]
+    changed = []
+    for key, node in after.items():
+        previous = before.get(key)
+        if previous is None or previous == node:
+            continue
+        fields = {field: (getattr(previous, field), getattr(node, field))
+                  for field in ('text', 'content_desc', 'bounds', 'clickable')
+                  if getattr(previous, field) != getattr(node, field)}
+        changed.append((node, fields))
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def load_cart_keywords(app_key: str = 'carrefour', config_file: str = APP_CONFIG_FILE) -> tuple:
+    """Mots-clés panier de app-configs.json (motifs d'un caractère comme '+' exclus : trop bruyants)"""
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            patterns = json.load(f)['apps'][app_key]['buttonPatterns']
+    except (OSError, KeyError, ValueError):
+        return DEFAULT_CART_KEYWORDS
+    keywords = set(DEFAULT_CART_KEYWORDS)
+    for group in ('addToCart', 'cart'):
+        keywords.update(word.lower() for word in patterns.get(group, []) if len(word) > 1)
+    return tuple(sorted(keywords))
+
+
+def detect_cart_effects(diff: dict, keywords: Iterable[str] = DEFAULT_CART_KEYWORDS) -> List[str]:
+    """Changements qui ressemblent à un ajout au panier (texte/description mentionnant le panier)"""
+    keywords = tuple(keywords)
+
+    def mentions_cart(*texts):
+        lowered = ' '.join(texts).lower()
+        return any(keyword in lowered for keyword in keywords)
+
+    effects = []
+    for node in diff['added']:
+        if mentions_cart(node.text, node.content_desc, node.resource_id):
+            effects.append(f"+ {node.label()}")
+    for node, fields in diff['changed']:
+        texts = [value for field in ('text', 'content_desc') if field in fields for value in fields[field]]
+        if texts and mentions_cart(*texts, node.resource_id):
+            before_text, after_text = fields.get('text', fields.get('content_desc'))
+            effects.append(f"~ {node.label()}: '{before_text}' -> '{after_text}'")
+    return effects
+
+
+def diff_session(session_dir: str, keywords: Iterable[str] = DEFAULT_CART_KEYWORDS) -> Optional[dict]:
+    """Diff d'un dossier appium-*session-* (None s'il manque un des deux dumps)"""
+    before_path = os.path.join(session_dir, BEFORE_FILE)
+    after_path = os.path.join(session_dir, AFTER_FILE)
+    if not (os.path.exists(before_path) and os.path.exists(after_path)):
+        return None
+    diff = diff_hierarchies(parse_hierarchy(before_path), parse_hierarchy(after_path))
+    return {
+        'session': os.path.basename(os.path.normpath(session_dir)),
+        'added': [node.label() for node in diff['added']],
+        'removed': [node.label() for node in diff['removed']],
+        'changed': [{'node': node.label(), 'changes': fields} for node, fields in diff['changed']],
+        'cartEffects': detect_cart_effects(diff, keywords)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff avant/après des hiérarchies UI des sessions Appium')
+    parser.add_argument('sessions', nargs='*', help='Dossiers de session (défaut: appium-*session-*)')
+    parser.add_argument('--app', default='carrefour', help='App de app-configs.json pour les mots-clés panier')
+    parser.add_argument('--json', action='store_true', help='Sortie JSON')
+    args = parser.parse_args()
+
+    session_dirs = args.sessions or sorted(glob.glob('appium-*session-*'))
+    keywords = load_cart_keywords(args.app)
+    results = [result for result in (diff_session(path, keywords) for path in session_dirs) if result]
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+
+    for result in results:
+        print(f"📸 {result['session']}: +{len(result['added'])} -{len(result['removed'])} ~{len(result['changed'])}")
+        for effect in result['cartEffects']:
+            print(f"   🛒 {effect}")
+    print(f"✅ {len(results)} sessions comparées, "
+          f"{sum(1 for result in results if result['cartEffects'])} avec effet panier détecté")
+
+
+if __name__ == "__main__":
+    main()